@@ -1,19 +1,38 @@
+import hashlib
+import io
+import os
+import uuid
+from importlib.util import find_spec
+
 import streamlit as st
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy_financial as npf
-from scipy import optimize
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-
-# ניסיון לייבא plotly
-try:
-    import plotly.graph_objects as go
 
-    plotly_available = True
-except ImportError:
-    plotly_available = False
+from profitability.batch import DEFAULT_SCENARIO, scenario_columns
+from profitability.bookings import BookingIngestor, model_inputs, monthly_table, observed_ranges, season_summary
+from profitability.cache import figure_cache, metrics_cache
+from profitability.cashflows import SUBSIDY_TIMINGS
+from profitability.graph import ModelGraph
+from profitability.grid import GRID_METRICS, default_axis
+from profitability.instrumentation import StageTimer, cache_stats, log_json_line, profile_summary, start_profiler
+from profitability.model import (
+    SENSITIVITY_VARIABLES,
+    cash_flow_table,
+)
+from profitability.parallel import resolve_workers
+from profitability.params import ProjectParams
+from profitability.rates import forward_curve, rate_path
+from profitability.seasonality import CALENDAR, REVENUE_MODELS, daily_curves
+from profitability.service import default_service
+from profitability.store import default_store
+
+# מדידת זמנים לשלבי ההרצה הנוכחית (ו-cProfile כשהופעל בלוח הביצועים)
+perf = StageTimer()
+perf_profiler = start_profiler() if st.session_state.get('perf_profile') else None
+
+# ספריות כבדות (pandas, plotly, openpyxl, scipy) נטענות רק בחלקים שמשתמשים בהן, כך שהרצה שמציגה
+# רק את המדדים העיקריים אינה טוענת אותן. כאן נבדק רק ש-plotly מותקן, בלי לייבא אותו.
+plotly_available = find_spec('plotly') is not None
+if not plotly_available:
     st.warning("הספרייה 'plotly' לא מותקנת. חלק מהתרשימים לא יוצגו. להתקנה, הרץ 'pip install plotly'.")
 
 # עיצוב כותרת האפליקציה והסגנון הכללי
@@ -69,174 +88,22 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# הלוגו נקרא מהדיסק ומוקטן פעם אחת לכל תהליך, ונשמר בזיכרון כ-PNG (במקום לקרוא את הקובץ המקורי בכל הרצה)
+@st.cache_resource
+def load_logo(path, max_width=720):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.thumbnail((max_width, max_width))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
 # כותרת ראשית
 st.markdown('<p class="main-title">מחשבון השקעה דינאמי לפרויקט וילות</p>', unsafe_allow_html=True)
-st.image("קבוצת מעיינות.png", use_column_width=True)
-
-
-def xnpv(rate, values, dates):
-    if rate <= -1.0:
-        return float('inf')
-    d0 = dates[0]
-    return sum(vi / (1.0 + rate) ** ((di - d0).days / 365.0) for vi, di in zip(values, dates))
-
-
-def xirr(values, dates):
-    try:
-        return optimize.newton(lambda r: xnpv(r, values, dates), 0.0)
-    except RuntimeError:
-        return np.nan
-
-
-# פונקציה לחישוב החזר חודשי לפי סוג סילוקין
-def calculate_loan_repayment(total_loan, annual_rate, loan_term_years, repayment_type):
-    monthly_rate = annual_rate / 12
-    num_payments = loan_term_years * 12
-    payments = []
-
-    if repayment_type == 'שפיצר':
-        monthly_payment = npf.pmt(monthly_rate, num_payments, -total_loan)
-        for n in range(1, num_payments + 1):
-            interest_payment = total_loan * monthly_rate
-            principal_payment = monthly_payment - interest_payment
-            total_loan -= principal_payment
-            payments.append({
-                'תשלום': n,
-                'קרן לתשלום': round(principal_payment),
-                'ריבית לתשלום': round(interest_payment),
-                'תשלום חודשי': round(monthly_payment),
-                'יתרת הלוואה': round(total_loan)
-            })
-
-    elif repayment_type == 'קרן שווה':
-        monthly_principal = total_loan / num_payments
-        for n in range(1, num_payments + 1):
-            interest_payment = total_loan * monthly_rate
-            total_payment = monthly_principal + interest_payment
-            total_loan -= monthly_principal
-            payments.append({
-                'תשלום': n,
-                'קרן לתשלום': round(monthly_principal),
-                'ריבית לתשלום': round(interest_payment),
-                'תשלום חודשי': round(total_payment),
-                'יתרת הלוואה': round(total_loan)
-            })
-
-    elif repayment_type == 'בוליט':
-        for n in range(1, num_payments + 1):
-            interest_payment = total_loan * monthly_rate
-            payments.append({
-                'תשלום': n,
-                'קרן לתשלום': 0 if n < num_payments else total_loan,
-                'ריבית לתשלום': round(interest_payment),
-                'תשלום חודשי': round(interest_payment) if n < num_payments else round(interest_payment + total_loan),
-                'יתרת הלוואה': total_loan if n < num_payments else 0
-            })
-
-    return payments
-
-
-# פונקציה לחישוב תוצאות פיננסיות לפרויקט
-def calculate_financial_metrics(villas, size):
-    # חישוב עלויות הקמה
-    construction_cost = construction_cost_per_sqm * size * villas
-    land_cost = land_cost_per_villa * villas
-    total_construction_cost = (
-            construction_cost +
-            land_cost +
-            land_development_cost +
-            public_area_development_cost +
-            reception_and_logistics_cost +
-            small_event_hall_cost +
-            planning_and_consultants_cost
-    )
-
-    # חישוב הכנסות שנתיות מהשכרת וילות
-    annual_revenue = price_per_night * occupancy_rate * 365 * villas
-
-    # חישוב רווח גולמי שנתי (ברוטו)
-    gross_annual_profit = annual_revenue
-
-    # חישוב עלויות תפעול משתנות (ניקיון ואביזרים)
-    total_cleaning_cost = cleaning_cost_per_night * 365 * occupancy_rate * villas
-    total_accessories_cost = accessories_cost_per_night * 365 * occupancy_rate * villas
-
-    # חישוב עלויות תפעול קבועות (תפעול חודשי לוילה, ביטוח ושיווק)
-    operational_cost_per_villa = monthly_operational_cost_per_villa * 12
-    total_insurance_cost = annual_insurance_cost_per_villa * villas
-    total_operational_fixed_cost = (operational_cost_per_villa * villas + total_insurance_cost + annual_marketing_cost)
-
-    # חישוב רווח תפעולי שנתי
-    operating_annual_profit = gross_annual_profit - (
-                total_cleaning_cost + total_accessories_cost + total_operational_fixed_cost)
-
-    # חישוב עלויות מימון
-    total_loan = total_construction_cost - equity_amount
-    loan_payments = calculate_loan_repayment(total_loan, prime_interest_rate + additional_interest_rate, loan_term,
-                                             repayment_type)
-    annual_financing_cost = sum(payment['ריבית לתשלום'] for payment in loan_payments[:12])  # סכום הריבית לשנה הראשונה
-
-    # חישוב רווח נקי שנתי לפני סובסידיה (כולל מס שנתי ועלויות מימון)
-    net_annual_profit_before_subsidy = (operating_annual_profit - annual_financing_cost) * (1 - tax_rate)
-
-    # חישוב חלק שנתי של הסובסידיה
-    annual_subsidy_min = (total_construction_cost * subsidy_min) / loan_term
-    annual_subsidy_max = (total_construction_cost * subsidy_max) / loan_term
-
-    # חישוב רווח נקי שנתי כולל סובסידיה (מחולק לאורך כל תקופת ההלוואה)
-    net_annual_profit_with_subsidy_min = net_annual_profit_before_subsidy + annual_subsidy_min
-    net_annual_profit_with_subsidy_max = net_annual_profit_before_subsidy + annual_subsidy_max
-
-    # חישוב NPV עם סובסידיה וערך שארית
-    terminal_value = net_annual_profit_with_subsidy_min * 10  # הנחה: ערך שארית הוא 10 שנות רווח
-    cash_flow_min = [-total_construction_cost] + [net_annual_profit_with_subsidy_min] * loan_term + [terminal_value]
-    cash_flow_max = [-total_construction_cost] + [net_annual_profit_with_subsidy_max] * loan_term + [terminal_value]
-
-    dates = [datetime.now() + relativedelta(years=i) for i in
-             range(loan_term + 2)]  # +2 for initial investment and terminal value
-
-    total_npv_min = npf.npv(discount_rate, cash_flow_min)
-    total_npv_max = npf.npv(discount_rate, cash_flow_max)
-
-    # חישוב ROI משופר (XIRR)
-    values_min = [-total_construction_cost * (1 - subsidy_min)] + [net_annual_profit_with_subsidy_min] * loan_term + [
-        terminal_value]
-    values_max = [-total_construction_cost * (1 - subsidy_max)] + [net_annual_profit_with_subsidy_max] * loan_term + [
-        terminal_value]
-
-    roi_min = xirr(values_min, dates) * 100
-    roi_max = xirr(values_max, dates) * 100
-
-    # חישוב IRR עם טיפול במקרי קצה
-    irr_min = npf.irr(cash_flow_min)
-    irr_max = npf.irr(cash_flow_max)
-
-    irr_min = irr_min * 100 if not (np.isnan(irr_min) or np.isinf(irr_min)) else 0
-    irr_max = irr_max * 100 if not (np.isnan(irr_max) or np.isinf(irr_max)) else 0
-
-    # חישוב תקופת החזר
-    payback_period_min = (total_construction_cost * (1 - subsidy_min)) / net_annual_profit_with_subsidy_min
-    payback_period_max = (total_construction_cost * (1 - subsidy_max)) / net_annual_profit_with_subsidy_max
-
-    # החזרת ערכי המדדים הפיננסיים
-    return {
-        'Gross Annual Profit': gross_annual_profit,
-        'Operating Annual Profit': operating_annual_profit,
-        'Net Annual Profit (Before Subsidy)': net_annual_profit_before_subsidy,
-        'Net Annual Profit with Min Subsidy': net_annual_profit_with_subsidy_min,
-        'Net Annual Profit with Max Subsidy': net_annual_profit_with_subsidy_max,
-        'NPV Min': total_npv_min,
-        'NPV Max': total_npv_max,
-        'ROI Min': roi_min,
-        'ROI Max': roi_max,
-        'IRR Min': irr_min,
-        'IRR Max': irr_max,
-        'Payback Period Min': payback_period_min,
-        'Payback Period Max': payback_period_max,
-        'Total Construction Cost': total_construction_cost,
-        'Annual Operational Cost': total_operational_fixed_cost + total_cleaning_cost + total_accessories_cost,
-        'Annual Financing Cost': annual_financing_cost
-    }
+st.image(load_logo("קבוצת מעיינות.png"), width='stretch')
+perf.lap('header')
 
 
 # קלטים מהמשתמש
@@ -263,36 +130,170 @@ additional_interest_rate = st.number_input('ריבית נוספת מעל הפר
 equity_amount = st.number_input('הון עצמי (₪)', min_value=0, value=1000000)
 loan_term = st.slider('תקופת הלוואה (שנים)', min_value=5, max_value=15, value=15, step=1)
 repayment_type = st.selectbox('סוג סילוקין', ['שפיצר', 'קרן שווה', 'בוליט'])
+
+# ריבית משתנה: הפריים משתנה לינארית מהריבית הנוכחית לריבית יעד, עם מחזור ופירעון מוקדם אופציונליים.
+# כשאחת מהאפשרויות מסומנת, עלות המימון, לוח הסילוקין והתזרים מחושבים לפי מסלול הריבית (loan_rate_path).
+loan_rate_key = None
+with st.expander('ריבית משתנה, מחזור ופירעון מוקדם'):
+    rate_col1, rate_col2, rate_col3 = st.columns(3)
+    with rate_col1:
+        rate_curve_enabled = st.checkbox('ריבית פריים משתנה')
+        rate_target = st.number_input('ריבית פריים ביעד (%)', min_value=0.0, value=prime_interest_rate * 100,
+                                      step=0.25) / 100
+        rate_target_month = st.number_input('חודשים עד היעד', min_value=1, max_value=loan_term * 12, value=24)
+    with rate_col2:
+        refinancing_enabled = st.checkbox('מחזור הלוואה')
+        refinancing_month = st.number_input('חודש המחזור', min_value=1, max_value=loan_term * 12, value=60)
+        refinancing_margin = st.number_input('מרווח מעל הפריים אחרי המחזור (%)', value=additional_interest_rate * 100,
+                                             step=0.1) / 100
+    with rate_col3:
+        prepayment_enabled = st.checkbox('פירעון מוקדם')
+        prepayment_month = st.number_input('חודש הפירעון', min_value=1, max_value=loan_term * 12, value=36)
+        prepayment_amount = st.number_input('סכום הפירעון (₪)', min_value=0, value=1000000, step=100000)
+    if rate_curve_enabled or refinancing_enabled or prepayment_enabled:
+        loan_rate_key = (rate_target if rate_curve_enabled else prime_interest_rate, int(rate_target_month),
+                         ((int(refinancing_month), refinancing_margin),) if refinancing_enabled else (),
+                         ((int(prepayment_month), float(prepayment_amount)),) if prepayment_enabled else ())
+loan_rate_path = None
+if loan_rate_key is not None:
+    loan_rate_path = rate_path(forward_curve([(0, prime_interest_rate), (loan_rate_key[1], loan_rate_key[0])],
+                                             loan_term * 12), loan_rate_key[2], loan_rate_key[3])
 tax_rate = st.slider('שיעור מס (%)', min_value=0.0, max_value=50.0, value=7.5) / 100
+subsidy_timing = st.selectbox('עיתוי סובסידיה', list(SUBSIDY_TIMINGS))
+
+# מודל הכנסות לפי לוח שנה: המחיר ללילה הוא מחיר הבסיס (לילה רגיל מחוץ לעונה), ושיעור התפוסה הוא הממוצע השנתי
+revenue_model = st.selectbox('מודל הכנסות', list(REVENUE_MODELS))
+seasonality = {}
+if REVENUE_MODELS.index(revenue_model) == CALENDAR:
+    with st.expander('מכפילי עונתיות', expanded=True):
+        season_col1, season_col2 = st.columns(2)
+        with season_col1:
+            seasonality['weekend_price_multiplier'] = st.number_input('מכפיל מחיר בסוף שבוע', min_value=0.0,
+                                                                      value=1.3, step=0.1)
+            seasonality['holiday_price_multiplier'] = st.number_input('מכפיל מחיר בחגים', min_value=0.0,
+                                                                      value=1.6, step=0.1)
+            seasonality['peak_season_price_multiplier'] = st.number_input('מכפיל מחיר בעונת שיא (יולי-אוגוסט)',
+                                                                          min_value=0.0, value=1.4, step=0.1)
+        with season_col2:
+            seasonality['weekend_occupancy_multiplier'] = st.number_input('מכפיל תפוסה בסוף שבוע', min_value=0.0,
+                                                                          value=1.6, step=0.1)
+            seasonality['holiday_occupancy_multiplier'] = st.number_input('מכפיל תפוסה בחגים', min_value=0.0,
+                                                                          value=2.0, step=0.1)
+            seasonality['peak_season_occupancy_multiplier'] = st.number_input(
+                'מכפיל תפוסה בעונת שיא (יולי-אוגוסט)', min_value=0.0, value=1.5, step=0.1)
+
+
+# עמודות מספריות בטבלה מוצגות עם מפריד אלפים (במקום עיצוב Styler, שבונה HTML לכל תא)
+def number_columns(df):
+    return {name: st.column_config.NumberColumn(format='localized')
+            for name in df.columns if df[name].dtype.kind in 'iuf'}
+
+
+# קולט ההזמנות משותף לכל המשתמשים בתהליך; מצב הקליטה נשמר בדיסק ולכן קליטה חוזרת קוראת רק שורות חדשות
+@st.cache_resource
+def booking_ingestor():
+    return BookingIngestor()
+
+
+# נתוני הזמנות בפועל: קובצי CSV / Parquet גדולים נקלטים במקטעים, ותפוסה ו-ADR לפי חודש ועונה יכולים להחליף
+# את קלטי התפוסה והמחיר (ובמודל לוח השנה גם את מכפילי סוף השבוע ועונת השיא) ולקבוע את טווחי ניתוח הרגישות
+booking_inputs = {}
+booking_ranges = {}
+with st.expander('נתוני הזמנות בפועל'):
+    bookings = booking_ingestor()
+    booking_files = st.text_input('קובצי הזמנות (נתיב או תבנית glob, CSV או Parquet)')
+    if st.button('קליטת הזמנות', disabled=not booking_files):
+        try:
+            with st.spinner('קולט הזמנות...'):
+                new_rows = bookings.ingest(booking_files)
+            st.success(f'נקלטו {sum(new_rows.values()):,} שורות חדשות מ-{len(new_rows)} קבצים')
+        except (OSError, ValueError, KeyError) as error:
+            st.error(f'שגיאה בקליטת ההזמנות: {error}')
+
+    booking_months = bookings.months()
+    if booking_months:
+        booking_villas = st.number_input('מספר הווילות בנתוני ההזמנות', min_value=1,
+                                         value=bookings.villa_count() or num_villas)
+        booking_table = monthly_table(booking_months, booking_villas)
+        import pandas as pd
+
+        booking_df = pd.DataFrame({'חודש': booking_table['Month'], 'עונה': booking_table['Season'],
+                                   'לילות': booking_table['Nights'], 'תפוסה (%)': booking_table['Occupancy'] * 100,
+                                   'ADR (₪)': booking_table['ADR']})
+        st.dataframe(booking_df, hide_index=True, column_config=number_columns(booking_df))
+        for season, summary in season_summary(booking_table).items():
+            st.write(f"עונה {season}: תפוסה {summary['Occupancy']:.1%}, ADR {summary['ADR']:,.0f} ₪")
+        if st.checkbox('שימוש בתפוסה ובמחיר מנתוני ההזמנות'):
+            booking_inputs = model_inputs(booking_table, revenue_model)
+            booking_ranges = observed_ranges(booking_table)
+            st.info(('התפוסה, המחיר ומכפילי העונתיות' if seasonality else 'התפוסה והמחיר') +
+                    ' מחושבים מנתוני ההזמנות במקום הערכים שהוזנו למעלה')
 
 # שיעור מס וסובסידיות
 subsidy_min = 20 / 100
 subsidy_max = 30 / 100
 
-# חישוב עלות ההשקעה בניכוי הון עצמי
-total_project_cost = (
-        construction_cost_per_sqm * villa_size_sqm * num_villas +
-        land_cost_per_villa * num_villas +
-        land_development_cost +
-        public_area_development_cost +
-        reception_and_logistics_cost +
-        small_event_hall_cost +
-        planning_and_consultants_cost
-)
-
-loan_amount = total_project_cost - equity_amount
-
-# חישוב תשלומי הלוואה
-loan_payments = calculate_loan_repayment(loan_amount, prime_interest_rate + additional_interest_rate, loan_term,
-                                         repayment_type)
-loan_payments_df = pd.DataFrame(loan_payments)
-
-# חישוב תוצאות פיננסיות לפרויקט
-metrics = calculate_financial_metrics(num_villas, villa_size_sqm)
+# כל הקלטים כאובייקט פרמטרים קפוא - משמש כמפתח למטמוני החישוב
+params = ProjectParams(
+    num_villas=num_villas,
+    villa_size_sqm=villa_size_sqm,
+    price_per_night=price_per_night,
+    occupancy_rate=occupancy_rate,
+    land_cost_per_villa=land_cost_per_villa,
+    construction_cost_per_sqm=construction_cost_per_sqm,
+    monthly_operational_cost_per_villa=monthly_operational_cost_per_villa,
+    annual_marketing_cost=annual_marketing_cost,
+    land_development_cost=land_development_cost,
+    public_area_development_cost=public_area_development_cost,
+    reception_and_logistics_cost=reception_and_logistics_cost,
+    small_event_hall_cost=small_event_hall_cost,
+    planning_and_consultants_cost=planning_and_consultants_cost,
+    cleaning_cost_per_night=cleaning_cost_per_night,
+    accessories_cost_per_night=accessories_cost_per_night,
+    annual_insurance_cost_per_villa=annual_insurance_cost_per_villa,
+    annual_inflation_rate=annual_inflation_rate,
+    discount_rate=discount_rate,
+    prime_interest_rate=prime_interest_rate,
+    additional_interest_rate=additional_interest_rate,
+    equity_amount=equity_amount,
+    loan_term=loan_term,
+    repayment_type=repayment_type,
+    tax_rate=tax_rate,
+    subsidy_min=subsidy_min,
+    subsidy_max=subsidy_max,
+    subsidy_timing=subsidy_timing,
+    revenue_model=revenue_model,
+    **seasonality,
+).replace(**booking_inputs)
+perf.lap('inputs')
+
+# מאגר התרחישים המקומי (SQLite), משותף לכל המשתמשים בתהליך
+scenario_store = default_store()
+
+# שירות החישוב המשותף: ניתוחי רגישות, חיפוש יעד, מונטה קרלו, תיק פרויקטים ודוחות נשלחים אליו כמשימות.
+# משימות זהות של כמה משתמשים מתאחדות, התוצאות נשמרות במטמון משותף, וכל משתמש מוגבל במספר המשימות
+# שרצות עבורו במקביל. המשימות רצות בתהליכים נפרדים (PROFITABILITY_WORKERS קובע את מספרם).
+compute = default_service()
+session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+# חישוב המודל בגרף התלויות של המשתמש: רק שלבים שהקלטים שלהם השתנו מאז ההרצה הקודמת מחושבים מחדש
+# (למשל שינוי שיעור ההיוון מחשב מחדש רק את ה-NPV, ועלות ניקיון אינה בונה מחדש את לוח הסילוקין).
+# מסלול הריבית המשתנה הוא קלט של הגרף, כך ששינוי שלו פוסל רק את המימון ולוח הסילוקין ואת מה שתלוי בהם.
+# בשלב זה מחושבים רק המדדים; לוח הסילוקין נבנה רק כשפותחים את הלשונית שלו או מפיקים דוח.
+model_graph = st.session_state.setdefault('model_graph', ModelGraph())
+metrics = model_graph.evaluate(params, ('metrics',), loan_rate_path)[0]['metrics']
+perf.lap('model')
+
+
+# לוח הסילוקין לתצוגה ולדוחות (מהגרף, בריבית קבועה או לפי מסלול הריבית)
+def loan_payments_table():
+    return model_graph.get('loan_schedule')
 
 
 # פונקציה להצגת מדד צבעוני
 def color_metric(value, threshold_good, threshold_bad, reverse=False):
+    if np.isnan(value):
+        return "gray"
     if reverse:
         if value <= threshold_good:
             return "green"
@@ -309,90 +310,52 @@ def color_metric(value, threshold_good, threshold_bad, reverse=False):
             return "orange"
 
 
-# הצגת מדדים צבעוניים
-st.markdown("### מדדים עיקריים")
+# פונקציה להצגת אחוז, כשמדד ללא פתרון (NaN) מוצג כ"לא מוגדר"
+def format_percent(value):
+    if np.isnan(value):
+        return "לא מוגדר"
+    return f"{value:.2f}%"
 
-col1, col2, col3, col4 = st.columns(4)
 
-with col1:
-    roi_color = color_metric(metrics['ROI Min'], 15, 5)
-    st.markdown(f"<h1 style='text-align: center; color: {roi_color};'>{metrics['ROI Min']:.2f}%</h1>",
-                unsafe_allow_html=True)
-    st.markdown("<p style='text-align: center;'>ROI מינימלי</p>", unsafe_allow_html=True)
+# עקומת רגישות של משתנה אחד. הערך הנוכחי של המשתנה הנבדק אינו משפיע על התוצאה ולכן מאופס לברירת המחדל
+# (כך שהמשימה זהה לכל ערך שלו), ועקומות שחושבו כבר בסשן אחר נקראות ממאגר התרחישים שבדיסק.
+# כשמשתמשים בנתוני ההזמנות, הטווח של התפוסה והמחיר הוא הטווח שנצפה בהם (מהחודש החלש לחזק).
+def sensitivity_curve(variable_name):
+    field = SENSITIVITY_VARIABLES[variable_name][0]
+    return compute.run(session_id, 'sensitivity', (params.replace(**{field: DEFAULT_SCENARIO[field]}), variable_name,
+                                                   booking_ranges.get(variable_name)), {'rate_path': loan_rate_path})
 
-with col2:
-    npv_color = color_metric(metrics['NPV Min'], 0, -1000000)
-    st.markdown(f"<h1 style='text-align: center; color: {npv_color};'>{int(metrics['NPV Min']):,} ₪</h1>",
-                unsafe_allow_html=True)
-    st.markdown("<p style='text-align: center;'>NPV מינימלי</p>", unsafe_allow_html=True)
 
-with col3:
-    irr_color = color_metric(metrics['IRR Min'], 10, 5)
-    st.markdown(f"<h1 style='text-align: center; color: {irr_color};'>{metrics['IRR Min']:.2f}%</h1>",
-                unsafe_allow_html=True)
-    st.markdown("<p style='text-align: center;'>IRR מינימלי</p>", unsafe_allow_html=True)
+# התרשימים נבנים בפונקציות נפרדות ונשמרים ב-figure_cache לפי הקלטים שלהם, כך שחזרה ללשונית
+# או הרצה חוזרת עם אותם קלטים אינה בונה את התרשים מחדש
 
-with col4:
-    payback_color = color_metric(metrics['Payback Period Max'], 7, 10, reverse=True)
-    st.markdown(f"<h1 style='text-align: center; color: {payback_color};'>{metrics['Payback Period Max']:.2f}</h1>",
-                unsafe_allow_html=True)
-    st.markdown("<p style='text-align: center;'>תקופת החזר מקסימלית (שנים)</p>", unsafe_allow_html=True)
-
-# הוספת הסבר על המדדים
-st.markdown("""
-**הסבר על המדדים:**
-- **ROI (Return on Investment)**: אחוז התשואה על ההשקעה. ערך גבוה יותר טוב יותר.
-- **NPV (Net Present Value)**: הערך הנוכחי הנקי של ההשקעה. ערך חיובי מצביע על השקעה כדאית.
-- **IRR (Internal Rate of Return)**: שיעור התשואה הפנימי. ככל שהערך גבוה יותר, כך ההשקעה אטרקטיבית יותר.
-- **תקופת החזר**: הזמן שלוקח להחזיר את ההשקעה הראשונית. ערך נמוך יותר טוב יותר.
-
-שים לב: יש לבחון את כל המדדים יחד כדי לקבל תמונה מלאה על כדאיות ההשקעה.
-""")
-
-# הצגת תוצאות פיננסיות מפורטות
-st.markdown("### תוצאות פיננסיות מפורטות")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    st.write(f"**רווח גולמי שנתי:** {int(metrics['Gross Annual Profit']):,} ₪")
-    st.write(f"**רווח תפעולי שנתי:** {int(metrics['Operating Annual Profit']):,} ₪")
-    st.write(f"**רווח נקי שנתי (לפני סובסידיה):** {int(metrics['Net Annual Profit (Before Subsidy)']):,} ₪")
-    st.write(f"**רווח נקי שנתי (עם סובסידיה מינימלית):** {int(metrics['Net Annual Profit with Min Subsidy']):,} ₪")
-    st.write(f"**רווח נקי שנתי (עם סובסידיה מקסימלית):** {int(metrics['Net Annual Profit with Max Subsidy']):,} ₪")
-
-with col2:
-    st.write(f"**ROI מינימלי:** {metrics['ROI Min']:.2f}%")
-    st.write(f"**ROI מקסימלי:** {metrics['ROI Max']:.2f}%")
-    st.write(f"**IRR מינימלי:** {metrics['IRR Min']:.2f}%")
-    st.write(f"**IRR מקסימלי:** {metrics['IRR Max']:.2f}%")
-    st.write(f"**NPV מינימלי:** {int(metrics['NPV Min']):,} ₪")
-    st.write(f"**NPV מקסימלי:** {int(metrics['NPV Max']):,} ₪")
-
-st.write(f"**תקופת החזר מינימלית:** {metrics['Payback Period Min']:.2f} שנים")
-st.write(f"**תקופת החזר מקסימלית:** {metrics['Payback Period Max']:.2f} שנים")
-st.write(f"**עלות הקמה כוללת:** {int(metrics['Total Construction Cost']):,} ₪")
-st.write(f"**עלות תפעול שנתית:** {int(metrics['Annual Operational Cost']):,} ₪")
-st.write(f"**עלות מימון שנתית:** {int(metrics['Annual Financing Cost']):,} ₪")
-
-if plotly_available:
-    # תרשים עוגה להשוואת חלוקת ההכנסות
+# רכיבי הרווח השנתי לתרשימי העוגה והמפל: (רווח תפעולי, רווח נקי, עלויות מימון, מיסים)
+def profit_breakdown(metrics, tax_rate):
     operating_profit = metrics['Operating Annual Profit']
-    net_profit = metrics['Net Annual Profit (Before Subsidy)']
     financing_costs = metrics['Annual Financing Cost']
+    return (operating_profit, metrics['Net Annual Profit (Before Subsidy)'], financing_costs,
+            (operating_profit - financing_costs) * tax_rate)
+
 
+# תרשים עוגה להשוואת חלוקת ההכנסות
+def pie_figure(metrics, tax_rate):
+    import plotly.graph_objects as go
+
+    _, net_profit, financing_costs, taxes = profit_breakdown(metrics, tax_rate)
     fig_pie = go.Figure(data=[go.Pie(
         labels=['רווח נקי', 'עלויות תפעול', 'עלויות מימון', 'מיסים'],
-        values=[net_profit,
-                metrics['Annual Operational Cost'],
-                financing_costs,
-                (operating_profit - financing_costs) * tax_rate],
+        values=[net_profit, metrics['Annual Operational Cost'], financing_costs, taxes],
         hole=.3
     )])
     fig_pie.update_layout(title_text="התפלגות ההכנסות השנתיות")
-    st.plotly_chart(fig_pie)
+    return fig_pie
+
+
+# תרשים מפל להצגת השפעת הפרמטרים על הרווח
+def waterfall_figure(metrics, tax_rate):
+    import plotly.graph_objects as go
 
-    # תרשים מפל להצגת השפעת הפרמטרים על הרווח
+    _, net_profit, financing_costs, taxes = profit_breakdown(metrics, tax_rate)
     fig_waterfall = go.Figure(go.Waterfall(
         name="20", orientation="v",
         measure=["relative", "relative", "relative", "relative", "total"],
@@ -401,83 +364,36 @@ if plotly_available:
         text=[f"+{metrics['Gross Annual Profit']:,.0f}",
               f"-{metrics['Annual Operational Cost']:,.0f}",
               f"-{financing_costs:,.0f}",
-              f"-{((operating_profit - financing_costs) * tax_rate):,.0f}",
+              f"-{taxes:,.0f}",
               f"{net_profit:,.0f}"],
         y=[metrics['Gross Annual Profit'],
            -metrics['Annual Operational Cost'],
            -financing_costs,
-           -((operating_profit - financing_costs) * tax_rate),
+           -taxes,
            net_profit],
         connector={"line": {"color": "rgb(63, 63, 63)"}},
     ))
     fig_waterfall.update_layout(title_text="ניתוח רווח שנתי", waterfallgap=0.3)
-    st.plotly_chart(fig_waterfall)
-else:
-    st.warning("הספרייה 'plotly' לא מותקנת. התרשימים לא יוצגו.")
-
-# הצגת טבלת תשלומי הלוואה
-st.markdown("<div dir='rtl'>### תשלומי הלוואה לפי סוג סילוקין</div>", unsafe_allow_html=True)
-st.dataframe(loan_payments_df.style.set_properties(**{'text-align': 'right'}))
-
-# ניתוח רגישות
-st.markdown("### ניתוח רגישות")
-
-# בחירת משתנה לניתוח
-variable_to_analyze = st.selectbox('בחר משתנה לניתוח רגישות',
-                                   ['מספר וילות', 'שיעור תפוסה', 'מחיר ללילה', 'שיעור היוון', 'שיעור מס'])
-
-# הגדרת טווחים
-if variable_to_analyze == 'מספר וילות':
-    variable_range = range(5, 41)
-elif variable_to_analyze == 'שיעור תפוסה':
-    variable_range = range(20, 101)
-elif variable_to_analyze == 'מחיר ללילה':
-    variable_range = range(2000, 8001, 100)
-elif variable_to_analyze == 'שיעור היוון':
-    variable_range = range(1, 21)
-elif variable_to_analyze == 'שיעור מס':
-    variable_range = range(0, 51)
-
-
-# פונקציה לניתוח רגישות
-def sensitivity_analysis(base_villas, base_size, variable_name, variable_range):
-    results = []
-    for value in variable_range:
-        if variable_name == 'מספר וילות':
-            temp_metrics = calculate_financial_metrics(value, base_size)
-        elif variable_name == 'שיעור תפוסה':
-            global occupancy_rate
-            occupancy_rate = value / 100
-            temp_metrics = calculate_financial_metrics(base_villas, base_size)
-        elif variable_name == 'מחיר ללילה':
-            global price_per_night
-            price_per_night = value
-            temp_metrics = calculate_financial_metrics(base_villas, base_size)
-        elif variable_name == 'שיעור היוון':
-            global discount_rate
-            discount_rate = value / 100
-            temp_metrics = calculate_financial_metrics(base_villas, base_size)
-        elif variable_name == 'שיעור מס':
-            global tax_rate
-            tax_rate = value / 100
-            temp_metrics = calculate_financial_metrics(base_villas, base_size)
-
-        results.append({
-            'ערך': value,
-            'ROI': temp_metrics['ROI Min'],
-            'NPV': temp_metrics['NPV Min'],
-            'IRR': temp_metrics['IRR Min'],
-            'תקופת החזר': temp_metrics['Payback Period Max']
-        })
-
-    return results
-
-# ביצוע ניתוח רגישות
-sensitivity_results = sensitivity_analysis(num_villas, villa_size_sqm, variable_to_analyze, variable_range)
-df_sensitivity = pd.DataFrame(sensitivity_results)
-
-# הצגת גרף ניתוח רגישות
-if plotly_available:
+    return fig_waterfall
+
+
+def cash_flow_figure(cash_flow_df):
+    import plotly.graph_objects as go
+
+    fig_cash_flow = go.Figure()
+    fig_cash_flow.add_trace(go.Bar(x=cash_flow_df['שנה'], y=cash_flow_df['הכנסות'], name='הכנסות'))
+    fig_cash_flow.add_trace(go.Bar(x=cash_flow_df['שנה'], y=-cash_flow_df['עלויות תפעול'], name='עלויות תפעול'))
+    fig_cash_flow.add_trace(go.Bar(x=cash_flow_df['שנה'], y=-cash_flow_df['ריבית'], name='ריבית'))
+    fig_cash_flow.add_trace(go.Scatter(x=cash_flow_df['שנה'], y=cash_flow_df['רווח נקי (עם סובסידיה מינימלית)'],
+                                       mode='lines+markers', name='רווח נקי (עם סובסידיה מינימלית)'))
+    fig_cash_flow.update_layout(barmode='relative', title_text="תזרים מזומנים לפי שנה",
+                                xaxis_title='שנה', yaxis_title='₪')
+    return fig_cash_flow
+
+
+def sensitivity_figure(df_sensitivity, variable_to_analyze):
+    import plotly.graph_objects as go
+
     fig_sensitivity = go.Figure()
 
     fig_sensitivity.add_trace(go.Scatter(x=df_sensitivity['ערך'], y=df_sensitivity['ROI'],
@@ -492,154 +408,510 @@ if plotly_available:
     fig_sensitivity.update_layout(title=f'ניתוח רגישות: השפעת {variable_to_analyze} על מדדים פיננסיים',
                                   xaxis_title=variable_to_analyze,
                                   yaxis_title='ערך')
+    return fig_sensitivity
+
+
+def heatmap_figure(grid_results, grid_axes, grid_metric):
+    import plotly.graph_objects as go
 
-    st.plotly_chart(fig_sensitivity)
-else:
-    st.warning("הספרייה 'plotly' לא מותקנת. גרף ניתוח הרגישות לא יוצג.")
-
-# הצגת הנתונים בטבלה
-st.dataframe(df_sensitivity)
-
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.chart import LineChart, Reference
-from openpyxl.utils import get_column_letter
-
-
-def generate_advanced_excel_report():
-    wb = openpyxl.Workbook()
-
-    # גיליון נתונים
-    ws_data = wb.active
-    ws_data.title = "נתונים"
-
-    # כותרות
-    headers = [
-        "פרמטר", "ערך", "יחידה",
-        "מספר וילות", "גודל וילה", "מחיר ללילה", "שיעור תפוסה",
-        "עלות קרקע לוילה", "עלות בנייה למ\"ר", "עלות תפעול חודשית לוילה",
-        "עלות שיווק שנתית", "עלות פיתוח קרקע", "עלות פיתוח שטח ציבורי",
-        "עלות מבנה קבלה", "עלות אולם אירועים", "עלות תכנון ויועצים",
-        "עלות ניקיון ללילה", "עלות אביזרים ללילה", "עלות ביטוח שנתית לוילה",
-        "שיעור אינפלציה שנתי", "שיעור היוון", "ריבית פריים",
-        "ריבית נוספת מעל הפריים", "הון עצמי", "תקופת הלוואה", "סוג סילוקין",
-        "שיעור מס"
-    ]
-
-    for col, header in enumerate(headers, start=1):
-        ws_data.cell(row=1, column=col, value=header)
-        ws_data.cell(row=1, column=col).font = Font(bold=True)
-
-    # נתונים
-    data = [
-        ("מספר וילות", num_villas, ""),
-        ("גודל וילה", villa_size_sqm, "מ\"ר"),
-        ("מחיר ללילה", price_per_night, "₪"),
-        ("שיעור תפוסה", occupancy_rate * 100, "%"),
-        ("עלות קרקע לוילה", land_cost_per_villa, "₪"),
-        ("עלות בנייה למ\"ר", construction_cost_per_sqm, "₪"),
-        ("עלות תפעול חודשית לוילה", monthly_operational_cost_per_villa, "₪"),
-        ("עלות שיווק שנתית", annual_marketing_cost, "₪"),
-        ("עלות פיתוח קרקע", land_development_cost, "₪"),
-        ("עלות פיתוח שטח ציבורי", public_area_development_cost, "₪"),
-        ("עלות מבנה קבלה", reception_and_logistics_cost, "₪"),
-        ("עלות אולם אירועים", small_event_hall_cost, "₪"),
-        ("עלות תכנון ויועצים", planning_and_consultants_cost, "₪"),
-        ("עלות ניקיון ללילה", cleaning_cost_per_night, "₪"),
-        ("עלות אביזרים ללילה", accessories_cost_per_night, "₪"),
-        ("עלות ביטוח שנתית לוילה", annual_insurance_cost_per_villa, "₪"),
-        ("שיעור אינפלציה שנתי", annual_inflation_rate * 100, "%"),
-        ("שיעור היוון", discount_rate * 100, "%"),
-        ("ריבית פריים", prime_interest_rate * 100, "%"),
-        ("ריבית נוספת מעל הפריים", additional_interest_rate * 100, "%"),
-        ("הון עצמי", equity_amount, "₪"),
-        ("תקופת הלוואה", loan_term, "שנים"),
-        ("סוג סילוקין", repayment_type, ""),
-        ("שיעור מס", tax_rate * 100, "%")
-    ]
-
-    for row, (param, value, unit) in enumerate(data, start=2):
-        ws_data.cell(row=row, column=1, value=param)
-        ws_data.cell(row=row, column=2, value=value)
-        ws_data.cell(row=row, column=3, value=unit)
-
-    # גיליון חישובים
-    ws_calc = wb.create_sheet(title="חישובים")
-
-    calc_headers = [
-        "מדד", "ערך", "יחידה"
-    ]
-
-    for col, header in enumerate(calc_headers, start=1):
-        ws_calc.cell(row=1, column=col, value=header)
-        ws_calc.cell(row=1, column=col).font = Font(bold=True)
-
-    calc_data = [
-        ("רווח גולמי שנתי", metrics['Gross Annual Profit'], "₪"),
-        ("רווח תפעולי שנתי", metrics['Operating Annual Profit'], "₪"),
-        ("רווח נקי שנתי (לפני סובסידיה)", metrics['Net Annual Profit (Before Subsidy)'], "₪"),
-        ("רווח נקי שנתי (עם סובסידיה מינימלית)", metrics['Net Annual Profit with Min Subsidy'], "₪"),
-        ("רווח נקי שנתי (עם סובסידיה מקסימלית)", metrics['Net Annual Profit with Max Subsidy'], "₪"),
-        ("ROI מינימלי", metrics['ROI Min'], "%"),
-        ("ROI מקסימלי", metrics['ROI Max'], "%"),
-        ("IRR מינימלי", metrics['IRR Min'], "%"),
-        ("IRR מקסימלי", metrics['IRR Max'], "%"),
-        ("NPV מינימלי", metrics['NPV Min'], "₪"),
-        ("NPV מקסימלי", metrics['NPV Max'], "₪"),
-        ("תקופת החזר מינימלית", metrics['Payback Period Min'], "שנים"),
-        ("תקופת החזר מקסימלית", metrics['Payback Period Max'], "שנים"),
-        ("עלות הקמה כוללת", metrics['Total Construction Cost'], "₪"),
-        ("עלות תפעול שנתית", metrics['Annual Operational Cost'], "₪"),
-        ("עלות מימון שנתית", metrics['Annual Financing Cost'], "₪")
-    ]
-
-    for row, (metric, value, unit) in enumerate(calc_data, start=2):
-        ws_calc.cell(row=row, column=1, value=metric)
-        ws_calc.cell(row=row, column=2, value=value)
-        ws_calc.cell(row=row, column=3, value=unit)
-
-    # גיליון גרף
-    ws_chart = wb.create_sheet(title="גרף כדאיות")
-
-    # נתונים לגרף
-    chart_data = [
-                     ("שנה", "תזרים מזומנים", "NPV מצטבר")
-                 ] + [
-                     (year,
-                      metrics['Net Annual Profit with Min Subsidy'],
-                      metrics['NPV Min'] * (1 - (1 / (1 + discount_rate)) ** (year)) / (1 - (1 / (1 + discount_rate))))
-                     for year in range(1, loan_term + 1)
-                 ]
-
-    for row, data in enumerate(chart_data, start=1):
-        for col, value in enumerate(data, start=1):
-            ws_chart.cell(row=row, column=col, value=value)
-
-    # יצירת גרף
-    chart = LineChart()
-    chart.title = "כדאיות הפרויקט לאורך זמן"
-    chart.x_axis.title = "שנה"
-    chart.y_axis.title = "ערך (₪)"
-
-    data = Reference(ws_chart, min_col=2, min_row=1, max_col=3, max_row=loan_term + 1)
-    cats = Reference(ws_chart, min_col=1, min_row=2, max_row=loan_term + 1)
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(cats)
-
-    ws_chart.add_chart(chart, "E5")
-
-    # שמירת הקובץ
-    excel_filename = "advanced_investment_report.xlsx"
-    wb.save(excel_filename)
-
-    # הצגת הודעה למשתמש והורדת הקובץ
-    with open(excel_filename, "rb") as file:
-        st.download_button(label='Download Advanced Excel Report', data=file, file_name=excel_filename)
-
-
-# עדכון הכפתור ליצירת דוח Excel
+    x_name, y_name = grid_axes
+    fig_heatmap = go.Figure(go.Heatmap(z=grid_results[grid_metric].T, x=grid_axes[x_name], y=grid_axes[y_name],
+                                       colorscale='RdYlGn', colorbar={'title': grid_metric}))
+    fig_heatmap.update_layout(title=f'{grid_metric} לפי {x_name} ו{y_name}', xaxis_title=x_name, yaxis_title=y_name)
+    return fig_heatmap
+
+
+def tornado_figure(df_tornado):
+    import plotly.graph_objects as go
+
+    npv_base = df_tornado['NPV בסיס'].iloc[0]
+    fig_tornado = go.Figure()
+    fig_tornado.add_trace(go.Bar(y=df_tornado['משתנה'], x=df_tornado['NPV נמוך'] - npv_base, base=npv_base,
+                                 orientation='h', name='ערך נמוך (-20%)'))
+    fig_tornado.add_trace(go.Bar(y=df_tornado['משתנה'], x=df_tornado['NPV גבוה'] - npv_base, base=npv_base,
+                                 orientation='h', name='ערך גבוה (+20%)'))
+    fig_tornado.update_layout(title='טורנדו: השפעת שינוי של ±20% בכל משתנה על NPV', barmode='overlay',
+                              xaxis_title='NPV (₪)', yaxis={'autorange': 'reversed'})
+    return fig_tornado
+
+
+# גמישות NPV ו-IRR לכל קלט (לפי הדירוג, הקלטים המשפיעים ביותר למעלה)
+def elasticity_figure(df_elasticity, top=15):
+    import plotly.graph_objects as go
+
+    df_top = df_elasticity.head(top)
+    fig_elasticity = go.Figure()
+    fig_elasticity.add_trace(go.Bar(y=df_top['משתנה'], x=df_top['גמישות NPV'], orientation='h', name='NPV'))
+    fig_elasticity.add_trace(go.Bar(y=df_top['משתנה'], x=df_top['גמישות IRR'], orientation='h', name='IRR'))
+    fig_elasticity.update_layout(title='גמישות: שינוי באחוזים במדד לכל 1% שינוי בקלט', barmode='group',
+                                 xaxis_title='גמישות', yaxis={'autorange': 'reversed'})
+    return fig_elasticity
+
+
+# עקומות המחיר והתפוסה היומיות של שנת הייחוס במודל לוח השנה
+def seasonality_figure(params):
+    import plotly.graph_objects as go
+
+    curves = daily_curves(scenario_columns(params.as_dict()))
+    fig_seasonality = go.Figure()
+    fig_seasonality.add_trace(go.Scatter(x=curves['Date'], y=curves['Price'][0], name='מחיר ללילה (₪)'))
+    fig_seasonality.add_trace(go.Scatter(x=curves['Date'], y=curves['Occupancy'][0] * 100, name='תפוסה (%)',
+                                         yaxis='y2'))
+    fig_seasonality.update_layout(title_text="מחיר ותפוסה לפי יום בשנה", xaxis_title='תאריך', yaxis_title='₪',
+                                  yaxis2={'title': '%', 'overlaying': 'y', 'side': 'right', 'range': [0, 100]})
+    return fig_seasonality
+
+
+# היסטוגרמת NPV מהסימולציה (המונים שמחוץ לטווח ההיסטוגרמה אינם מוצגים)
+def simulation_figure(npv_histogram, draws):
+    import plotly.graph_objects as go
+
+    fig_mc = go.Figure(go.Bar(x=(npv_histogram.edges[:-1] + npv_histogram.edges[1:]) / 2,
+                              y=npv_histogram.counts[1:-1]))
+    fig_mc.update_layout(title=f'התפלגות NPV ({draws:,} הגרלות)', xaxis_title='NPV (₪)',
+                         yaxis_title='מספר הגרלות', bargap=0)
+    return fig_mc
+
+
+def portfolio_figure(portfolio_timeline):
+    import plotly.graph_objects as go
+
+    fig_portfolio = go.Figure()
+    fig_portfolio.add_trace(go.Scatter(x=portfolio_timeline['Year'],
+                                       y=np.cumsum(portfolio_timeline['Net Cash Flow Min']), name='תזרים מצטבר'))
+    fig_portfolio.add_trace(go.Scatter(x=portfolio_timeline['Year'], y=portfolio_timeline['Outstanding Debt'],
+                                       name='יתרת חוב'))
+    fig_portfolio.update_layout(title_text="תזרים מצטבר ויתרת חוב של התיק", xaxis_title='שנה', yaxis_title='₪')
+    return fig_portfolio
+
+
+# הצגת מדדים צבעוניים
+st.markdown("### מדדים עיקריים")
+
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    roi_color = color_metric(metrics['ROI Min'], 15, 5)
+    st.markdown(f"<h1 style='text-align: center; color: {roi_color};'>{format_percent(metrics['ROI Min'])}</h1>",
+                unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center;'>ROI מינימלי</p>", unsafe_allow_html=True)
+
+with col2:
+    npv_color = color_metric(metrics['NPV Min'], 0, -1000000)
+    st.markdown(f"<h1 style='text-align: center; color: {npv_color};'>{int(metrics['NPV Min']):,} ₪</h1>",
+                unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center;'>NPV מינימלי</p>", unsafe_allow_html=True)
+
+with col3:
+    irr_color = color_metric(metrics['IRR Min'], 10, 5)
+    st.markdown(f"<h1 style='text-align: center; color: {irr_color};'>{format_percent(metrics['IRR Min'])}</h1>",
+                unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center;'>IRR מינימלי</p>", unsafe_allow_html=True)
+
+with col4:
+    payback_color = color_metric(metrics['Payback Period Max'], 7, 10, reverse=True)
+    st.markdown(f"<h1 style='text-align: center; color: {payback_color};'>{metrics['Payback Period Max']:.2f}</h1>",
+                unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center;'>תקופת החזר מקסימלית (שנים)</p>", unsafe_allow_html=True)
+perf.lap('kpis')
+
+# שאר הדשבורד מחולק ללשוניות, וכל לשונית מחשבת ובונה את התוכן שלה רק כשהיא פתוחה
+# (on_change='rerun' מריץ את הדף מחדש במעבר בין לשוניות, ו-tab.open מציין את הלשונית הפעילה)
+(details_tab, charts_tab, loan_tab, cash_flow_tab, sensitivity_tab, grid_tab, goal_tab, simulation_tab,
+ portfolio_tab) = st.tabs(['תוצאות מפורטות', 'תרשימים', 'לוח סילוקין', 'תזרים מזומנים', 'ניתוח רגישות',
+                           'רגישות דו-ממדית', 'חיפוש יעד', 'מונטה קרלו', 'תיק פרויקטים'],
+                          key='dashboard_section', on_change='rerun')
+
+if details_tab.open:
+    with details_tab:
+        # הוספת הסבר על המדדים
+        st.markdown("""
+**הסבר על המדדים:**
+- **ROI (Return on Investment)**: אחוז התשואה על ההשקעה. ערך גבוה יותר טוב יותר.
+- **NPV (Net Present Value)**: הערך הנוכחי הנקי של ההשקעה. ערך חיובי מצביע על השקעה כדאית.
+- **IRR (Internal Rate of Return)**: שיעור התשואה הפנימי. ככל שהערך גבוה יותר, כך ההשקעה אטרקטיבית יותר.
+- **תקופת החזר**: הזמן שלוקח להחזיר את ההשקעה הראשונית. ערך נמוך יותר טוב יותר.
+
+שים לב: יש לבחון את כל המדדים יחד כדי לקבל תמונה מלאה על כדאיות ההשקעה.
+""")
+
+        # הצגת תוצאות פיננסיות מפורטות
+        st.markdown("### תוצאות פיננסיות מפורטות")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write(f"**רווח גולמי שנתי:** {int(metrics['Gross Annual Profit']):,} ₪")
+            st.write(f"**רווח תפעולי שנתי:** {int(metrics['Operating Annual Profit']):,} ₪")
+            st.write(f"**רווח נקי שנתי (לפני סובסידיה):** {int(metrics['Net Annual Profit (Before Subsidy)']):,} ₪")
+            st.write(f"**רווח נקי שנתי (עם סובסידיה מינימלית):** "
+                     f"{int(metrics['Net Annual Profit with Min Subsidy']):,} ₪")
+            st.write(f"**רווח נקי שנתי (עם סובסידיה מקסימלית):** "
+                     f"{int(metrics['Net Annual Profit with Max Subsidy']):,} ₪")
+
+        with col2:
+            st.write(f"**ROI מינימלי:** {format_percent(metrics['ROI Min'])}")
+            st.write(f"**ROI מקסימלי:** {format_percent(metrics['ROI Max'])}")
+            st.write(f"**IRR מינימלי:** {format_percent(metrics['IRR Min'])}")
+            st.write(f"**IRR מקסימלי:** {format_percent(metrics['IRR Max'])}")
+            st.write(f"**NPV מינימלי:** {int(metrics['NPV Min']):,} ₪")
+            st.write(f"**NPV מקסימלי:** {int(metrics['NPV Max']):,} ₪")
+
+        st.write(f"**תקופת החזר מינימלית:** {metrics['Payback Period Min']:.2f} שנים")
+        st.write(f"**תקופת החזר מקסימלית:** {metrics['Payback Period Max']:.2f} שנים")
+        st.write(f"**עלות הקמה כוללת:** {int(metrics['Total Construction Cost']):,} ₪")
+        st.write(f"**עלות תפעול שנתית:** {int(metrics['Annual Operational Cost']):,} ₪")
+        st.write(f"**עלות מימון שנתית:** {int(metrics['Annual Financing Cost']):,} ₪")
+    perf.lap('details')
+
+if charts_tab.open:
+    with charts_tab:
+        if plotly_available:
+            st.plotly_chart(figure_cache.get_or_compute(('pie', params, loan_rate_key),
+                                                        lambda: pie_figure(metrics, tax_rate)))
+            st.plotly_chart(figure_cache.get_or_compute(('waterfall', params, loan_rate_key),
+                                                        lambda: waterfall_figure(metrics, tax_rate)))
+        else:
+            st.warning("הספרייה 'plotly' לא מותקנת. התרשימים לא יוצגו.")
+    perf.lap('charts')
+
+if loan_tab.open:
+    with loan_tab:
+        import pandas as pd
+
+        # הצגת טבלת תשלומי הלוואה בעמודים של שנה (12 תשלומים), כך שנשלחים לדפדפן רק התשלומים המוצגים
+        st.markdown("### תשלומי הלוואה לפי סוג סילוקין")
+        loan_payments = loan_payments_table()
+        loan_years = max(1, -(-len(loan_payments['תשלום']) // 12))
+        loan_year = st.number_input('שנת הלוואה', min_value=1, max_value=loan_years, value=1, step=1)
+        loan_page = pd.DataFrame({name: column[(loan_year - 1) * 12:loan_year * 12]
+                                  for name, column in loan_payments.items()})
+        st.dataframe(loan_page, hide_index=True, column_config=number_columns(loan_page))
+        st.caption(f"שנה {loan_year} מתוך {loan_years} ({len(loan_payments['תשלום'])} תשלומים)")
+
+        # מבחן קיצון לריבית: אלפי מסלולים סטוכסטיים של הפריים (חזרה לממוצע, בצעדים של 0.25%) סביב הריבית
+        # הנוכחית, עם זעזוע מקביל אופציונלי; עלות המימון ושירות החוב מחושבים לכל מסלול בנפרד
+        st.markdown("### מבחן קיצון לריבית הפריים")
+        stress_col1, stress_col2 = st.columns(2)
+        with stress_col1:
+            stress_paths = st.selectbox('מספר מסלולי ריבית', [1000, 10000, 50000], index=1)
+            stress_volatility = st.slider('תנודתיות שנתית של הפריים (נקודות אחוז)', 0.0, 5.0, 1.0) / 100
+            stress_reversion = st.slider('קצב חזרה לממוצע (לשנה)', 0.0, 2.0, 0.3)
+        with stress_col2:
+            stress_long_term = st.number_input('ריבית פריים ארוכת טווח (%)', min_value=0.0,
+                                               value=prime_interest_rate * 100, step=0.25) / 100
+            stress_shock = st.slider('זעזוע ריבית מקביל (נקודות אחוז)', -3.0, 5.0, 0.0, step=0.25) / 100
+            stress_seed = st.number_input('זרע אקראי למסלולים', min_value=0, value=42)
+        if st.button('הרץ מבחן קיצון לריבית'):
+            stress_summary = compute.run(session_id, 'rate_stress', (params, stress_paths),
+                                         {'volatility': stress_volatility, 'mean_reversion': stress_reversion,
+                                          'long_term_rate': stress_long_term, 'shock': stress_shock,
+                                          'seed': stress_seed,
+                                          'refinancing': loan_rate_path['Refinancing'] if loan_rate_path else (),
+                                          'prepayments': loan_rate_path['Prepayments'] if loan_rate_path else ()})
+            stress_col1, stress_col2, stress_col3 = st.columns(3)
+            stress_col1.metric('NPV חציוני (P50)', f"{stress_summary['NPV Min']['P50']:,.0f} ₪")
+            stress_col2.metric('הסתברות ל-NPV שלילי', f"{stress_summary['Probability NPV < 0']:.1%}")
+            stress_col3.metric('שירות חוב שנתי מרבי (P95)', f"{stress_summary['Peak Debt Service']['P95']:,.0f} ₪")
+            st.dataframe(pd.DataFrame({
+                'NPV (₪)': stress_summary['NPV Min'],
+                'IRR (%)': stress_summary['IRR Min'],
+                'עלות מימון בשנה הראשונה (₪)': stress_summary['Annual Financing Cost'],
+                'סך הריבית (₪)': stress_summary['Total Interest'],
+                'שירות חוב בשנה הראשונה (₪)': stress_summary['First Year Debt Service'],
+                'שירות חוב שנתי מרבי (₪)': stress_summary['Peak Debt Service'],
+            }))
+    perf.lap('loan_table')
+
+if cash_flow_tab.open:
+    with cash_flow_tab:
+        import pandas as pd
+
+        # תזרים מזומנים שנתי (הכנסות ועלויות מוצמדות לאינפלציה, ריבית וקרן לפי לוח הסילוקין)
+        st.markdown("### תזרים מזומנים שנתי")
+        cash_flow_df = pd.DataFrame(cash_flow_table(params, loan_rate_path))
+        st.dataframe(cash_flow_df, hide_index=True, column_config=number_columns(cash_flow_df))
+        if plotly_available:
+            st.plotly_chart(figure_cache.get_or_compute(('cash_flow', params, loan_rate_key),
+                                                        lambda: cash_flow_figure(cash_flow_df)))
+            if seasonality:
+                st.plotly_chart(figure_cache.get_or_compute(('seasonality', params),
+                                                            lambda: seasonality_figure(params)))
+    perf.lap('cash_flows')
+
+if sensitivity_tab.open:
+    with sensitivity_tab:
+        import pandas as pd
+
+        # ניתוח רגישות
+        st.markdown("### ניתוח רגישות")
+
+        # בחירת משתנה לניתוח (הבחירה נשמרת גם לדוח ה-Excel)
+        variable_to_analyze = st.selectbox('בחר משתנה לניתוח רגישות', list(SENSITIVITY_VARIABLES))
+        st.session_state['report_sensitivity_variable'] = variable_to_analyze
+        df_sensitivity = pd.DataFrame(sensitivity_curve(variable_to_analyze))
+
+        # הצגת גרף ניתוח רגישות
+        if plotly_available:
+            sensitivity_field = SENSITIVITY_VARIABLES[variable_to_analyze][0]
+            st.plotly_chart(figure_cache.get_or_compute(
+                ('sensitivity', params.replace(**{sensitivity_field: None}), variable_to_analyze,
+                 booking_ranges.get(variable_to_analyze), loan_rate_key),
+                lambda: sensitivity_figure(df_sensitivity, variable_to_analyze)))
+        else:
+            st.warning("הספרייה 'plotly' לא מותקנת. גרף ניתוח הרגישות לא יוצג.")
+
+        # הצגת הנתונים בטבלה
+        st.dataframe(df_sensitivity, hide_index=True)
+    perf.lap('sensitivity')
+
+if grid_tab.open:
+    with grid_tab:
+        import pandas as pd
+
+        # ניתוח רגישות רב-ממדי: מפת חום לשני משתנים וטורנדו לכל המשתנים, כל אחד במעבר וקטורי אחד
+        st.markdown("### ניתוח רגישות דו-ממדי")
+
+        grid_variables = st.multiselect('בחר שני משתנים למפת חום', list(SENSITIVITY_VARIABLES),
+                                        default=['שיעור תפוסה', 'מחיר ללילה'], max_selections=2)
+        grid_resolution = st.slider('רזולוציית הרשת (נקודות לכל ציר)', min_value=10, max_value=100, value=50,
+                                    step=10)
+        grid_metric = st.selectbox('מדד להצגה במפת החום', list(GRID_METRICS))
+
+        if len(grid_variables) == 2:
+            grid_axes = {name: default_axis(name, grid_resolution) for name in grid_variables}
+            grid_results = compute.run(session_id, 'grid', (params, grid_axes), {'rate_path': loan_rate_path})
+            if plotly_available:
+                st.plotly_chart(figure_cache.get_or_compute(
+                    ('heatmap', params, tuple(grid_variables), grid_resolution, grid_metric, loan_rate_key),
+                    lambda: heatmap_figure(grid_results, grid_axes, grid_metric)))
+        else:
+            st.info('יש לבחור בדיוק שני משתנים להצגת מפת חום.')
+
+        df_tornado = pd.DataFrame(compute.run(session_id, 'tornado', (params,), {'rate_path': loan_rate_path}))
+        if plotly_available:
+            st.plotly_chart(figure_cache.get_or_compute(('tornado', params, loan_rate_key),
+                                                        lambda: tornado_figure(df_tornado)))
+        else:
+            st.warning("הספרייה 'plotly' לא מותקנת. מפת החום ותרשים הטורנדו לא יוצגו.")
+        st.dataframe(df_tornado, hide_index=True)
+
+        # גמישות המדדים לכל הקלטים מנגזרות אנליטיות, בהערכה אחת של המודל: השינוי באחוזים במדד לכל 1% שינוי בקלט
+        st.markdown("### גמישות המדדים לכל הקלטים")
+        df_elasticity = pd.DataFrame(compute.run(session_id, 'elasticities', (params,), {'rate_path': loan_rate_path}))
+        if plotly_available:
+            st.plotly_chart(figure_cache.get_or_compute(('elasticity', params, loan_rate_key),
+                                                        lambda: elasticity_figure(df_elasticity)))
+        st.dataframe(df_elasticity.drop(columns='שדה'), hide_index=True, column_config=number_columns(df_elasticity))
+    perf.lap('sensitivity_grid')
+
+if goal_tab.open:
+    with goal_tab:
+        # חיפוש יעד: הערך של משתנה שבו מדד מגיע ליעד (למשל מחיר ללילה מינימלי ל-NPV אפס)
+        st.markdown("### חיפוש יעד ואופטימיזציה")
+
+        goal_col1, goal_col2, goal_col3 = st.columns(3)
+        with goal_col1:
+            goal_variable = st.selectbox('משתנה לחיפוש', list(SENSITIVITY_VARIABLES), index=2)
+        with goal_col2:
+            goal_metric = st.selectbox('מדד יעד', list(GRID_METRICS), index=1)
+        with goal_col3:
+            goal_target = st.number_input('ערך יעד (₪, % או שנים)', value=0.0)
+
+        goal_field, goal_scale = SENSITIVITY_VARIABLES[goal_variable]
+        try:
+            goal_params, goal_metrics = compute.run(session_id, 'goal_seek',
+                                                    (params, goal_field, GRID_METRICS[goal_metric], goal_target),
+                                                    {'rate_path': loan_rate_path})
+            st.write(f"**{goal_variable} נדרש:** {getattr(goal_params, goal_field) / goal_scale:,.2f} "
+                     f"({goal_metric}: {goal_metrics[GRID_METRICS[goal_metric]]:,.2f})")
+        except ValueError:
+            st.warning(f"{goal_metric} אינו מגיע ל-{goal_target:,.2f} בטווח הערכים של {goal_variable}")
+
+        # אופטימיזציה: מספר וגודל וילות שממקסמים NPV תחת תקרת הון עצמי
+        with st.expander('אופטימיזציה של מספר וגודל הווילות'):
+            opt_max_equity = st.number_input('תקרת הון עצמי (₪)', min_value=0, value=int(equity_amount), step=500000)
+            opt_villas = st.slider('טווח מספר וילות', 1, 100, (5, 40))
+            opt_sizes = st.slider('טווח גודל וילה (מ"ר)', 50, 500, (100, 400), step=10)
+            opt_max_cost = st.number_input('תקרת עלות הקמה (₪, 0 = ללא תקרה)', min_value=0, value=0, step=1000000)
+
+            opt_fields = {'num_villas': range(opt_villas[0], opt_villas[1] + 1),
+                          'villa_size_sqm': range(opt_sizes[0], opt_sizes[1] + 1, 10)}
+            opt_constraints = {'Total Construction Cost': (None, opt_max_cost)} if opt_max_cost else None
+            try:
+                opt_params, opt_metrics = compute.run(
+                    session_id, 'optimize', (params, opt_fields, 'NPV Min'),
+                    {'max_equity': opt_max_equity, 'constraints': opt_constraints, 'rate_path': loan_rate_path})
+                opt_col1, opt_col2, opt_col3 = st.columns(3)
+                opt_col1.metric('מספר וילות', opt_params.num_villas)
+                opt_col2.metric('גודל וילה (מ"ר)', f"{opt_params.villa_size_sqm:,.0f}")
+                opt_col3.metric('NPV מינימלי', f"{opt_metrics['NPV Min']:,.0f} ₪")
+                st.write(f"**עלות הקמה:** {opt_metrics['Total Construction Cost']:,.0f} ₪, "
+                         f"**הון עצמי:** {opt_params.equity_amount:,.0f} ₪")
+            except ValueError:
+                st.warning("אף צירוף בטווח אינו עומד בתקרת ההון העצמי ובתקרת עלות ההקמה")
+    perf.lap('goal_seek')
+
+if simulation_tab.open:
+    with simulation_tab:
+        import pandas as pd
+
+        # סימולציית מונטה קרלו: התפלגויות סביב ערכי הקלט הנוכחיים
+        st.markdown("### סימולציית מונטה קרלו")
+
+        with st.expander('הגדרות סימולציה'):
+            mc_col1, mc_col2 = st.columns(2)
+            with mc_col1:
+                mc_draws = st.selectbox('מספר הגרלות', [10000, 100000, 1000000], index=1)
+                mc_seed = st.number_input('זרע אקראי (לשחזור תוצאות)', min_value=0, value=42)
+                mc_occupancy_sd = st.slider('סטיית תקן לשיעור תפוסה (נקודות אחוז)', 0.0, 30.0, 8.0) / 100
+                mc_price_spread = st.slider('טווח מחיר ללילה (± %)', 0, 50, 20) / 100
+            with mc_col2:
+                mc_construction_spread = st.slider('טווח עלות בנייה למ"ר (± %)', 0, 50, 15) / 100
+                mc_prime_sigma = st.slider('תנודתיות ריבית פריים (סיגמא לוג-נורמלית)', 0.0, 1.0, 0.25)
+                mc_inflation_sd = st.slider('סטיית תקן לאינפלציה (נקודות אחוז)', 0.0, 5.0, 1.0) / 100
+                mc_correlation = st.slider('מתאם בין תפוסה למחיר', -0.9, 0.9, -0.3)
+            mc_workers = st.number_input('מספר תהליכי עיבוד (1 = ללא מקביליות)', min_value=1,
+                                         max_value=os.cpu_count() or 1,
+                                         value=min(resolve_workers(), os.cpu_count() or 1))
+
+        mc_distributions = {
+            'occupancy_rate': ('normal', occupancy_rate, mc_occupancy_sd),
+            'price_per_night': ('triangular', price_per_night * (1 - mc_price_spread), price_per_night,
+                                price_per_night * (1 + mc_price_spread)),
+            'construction_cost_per_sqm': ('uniform', construction_cost_per_sqm * (1 - mc_construction_spread),
+                                          construction_cost_per_sqm * (1 + mc_construction_spread)),
+            'prime_interest_rate': ('lognormal', prime_interest_rate, mc_prime_sigma),
+            'annual_inflation_rate': ('normal', annual_inflation_rate, mc_inflation_sd),
+        }
+        mc_correlations = {('occupancy_rate', 'price_per_night'): mc_correlation}
+
+        if st.button('הרץ סימולציית מונטה קרלו'):
+            mc_summary, mc_accumulators = compute.run(
+                session_id, 'simulation', (params, mc_distributions, mc_draws),
+                {'seed': mc_seed, 'correlations': mc_correlations, 'workers': mc_workers, 'return_accumulators': True,
+                 'rate_path': loan_rate_path})
+            st.session_state['mc_summary'] = mc_summary
+
+            mc_col1, mc_col2, mc_col3 = st.columns(3)
+            mc_col1.metric('NPV חציוני (P50)', f"{mc_summary['NPV']['P50']:,.0f} ₪")
+            mc_col2.metric('הסתברות ל-NPV שלילי', f"{mc_summary['Probability NPV < 0']:.1%}")
+            mc_col3.metric('הסתברות לחוסר כיסוי להלוואה', f"{mc_summary['Probability of Shortfall']:.1%}")
+
+            st.dataframe(pd.DataFrame({
+                'NPV (₪)': mc_summary['NPV'],
+                'IRR (%)': mc_summary['IRR'],
+                'חוסר כיסוי להלוואה (₪)': mc_summary['Loan Coverage Shortfall'],
+            }))
+
+            if plotly_available:
+                st.plotly_chart(simulation_figure(mc_accumulators['NPV'], mc_summary['draws']))
+    perf.lap('monte_carlo')
+
+if portfolio_tab.open:
+    with portfolio_tab:
+        import pandas as pd
+
+        # תיק פרויקטים: קובץ CSV עם שורה לכל פרויקט ועמודה לכל פרמטר (עמודה חסרה מקבלת את ערך ברירת המחדל),
+        # ועמודות רשות name (שם הפרויקט) ו-start_month (חודש ההשקעה מתחילת התיק)
+        st.markdown("### תיק פרויקטים")
+        portfolio_file = st.file_uploader('קובץ פרויקטים (CSV)', type=['csv'])
+        if portfolio_file is not None:
+            portfolio_key = (hashlib.sha256(portfolio_file.getvalue()).hexdigest(), loan_rate_key)
+            portfolio_df = pd.read_csv(portfolio_file)
+            portfolio_offsets = portfolio_df['start_month'].to_numpy() if 'start_month' in portfolio_df else None
+            portfolio_summary, portfolio_timeline, portfolio_metrics = compute.run(
+                session_id, 'portfolio', (portfolio_df, portfolio_offsets), {'rate_path': loan_rate_path},
+                key=portfolio_key)
+
+            pf_col1, pf_col2, pf_col3, pf_col4 = st.columns(4)
+            pf_col1.metric('NPV מאוחד', f"{portfolio_summary['NPV Min']:,.0f} ₪")
+            pf_col2.metric('IRR מאוחד', format_percent(portfolio_summary['IRR Min']))
+            pf_col3.metric('חוב שיא', f"{portfolio_summary['Peak Debt']:,.0f} ₪")
+            pf_col4.metric('DSCR מינימלי', f"{portfolio_summary['Min DSCR']:.2f}")
+
+            if plotly_available:
+                st.plotly_chart(figure_cache.get_or_compute(('portfolio', portfolio_key),
+                                                            lambda: portfolio_figure(portfolio_timeline)))
+
+            portfolio_table = pd.DataFrame(portfolio_metrics)
+            if 'name' in portfolio_df:
+                portfolio_table.insert(0, 'פרויקט', portfolio_df['name'].to_numpy())
+            st.dataframe(portfolio_table)
+    perf.lap('portfolio')
+
+# עדכון הכפתור ליצירת דוח Excel (הדוח נבנה בזיכרון ולא נשמר כקובץ בתיקיית העבודה).
+# לוח הסילוקין ועקומת הרגישות (של המשתנה שנבחר לאחרונה בלשונית ניתוח הרגישות) מחושבים רק בלחיצה.
 if st.button('Generate Advanced Excel Report'):
-    generate_advanced_excel_report()
+    report_variable = st.session_state.get('report_sensitivity_variable', next(iter(SENSITIVITY_VARIABLES)))
+    excel_report = compute.run(session_id, 'excel_report', (params, metrics),
+                               {'loan_payments': loan_payments_table(),
+                                'sensitivity': sensitivity_curve(report_variable),
+                                'simulation': st.session_state.get('mc_summary')})
+    st.download_button(label='Download Advanced Excel Report', data=excel_report,
+                       file_name="advanced_investment_report.xlsx",
+                       mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+# דוח משקיעים ב-PDF נבנה ברקע בשירות החישוב, כך שההרצה אינה ממתינה לו: הלחיצה שולחת משימה, ורכיב
+# שמתרענן כל שנייה (fragment) בודק אם היא הסתיימה ומציג את כפתור ההורדה מהזיכרון.
+# תמונות התרשימים נשמרות לפי גיבוב הנתונים שלהן, כך שדוח חוזר עם אותם קלטים אינו מצייר אותן מחדש.
+if st.button('הפקת דוח PDF למשקיעים'):
+    report_variable = st.session_state.get('report_sensitivity_variable', next(iter(SENSITIVITY_VARIABLES)))
+    st.session_state['pdf_report'] = compute.submit(session_id, 'pdf_report', (params, metrics),
+                                                    {'loan_payments': loan_payments_table(),
+                                                     'sensitivity': sensitivity_curve(report_variable),
+                                                     'sensitivity_variable': report_variable,
+                                                     'rate_path': loan_rate_path,
+                                                     'logo': os.path.abspath("קבוצת מעיינות.png")})
+
+
+def pdf_report_status():
+    pdf_future = st.session_state.get('pdf_report')
+    if pdf_future is None:
+        return
+    if not pdf_future.done():
+        st.info('דוח ה-PDF בהכנה...')
+    elif pdf_future.exception() is not None:
+        st.error(f'הפקת דוח ה-PDF נכשלה: {pdf_future.exception()}')
+    elif pdf_waiting:
+        # המשימה הסתיימה: הרצה מלאה אחת מחליפה את הרכיב המתרענן ברכיב רגיל עם כפתור ההורדה
+        st.rerun(scope='app')
+    else:
+        st.download_button(label='הורדת דוח PDF למשקיעים', data=pdf_future.result(),
+                           file_name='investor_report.pdf', mime='application/pdf')
+
+
+pdf_waiting = 'pdf_report' in st.session_state and not st.session_state['pdf_report'].done()
+st.fragment(pdf_report_status, run_every=1.0 if pdf_waiting else None)()
+perf.lap('report')
+
+# לוח ביצועים: זמן כל שלב בהרצה הנוכחית, פגיעות במטמונים וצמתי המודל שחושבו מחדש.
+# הרשומה נכתבת גם כשורת JSON לקובץ שבמשתנה הסביבה PROFITABILITY_PERF_LOG (אם הוגדר).
+# (כולל צמתים שחושבו בלשוניות, כמו לוח הסילוקין)
+recomputed_nodes = model_graph.recomputed
+perf.count('recomputed_nodes', len(recomputed_nodes))
+perf_record = perf.as_record(session=session_id,
+                             recomputed_nodes=recomputed_nodes,
+                             caches=cache_stats({'metrics': metrics_cache, 'figures': figure_cache, 'service': compute,
+                                                 'store': scenario_store}))
+# הלוח עצמו (והטבלאות שבו) נבנה רק כשהוא פתוח
+perf_panel = st.expander('ביצועים', key='perf_panel', on_change='rerun')
+if perf_panel.open:
+    with perf_panel:
+        import pandas as pd
+
+        st.write(f"**זמן הרצה כולל:** {perf_record['total'] * 1000:,.1f} ms")
+        st.dataframe(pd.DataFrame({'שלב': list(perf_record['stages']),
+                                   'זמן (ms)': [seconds * 1000 for seconds in perf_record['stages'].values()]}))
+        st.dataframe(pd.DataFrame(perf_record['caches']).T)
+        st.write(f"**צמתים שחושבו מחדש:** {', '.join(recomputed_nodes) or 'אין'}")
+        # מצב הווידג'ט נמחק כשהלוח סגור (הווידג'ט לא מוצג), ולכן הבחירה נשמרת במפתח נפרד ב-session_state
+        st.checkbox('פרופיל cProfile (מההרצה הבאה)', value=st.session_state.get('perf_profile', False),
+                    key='perf_profile_checkbox',
+                    on_change=lambda: st.session_state.update(perf_profile=st.session_state['perf_profile_checkbox']))
+        if perf_profiler is not None:
+            st.text(profile_summary(perf_profiler))
+log_json_line(perf_record)
 
 # סיום הקוד
 st.markdown("---")
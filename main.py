@@ -1,8 +1,10 @@
 import streamlit as st
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from profitability.model import discounted_cash_flows
+from profitability.params import ProjectParams
+
 # Input parameters
 st.title('מחשבון השקעה דינאמי')
 
@@ -33,26 +35,39 @@ subsidy_min = 20 / 100
 subsidy_max = 30 / 100
 tax_rate = 7.5 / 100
 
-# Calculations
-total_land_construction_cost = (land_cost_per_villa * num_villas) + (construction_cost_per_sqm * villa_size_sqm * num_villas)
-annual_revenue = price_per_night * (365 * occupancy_rate) * num_villas
-
-annual_operational_cost = (
-    (monthly_operational_cost_per_villa * 12 * num_villas) +
-    annual_marketing_cost +
-    (cleaning_cost_per_night * (365 * occupancy_rate) * num_villas) +
-    (accessories_cost_per_night * (365 * occupancy_rate) * num_villas) +
-    (annual_insurance_cost_per_villa * num_villas)
+# Calculations (shared model - same formulas as app.py)
+params = ProjectParams(
+    num_villas=num_villas,
+    villa_size_sqm=villa_size_sqm,
+    price_per_night=price_per_night,
+    occupancy_rate=occupancy_rate,
+    land_cost_per_villa=land_cost_per_villa,
+    construction_cost_per_sqm=construction_cost_per_sqm,
+    monthly_operational_cost_per_villa=monthly_operational_cost_per_villa,
+    annual_marketing_cost=annual_marketing_cost,
+    land_development_cost=land_development_cost,
+    public_area_development_cost=public_area_development_cost,
+    reception_and_logistics_cost=reception_and_logistics_cost,
+    small_event_hall_cost=small_event_hall_cost,
+    planning_and_consultants_cost=planning_and_consultants_cost,
+    cleaning_cost_per_night=cleaning_cost_per_night,
+    accessories_cost_per_night=accessories_cost_per_night,
+    annual_insurance_cost_per_villa=annual_insurance_cost_per_villa,
+    annual_inflation_rate=annual_inflation_rate,
+    discount_rate=discount_rate,
+    prime_interest_rate=prime_interest_rate,
+    additional_interest_rate=additional_interest_rate,
+    loan_term=10,
+    tax_rate=tax_rate,
+    subsidy_min=subsidy_min,
+    subsidy_max=subsidy_max,
 )
 
-pre_tax_subsidy_profit = annual_revenue - annual_operational_cost
-post_tax_profit_min = pre_tax_subsidy_profit * (1 - tax_rate) + total_land_construction_cost * subsidy_min
-post_tax_profit_max = pre_tax_subsidy_profit * (1 - tax_rate) + total_land_construction_cost * subsidy_max
-
 # Data for visualization
-years = np.arange(1, 11)
-cash_flow_min = [post_tax_profit_min / ((1 + discount_rate) ** year) for year in years]
-cash_flow_max = [post_tax_profit_max / ((1 + discount_rate) ** year) for year in years]
+cash_flows = discounted_cash_flows(params)
+years = cash_flows['Year']
+cash_flow_min = cash_flows['Discounted Cash Flow (Min Subsidy)']
+cash_flow_max = cash_flows['Discounted Cash Flow (Max Subsidy)']
 
 # Display results in a table
 results_df = pd.DataFrame({
@@ -0,0 +1,88 @@
+from .batch import (
+    DEFAULT_SCENARIO,
+    calculate_financial_metrics_batch,
+    cash_flow_matrix,
+)
+from .cache import (
+    LRUCache,
+    figure_cache,
+    metrics_cache,
+    schedule_cache,
+    sensitivity_cache,
+    simulation_cache,
+)
+from .cashflows import (
+    SUBSIDY_TIMINGS,
+    TERMINAL_VALUE_YEARS,
+)
+from .graph import (
+    MODEL_NODES,
+    ModelGraph,
+)
+from .grid import (
+    GRID_METRICS,
+    INTEGER_FIELDS,
+    default_axis,
+    sensitivity_grid,
+    tornado,
+)
+from .loans import (
+    REPAYMENT_TYPES,
+    balance_at_month,
+    interest_paid_between,
+    interest_paid_in_year,
+    period_payments,
+    loan_schedule,
+    variable_rate_schedule,
+)
+from .model import (
+    MODEL_VERSION,
+    SENSITIVITY_RANGES,
+    SENSITIVITY_VARIABLES,
+    calculate_financial_metrics,
+    calculate_loan_repayment,
+    cash_flow_table,
+    discounted_cash_flows,
+    sensitivity_analysis,
+)
+from .montecarlo import (
+    StreamingHistogram,
+    run_simulation,
+)
+from .parallel import (
+    calculate_financial_metrics_parallel,
+    loan_schedule_parallel,
+    map_columns,
+    resolve_workers,
+)
+from .params import ProjectParams
+from .portfolio import evaluate_portfolio
+from .seasonality import (
+    REVENUE_MODELS,
+    daily_curves,
+    seasonal_nights,
+)
+from .rates import (
+    forward_curve,
+    rate_path,
+    rate_stress_test,
+    simulate_prime_paths,
+)
+from .service import (
+    ComputeService,
+    default_service,
+)
+from .solver import (
+    goal_seek,
+    optimize,
+)
+from .store import (
+    ScenarioStore,
+    default_store,
+)
+from .xirr import (
+    xirr,
+    xirr_batch,
+    xnpv,
+    year_fractions,
+)
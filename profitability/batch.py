@@ -0,0 +1,82 @@
+import numpy as np
+
+from .cashflows import metrics_from_cash_flows, project_cash_flows, subsidy_timing_codes
+from .loans import repayment_codes
+from .params import ProjectParams
+from .seasonality import revenue_model_codes
+
+# ערכי ברירת מחדל לכל פרמטר בתרחיש - זהים לערכי ברירת המחדל של הקלטים ב-app.py
+DEFAULT_SCENARIO = ProjectParams().as_dict()
+
+# שדות קטגוריים והמרתם לקודים מספריים
+CATEGORY_CODES = {
+    'repayment_type': repayment_codes,
+    'subsidy_timing': subsidy_timing_codes,
+    'revenue_model': revenue_model_codes,
+}
+
+
+# קריאת טבלת תרחישים (DataFrame או מילון של מערכים) למילון של מערכים באורך אחיד
+def scenario_columns(scenarios):
+    columns = {}
+    for name, default in DEFAULT_SCENARIO.items():
+        try:
+            value = scenarios[name]
+        except KeyError:
+            value = default
+        if name in CATEGORY_CODES:
+            columns[name] = CATEGORY_CODES[name](value)
+        else:
+            columns[name] = np.asarray(value, dtype=np.float64)
+
+    names = list(columns)
+    broadcast = np.broadcast_arrays(*(columns[name] for name in names))
+    return {name: np.atleast_1d(array) for name, array in zip(names, broadcast)}
+
+
+# עמודות התרחישים מורחבות למספר מסלולי הריבית ב-rate_path: תרחיש יחיד עם N מסלולים הופך ל-N שורות
+# (שורה לכל מסלול), ומסלול יחיד מוחל על כל התרחישים
+def path_columns(columns, rate_path=None):
+    if rate_path is None:
+        return columns
+    rows = np.broadcast_shapes(next(iter(columns.values())).shape, np.atleast_2d(rate_path['Prime']).shape[:1])
+    return {name: np.broadcast_to(values, rows) for name, values in columns.items()}
+
+
+# מסלול ריבית יחיד (מטריצה של שורה אחת). הפונקציות שמחשבות תרחיש יחיד או ניתוח שלו - מדדים, לוח סילוקין
+# ותזרים (model), רגישות, רשת וטורנדו (grid), חיפוש יעד ואופטימיזציה (solver), נגזרות (derivatives), מונטה קרלו,
+# תיק פרויקטים, מאגר התרחישים ודוחות - מקבלות rate_path כזה ומחשבות כל נקודה על אותו מסלול, כך שעלות המימון
+# והחזר החוב נגזרים ממנו (מוזז לפי ריבית הפריים של כל נקודה, ראו cashflows.path_prime_rates).
+# מספר מסלולים מחושבים רק במנוע האצווה ובמבחן הקיצון (rates.rate_stress_test); ValueError אם הועבר יותר ממסלול אחד.
+def single_path(rate_path):
+    if rate_path is None:
+        return None
+    prime = np.atleast_2d(rate_path['Prime'])
+    if prime.shape[0] != 1:
+        raise ValueError(f"נדרש מסלול ריבית יחיד, התקבלו {prime.shape[0]} מסלולים")
+    return {**rate_path, 'Prime': prime}
+
+
+# מפתח ניתן לגיבוב למסלול ריבית יחיד (למטמונים ולמאגר התרחישים); None כשאין מסלול
+def path_key(rate_path):
+    if rate_path is None:
+        return None
+    rate_path = single_path(rate_path)
+    prime = np.ascontiguousarray(rate_path['Prime'], dtype=np.float64)
+    return prime.tobytes(), rate_path['Base'], tuple(rate_path['Refinancing']), tuple(rate_path['Prepayments'])
+
+
+# חישוב וקטורי של כל המדדים הפיננסיים עבור טבלה של תרחישים בבת אחת.
+# מקבל DataFrame או מילון של מערכים (עמודה חסרה מקבלת את ערך ברירת המחדל, וסקלר מוחל על כל השורות)
+# ומחזיר מילון עם אותם מפתחות כמו calculate_financial_metrics, כשכל ערך הוא מערך לפי שורות.
+# המדדים מחושבים ממטריצת התזרים לפי תקופות (periods_per_year=12 לתזרים חודשי); מדדי "שנתי" הם של השנה הראשונה.
+# עם rate_path (ראו rates.rate_path) עלות המימון והחזר החוב נגזרים ממסלול ריבית הפריים, שורה לכל מסלול.
+def calculate_financial_metrics_batch(scenarios, periods_per_year=1, rate_path=None):
+    columns = path_columns(scenario_columns(scenarios), rate_path)
+    flows = project_cash_flows(columns, periods_per_year, rate_path)
+    return metrics_from_cash_flows(columns, flows, periods_per_year)
+
+
+# מטריצות התזרים לפי תקופות (הכנסות, עלויות, ריבית, קרן, מס, רווח נקי וסובסידיה) עבור טבלת תרחישים
+def cash_flow_matrix(scenarios, periods_per_year=1, rate_path=None):
+    return project_cash_flows(path_columns(scenario_columns(scenarios), rate_path), periods_per_year, rate_path)
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch
+from .graph import ModelGraph
+from .loans import REPAYMENT_TYPES
+from .model import SENSITIVITY_VARIABLES, calculate_financial_metrics, calculate_loan_repayment, sensitivity_analysis
+from .params import ProjectParams
+from .rates import rate_stress_test, simulate_prime_paths
+from .report_excel import generate_advanced_excel_report, generate_portfolio_excel_report
+from .xirr import annual_dates, xirr, xirr_batch, xnpv
+
+# תקופות הלוואה שנבדקות לכל סוג סילוקין
+LOAN_TERMS = (5, 10, 15, 20, 25, 30)
+
+# ספים ברירת מחדל להשוואה: האטה יחסית בחציון שנחשבת לרגרסיה
+DEFAULT_THRESHOLD = 0.25
+
+# זמן מינימלי לסבב מדידה (בשניות) - פונקציות מהירות חוזרות כמה פעמים בכל סבב
+MIN_ROUND_TIME = 0.05
+
+# המדידות הרשומות: שם -> {'setup': פונקציה שמחזירה (פונקציה למדידה, מידע נוסף), 'items', 'rounds', 'heavy'}
+BENCHMARKS = {}
+
+
+def benchmark(name, items=1, rounds=None, heavy=False):
+    def register(setup):
+        BENCHMARKS[name] = {'setup': setup, 'items': items, 'rounds': rounds, 'heavy': heavy}
+        return setup
+    return register
+
+
+# טבלת תרחישים אקראית (עם זרע קבוע) סביב ערכי ברירת המחדל
+def random_scenarios(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'num_villas': rng.integers(5, 41, n).astype(np.float64),
+        'occupancy_rate': rng.uniform(0.2, 1.0, n),
+        'price_per_night': rng.uniform(2000, 8000, n),
+        'construction_cost_per_sqm': rng.uniform(8000, 25000, n),
+        'discount_rate': rng.uniform(0.01, 0.2, n),
+        'prime_interest_rate': rng.uniform(0.0, 0.12, n),
+        'equity_amount': rng.uniform(0, 10000000, n),
+        'loan_term': rng.integers(5, 31, n).astype(np.float64),
+        'repayment_type': rng.integers(0, len(REPAYMENT_TYPES), n),
+    }
+
+
+# תזרימים קשים ל-XIRR: כמה החלפות סימן, שורש קרוב ל-100%-, תשואות עצומות, תזרים כמעט מאוזן ותזרים ללא שורש
+def adversarial_cash_flows(n, seed=0):
+    base = [
+        [-100, 230, -132, 0, 0],
+        [-100, 0.5, 0, 0, 0],
+        [-1, 100, 0, 0, 0],
+        [-100, 100 + 1e-9, 0, 0, 0],
+        [-1e8, 1, 1, 1, 1e8 + 10],
+        [-1000, 500, -2000, 500, 3000],
+        [100, 100, 100, 100, 100],
+        [-100, -100, -100, 1, 1],
+    ]
+    rng = np.random.default_rng(seed)
+    values = np.array(base, dtype=np.float64)[rng.integers(0, len(base), n)]
+    return values * rng.uniform(0.9, 1.1, values.shape)
+
+
+@benchmark('xnpv_scalar')
+def _xnpv_scalar():
+    values = [-1000000] + [120000] * 15 + [1200000]
+    dates = annual_dates(len(values))
+    return partial(xnpv, 0.08, values, dates), {}
+
+
+@benchmark('xirr_scalar')
+def _xirr_scalar():
+    values = [-1000000] + [120000] * 15 + [1200000]
+    dates = annual_dates(len(values))
+    return partial(xirr, values, dates), {}
+
+
+@benchmark('xirr_adversarial_10k', items=10000)
+def _xirr_adversarial():
+    values = adversarial_cash_flows(10000)
+    times = np.arange(values.shape[1], dtype=np.float64)
+    rates = xirr_batch(values, times)
+
+    # איכות ההתכנסות: שיעור השורות עם פתרון ושארית ה-NPV היחסית המקסימלית בפתרון
+    solved = np.isfinite(rates)
+    residual = np.abs((values[solved] * (1 + rates[solved, None]) ** -times).sum(axis=1))
+    info = {'solved_fraction': float(solved.mean()),
+            'max_relative_residual': float((residual / np.abs(values[solved]).sum(axis=1)).max())}
+    return partial(xirr_batch, values, times), info
+
+
+# לוח סילוקין לכל סוג סילוקין ותקופת הלוואה
+def _loan_schedule(repayment_type, loan_term):
+    return partial(calculate_loan_repayment, ProjectParams(loan_term=loan_term, repayment_type=repayment_type)), {}
+
+
+for _repayment_type in REPAYMENT_TYPES:
+    for _loan_term in LOAN_TERMS:
+        benchmark(f'loan_schedule[{_repayment_type}-{_loan_term}]')(partial(_loan_schedule, _repayment_type, _loan_term))
+
+
+@benchmark('financial_metrics_single')
+def _financial_metrics_single():
+    return partial(calculate_financial_metrics, ProjectParams()), {}
+
+
+# עדכון מצטבר בגרף המודל: שינוי שיעור ההיוון לסירוגין בין שני ערכים
+@benchmark('graph_discount_rate_update')
+def _graph_discount_rate_update():
+    graph = ModelGraph()
+    params = [ProjectParams(discount_rate=0.08), ProjectParams(discount_rate=0.07)]
+    graph.evaluate(params[0])
+    state = {'i': 0}
+
+    def run():
+        state['i'] ^= 1
+        graph.evaluate(params[state['i']])
+    return run, {}
+
+
+@benchmark('sensitivity_analysis_all_variables', items=len(SENSITIVITY_VARIABLES))
+def _sensitivity_analysis():
+    params = ProjectParams()
+
+    def run():
+        for name in SENSITIVITY_VARIABLES:
+            sensitivity_analysis(params, name)
+    return run, {}
+
+
+@benchmark('batch_10k', items=10000)
+def _batch_10k():
+    return partial(calculate_financial_metrics_batch, random_scenarios(10000)), {}
+
+
+# מבחן קיצון לריבית: 10,000 מסלולי פריים חודשיים לתרחיש ברירת המחדל (לוח סילוקין בריבית משתנה לכל מסלול)
+@benchmark('rate_stress_10k', items=10000)
+def _rate_stress_10k():
+    params = ProjectParams()
+    paths = simulate_prime_paths(params.prime_interest_rate, params.loan_term * 12, 10000, seed=0)
+    return partial(rate_stress_test, params, paths), {}
+
+
+# מיליון תרחישים במקטעים של 100 אלף (כמו ה-CLI), כך שהזיכרון חסום
+@benchmark('batch_1m', items=1000000, rounds=1, heavy=True)
+def _batch_1m():
+    scenarios = random_scenarios(1000000)
+    chunk_size = 100000
+
+    def run():
+        for start in range(0, 1000000, chunk_size):
+            calculate_financial_metrics_batch({name: values[start:start + chunk_size]
+                                               for name, values in scenarios.items()})
+    return run, {}
+
+
+# דוח Excel עם לוח סילוקין של 30 שנה וניתוח רגישות של 6,001 שורות
+@benchmark('excel_report_large', items=6001, rounds=3, heavy=True)
+def _excel_report_large():
+    params = ProjectParams(loan_term=30)
+    metrics = calculate_financial_metrics(params)
+    loan_payments = calculate_loan_repayment(params)
+    sensitivity = sensitivity_analysis(params, 'מחיר ללילה', range(2000, 8001))
+    return partial(generate_advanced_excel_report, params, metrics, loan_payments, sensitivity), {}
+
+
+@benchmark('excel_portfolio_10k', items=10000, rounds=3, heavy=True)
+def _excel_portfolio():
+    columns = random_scenarios(10000)
+    scenarios = [ProjectParams(num_villas=int(columns['num_villas'][i]),
+                               occupancy_rate=float(columns['occupancy_rate'][i]),
+                               price_per_night=float(columns['price_per_night'][i]),
+                               loan_term=int(columns['loan_term'][i]),
+                               repayment_type=REPAYMENT_TYPES[columns['repayment_type'][i]])
+                 for i in range(10000)]
+    return partial(generate_portfolio_excel_report, scenarios), {}
+
+
+# מדידת זמן: מספר החזרות בכל סבב נקבע כך שהסבב יימשך לפחות MIN_ROUND_TIME; הזמנים הם לקריאה אחת
+def measure(function, rounds=5):
+    start = time.perf_counter()
+    function()
+    first = time.perf_counter() - start
+    loops = max(1, int(MIN_ROUND_TIME / first)) if first > 0 else 1000
+
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        times.append((time.perf_counter() - start) / loops)
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'rounds': rounds,
+        'loops': loops,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# הרצת המדידות (לפי מסנן שם, ובלי הכבדות כש-quick) והחזרת תוצאות בפורמט JSON
+def run_benchmarks(names=None, rounds=5, quick=False, log=None):
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        if quick and spec['heavy']:
+            continue
+        function, info = spec['setup']()
+        result = measure(function, min(rounds, spec['rounds'] or rounds))
+        result['items_per_second'] = spec['items'] / result['median']
+        result.update(info)
+        results[name] = result
+        if log:
+            log(f"{name:45s} {result['median'] * 1000:12.3f} ms  ({result['items_per_second']:,.0f} items/s)")
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'results': results,
+    }
+
+
+# השוואת תוצאות לקובץ בסיס: מחזיר שורות (שם, חציון בסיס, חציון נוכחי, יחס, רגרסיה?)
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    rows = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        ratio = result['median'] / previous['median']
+        rows.append((name, previous['median'], result['median'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m profitability.benchmarks',
+        description='מדידת ביצועים של ליבת החישוב הפיננסי ושמירת התוצאות כ-JSON להשוואה בין גרסאות.')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='קובץ תוצאות JSON')
+    parser.add_argument('-k', '--filter', action='append', help='להריץ רק מדידות ששמן מכיל את המחרוזת')
+    parser.add_argument('--rounds', type=int, default=5, help='מספר סבבי מדידה לכל מדידה')
+    parser.add_argument('--quick', action='store_true', help='לדלג על המדידות הכבדות (מיליון תרחישים ו-Excel)')
+    parser.add_argument('--compare', help='קובץ תוצאות בסיס להשוואה')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='האטה יחסית בחציון שנחשבת לרגרסיה (0.25 = 25%%)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    current = run_benchmarks(args.filter, args.rounds, args.quick, log=print)
+    with open(args.output, 'w', encoding='utf-8') as stream:
+        json.dump(current, stream, ensure_ascii=False, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding='utf-8') as stream:
+        baseline = json.load(stream)
+    regressions = 0
+    for name, before, after, ratio, regressed in compare(baseline, current, args.threshold):
+        regressions += regressed
+        print(f"{name:45s} {before * 1000:10.3f} -> {after * 1000:10.3f} ms  x{ratio:.2f}"
+              f"{'  רגרסיה' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,411 @@
+import argparse
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .seasonality import CALENDAR, PEAK_MONTHS, REVENUE_MODELS, WEEKEND_NIGHTS
+
+# משתנה סביבה עם נתיב קובץ המצב של הקליטה (ברירת מחדל: ~/.cache/profitability/bookings.json)
+STATE_ENV_VAR = 'PROFITABILITY_BOOKINGS_STATE'
+
+# שמות העמודות בקובצי ההזמנות: שדה -> עמודה בקובץ. status (סטטוס ההזמנה) ו-villa (מזהה יחידה) אופציונליים
+DEFAULT_COLUMNS = {
+    'check_in': 'check_in',
+    'check_out': 'check_out',
+    'revenue': 'revenue',
+    'status': 'status',
+    'villa': 'villa_id',
+}
+
+# סטטוסים של הזמנות שאינן נספרות
+CANCELLED_STATUSES = ('cancelled', 'canceled', 'no_show', 'בוטל')
+
+# מספר שורות בכל מקטע קריאה; הזיכרון חסום בגודל המקטע ולא בגודל הקובץ
+CHUNK_SIZE = 100000
+
+# אורך שהייה מרבי שנספר (שורות עם שהייה ארוכה יותר נחשבות שגויות ומדולגות)
+MAX_STAY_NIGHTS = 365
+
+# גודל מרבי של תחילת הקובץ שמשמשת לזיהוי קובץ שהוחלף (ולא רק התארך)
+_HEAD_BYTES = 65536
+
+# גודל הבלוק שבו מחפשים את סוף השורה האחרונה בקובץ CSV
+_TAIL_BLOCK = 65536
+
+# עמודות הצבירה לכל חודש: לילות והכנסות, בנפרד לאמצע שבוע ולסוף שבוע
+_WEEKDAY_NIGHTS, _WEEKEND_NIGHTS, _WEEKDAY_REVENUE, _WEEKEND_REVENUE = range(4)
+
+
+def state_path(path=None):
+    return Path(path or os.environ.get(STATE_ENV_VAR) or Path.home() / '.cache' / 'profitability' / 'bookings.json')
+
+
+def _input_format(path):
+    return 'parquet' if Path(path).suffix.lower() in ('.parquet', '.pq') else 'csv'
+
+
+# גיבוב של length הבתים הראשונים בקובץ. length הוא חלק מהקובץ שכבר נקלט (עד _HEAD_BYTES), כך שהגיבוב
+# אינו משתנה כשנוספות שורות, גם בקובץ קטן מ-_HEAD_BYTES
+def _head_digest(path, length):
+    with open(path, 'rb') as stream:
+        return hashlib.sha256(stream.read(length)).hexdigest()
+
+
+# המיקום שאחרי תו סוף השורה האחרון בקובץ (שורה אחרונה שעדיין נכתבת אינה נקראת עד שתושלם)
+def _last_line_end(path, size, start):
+    with open(path, 'rb') as stream:
+        end = size
+        while end > start:
+            block_start = max(start, end - _TAIL_BLOCK)
+            stream.seek(block_start)
+            block = stream.read(end - block_start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return block_start + newline + 1
+            end = block_start
+    return start
+
+
+# קריאה של טווח בתים [start, end) מקובץ, כזרם בינארי רגיל (עבור pandas.read_csv)
+class _ByteRange(io.RawIOBase):
+    def __init__(self, path, start, end):
+        self._stream = open(path, 'rb')
+        self._stream.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+# שמות העמודות בקובץ (בלי לקרוא את הנתונים)
+def _file_columns(path):
+    if _input_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).schema_arrow.names
+    import pandas as pd
+
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+# קריאת השורות שבטווח הבתים [offset, end) של קובץ CSV, במקטעים של chunk_size שורות ורק בעמודות usecols.
+# offset 0 הוא תחילת הקובץ (עם שורת הכותרת); אחרת offset הוא תחילת שורה, והשורות נקראות בלי כותרת לפי names.
+# השורות שלפני offset אינן נקראות כלל, כך שקליטה של שורות שנוספו לקובץ תלויה רק בכמות השורות החדשות.
+def read_csv_bookings(path, usecols, offset=0, end=None, names=None, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    end = Path(path).stat().st_size if end is None else end
+    header = dict(header=None, names=names) if offset else {}
+    with io.BufferedReader(_ByteRange(path, offset, end)) as stream:
+        yield from pd.read_csv(stream, usecols=usecols, chunksize=chunk_size, **header)
+
+
+# קריאת השורות שאחרי skip_rows הראשונות בקובץ Parquet, במקטעים של chunk_size שורות ורק בעמודות usecols
+def read_parquet_bookings(path, usecols, skip_rows=0, chunk_size=CHUNK_SIZE):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    # קבוצות שורות שכבר נקלטו במלואן אינן נקראות כלל
+    first_group, group_start = 0, 0
+    while first_group < parquet.num_row_groups:
+        group_rows = parquet.metadata.row_group(first_group).num_rows
+        if group_start + group_rows > skip_rows:
+            break
+        group_start += group_rows
+        first_group += 1
+    to_skip = skip_rows - group_start
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=usecols,
+                                      row_groups=range(first_group, parquet.num_row_groups)):
+        if to_skip >= batch.num_rows:
+            to_skip -= batch.num_rows
+            continue
+        yield batch.slice(to_skip).to_pandas()
+        to_skip = 0
+
+
+# פירוק מקטע הזמנות ללילות וצבירתם לפי חודש: {חודש 'YYYY-MM': [לילות אמצע שבוע, לילות סוף שבוע,
+# הכנסה באמצע שבוע, הכנסה בסוף שבוע]}. ההכנסה של הזמנה מתחלקת שווה בין הלילות שלה.
+def aggregate_chunk(frame, columns=DEFAULT_COLUMNS):
+    import pandas as pd
+
+    check_in = pd.to_datetime(frame[columns['check_in']], errors='coerce').to_numpy().astype('datetime64[D]')
+    check_out = pd.to_datetime(frame[columns['check_out']], errors='coerce').to_numpy().astype('datetime64[D]')
+    revenue = pd.to_numeric(frame[columns['revenue']], errors='coerce').to_numpy(dtype=np.float64)
+
+    nights = (check_out - check_in).astype(np.int64)
+    valid = ~np.isnat(check_in) & ~np.isnat(check_out) & np.isfinite(revenue)
+    valid &= (nights > 0) & (nights <= MAX_STAY_NIGHTS)
+    if columns['status'] in frame:
+        valid &= ~frame[columns['status']].astype(str).str.lower().isin(CANCELLED_STATUSES).to_numpy()
+    check_in, nights, revenue = check_in[valid], nights[valid], revenue[valid]
+    if not nights.size:
+        return {}
+
+    # לילה לכל שורה: תאריך הלילה והכנסת הלילה (ללא לולאה על הזמנות)
+    booking = np.repeat(np.arange(nights.size), nights)
+    offset = np.arange(booking.size) - np.repeat(np.cumsum(nights) - nights, nights)
+    dates = check_in[booking] + offset
+    nightly_revenue = (revenue / nights)[booking]
+
+    month = dates.astype('datetime64[M]').astype(np.int64)
+    weekend = np.isin((dates.astype(np.int64) - 4) % 7, WEEKEND_NIGHTS)
+    months, index = np.unique(month, return_inverse=True)
+    bins = index * 2 + weekend
+    counts = np.bincount(bins, minlength=months.size * 2).reshape(-1, 2)
+    amounts = np.bincount(bins, weights=nightly_revenue, minlength=months.size * 2).reshape(-1, 2)
+    labels = np.datetime_as_string(months.astype('datetime64[M]'))
+    return {label: [float(counts[i, 0]), float(counts[i, 1]), float(amounts[i, 0]), float(amounts[i, 1])]
+            for i, label in enumerate(labels)}
+
+
+def _merge(total, months):
+    for label, values in months.items():
+        current = total.setdefault(label, [0.0, 0.0, 0.0, 0.0])
+        for i, value in enumerate(values):
+            current[i] += value
+    return total
+
+
+# קליטה מצטברת של קובצי הזמנות (CSV או Parquet). לכל קובץ נשמרים במצב מספר השורות שנקלטו, מיקום הבית
+# שעד אליו נקלט (CSV) ושמות העמודות שלו, הגודל, גיבוב של תחילת הקובץ והצבירה החודשית שלו. קליטה חוזרת של
+# קובץ CSV שהתארך ממשיכה מהמיקום השמור וקוראת רק את הבתים החדשים (ב-Parquet קבוצות שורות שנקלטו מדולגות);
+# קובץ שהוחלף או התקצר נקלט מחדש, והצבירה הקודמת שלו נמחקת. המצב נשמר כ-JSON ב-state_path.
+# בטוח לשימוש ממספר תהליכונים.
+class BookingIngestor:
+    def __init__(self, path=None, columns=None, chunk_size=CHUNK_SIZE):
+        self.path = state_path(path)
+        self.columns = {**DEFAULT_COLUMNS, **(columns or {})}
+        self.chunk_size = chunk_size
+        self.files = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as stream:
+                self.files = json.load(stream)['files']
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        with open(temporary, 'w', encoding='utf-8') as stream:
+            json.dump({'files': self.files}, stream, ensure_ascii=False)
+        os.replace(temporary, self.path)
+
+    # קליטת קובץ אחד; מחזיר את מספר השורות החדשות שנקראו
+    def ingest_file(self, path):
+        path = Path(path)
+        key = str(path.resolve())
+        size = path.stat().st_size
+        csv = _input_format(path) == 'csv'
+        entry = self.files.get(key)
+        if (entry is None or 'head_bytes' not in entry or size < entry['size'] or
+                _head_digest(path, entry['head_bytes']) != entry['head']):
+            entry = {'rows': 0, 'offset': 0, 'size': 0, 'columns': _file_columns(path), 'months': {}, 'villas': []}
+        elif size == entry['size']:
+            return 0
+
+        usecols = [self.columns[field] for field in ('check_in', 'check_out', 'revenue')]
+        usecols += [self.columns[field] for field in ('status', 'villa') if self.columns[field] in entry['columns']]
+        if csv:
+            end = _last_line_end(path, size, entry['offset'])
+            frames = (read_csv_bookings(path, usecols, entry['offset'], end, entry['columns'], self.chunk_size)
+                      if end > entry['offset'] else ())
+        else:
+            end = size
+            frames = read_parquet_bookings(path, usecols, entry['rows'], self.chunk_size)
+        villas = set(entry['villas'])
+        rows = 0
+        for frame in frames:
+            _merge(entry['months'], aggregate_chunk(frame, self.columns))
+            if self.columns['villa'] in frame:
+                villas.update(frame[self.columns['villa']].dropna().astype(str).unique().tolist())
+            rows += len(frame)
+
+        head_bytes = min(end, _HEAD_BYTES)
+        entry.update(rows=entry['rows'] + rows, offset=end, size=size, head_bytes=head_bytes,
+                     head=_head_digest(path, head_bytes), villas=sorted(villas))
+        self.files[key] = entry
+        return rows
+
+    # קליטת רשימת קבצים או תבניות glob; מחזיר {קובץ: שורות חדשות} ושומר את המצב
+    def ingest(self, paths):
+        if isinstance(paths, (str, Path)):
+            paths = [paths]
+        files = []
+        for pattern in paths:
+            files.extend(sorted(glob.glob(str(pattern))) or [pattern])
+        with self._lock:
+            new_rows = {str(path): self.ingest_file(path) for path in files}
+            self.save()
+        return new_rows
+
+    # הצבירה החודשית של כל הקבצים יחד, ומספר היחידות השונות שהופיעו בהם
+    def months(self):
+        total = {}
+        with self._lock:
+            for entry in self.files.values():
+                _merge(total, entry['months'])
+        return dict(sorted(total.items()))
+
+    def villa_count(self):
+        with self._lock:
+            return len(set().union(*(entry['villas'] for entry in self.files.values())))
+
+
+# מספר הלילות באמצע שבוע ובסוף שבוע בכל חודש (מערך חודשים x 2)
+def _nights_in_months(labels):
+    first = np.array(labels, dtype='datetime64[M]')
+    days = (first + 1).astype('datetime64[D]') - first.astype('datetime64[D]')
+    result = np.zeros((len(labels), 2))
+    for i, (start, count) in enumerate(zip(first.astype('datetime64[D]'), days.astype(np.int64))):
+        weekend = np.isin((np.arange(count) + start.astype(np.int64) - 4) % 7, WEEKEND_NIGHTS)
+        result[i] = count - weekend.sum(), weekend.sum()
+    return result
+
+
+# טבלה חודשית (מילון של מערכים): לילות, הכנסות, לילות זמינים, תפוסה ו-ADR (הכנסה ממוצעת ללילה מוזמן),
+# ועונה לפי חודשי השיא של מודל לוח השנה. החודשים הם הטווח הרציף מהחודש הראשון עד האחרון בנתונים.
+def monthly_table(months, num_villas):
+    if not months:
+        return {}
+    labels = [str(month) for month in np.arange(np.datetime64(min(months), 'M'), np.datetime64(max(months), 'M') + 1)]
+    values = np.array([months.get(label, [0.0, 0.0, 0.0, 0.0]) for label in labels])
+    available = _nights_in_months(labels) * num_villas
+    nights = values[:, _WEEKDAY_NIGHTS] + values[:, _WEEKEND_NIGHTS]
+    revenue = values[:, _WEEKDAY_REVENUE] + values[:, _WEEKEND_REVENUE]
+    month_number = np.array([int(label[5:]) for label in labels])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'Month': np.array(labels),
+            'Season': np.where((month_number >= PEAK_MONTHS[0]) & (month_number <= PEAK_MONTHS[1]), 'שיא', 'רגילה'),
+            'Nights': nights,
+            'Revenue': revenue,
+            'Available Nights': available.sum(axis=1),
+            'Occupancy': nights / available.sum(axis=1),
+            'ADR': revenue / nights,
+            'Weekday Nights': values[:, _WEEKDAY_NIGHTS],
+            'Weekend Nights': values[:, _WEEKEND_NIGHTS],
+            'Weekday Revenue': values[:, _WEEKDAY_REVENUE],
+            'Weekend Revenue': values[:, _WEEKEND_REVENUE],
+            'Available Weekday Nights': available[:, 0],
+            'Available Weekend Nights': available[:, 1],
+        }
+
+
+# תפוסה ו-ADR לפי עונה: {עונה: {'Occupancy', 'ADR', 'Nights'}}
+def season_summary(table):
+    summary = {}
+    for season in ('רגילה', 'שיא'):
+        rows = table['Season'] == season
+        nights = table['Nights'][rows].sum()
+        available = table['Available Nights'][rows].sum()
+        summary[season] = {'Nights': nights,
+                           'Occupancy': nights / available if available else np.nan,
+                           'ADR': table['Revenue'][rows].sum() / nights if nights else np.nan}
+    return summary
+
+
+def _ratio(numerator, denominator):
+    return float(numerator / denominator) if denominator > 0 and np.isfinite(numerator / denominator) else None
+
+
+# קלטי מודל מהנתונים (שדות ProjectParams): שיעור תפוסה ממוצע, ומחיר ללילה לפי מודל ההכנסות - ADR כולל במודל
+# האחיד, או ADR של לילה רגיל מחוץ לעונה במודל לוח השנה יחד עם מכפילי סוף השבוע ועונת השיא כיחס בין סוגי הלילות.
+# מכפילי החגים אינם נגזרים (מועדי החגים משתנים משנה לשנה) ונשארים כפי שהם.
+def model_inputs(table, revenue_model=REVENUE_MODELS[0]):
+    if not table or not table['Nights'].sum():
+        return {}
+    inputs = {'occupancy_rate': min(1.0, float(table['Nights'].sum() / table['Available Nights'].sum()))}
+    if REVENUE_MODELS.index(revenue_model) != CALENDAR:
+        inputs['price_per_night'] = float(table['Revenue'].sum() / table['Nights'].sum())
+        return inputs
+
+    peak = table['Season'] == 'שיא'
+
+    def rates(rows, nights, revenue, available):
+        booked = table[nights][rows].sum()
+        return (booked / table[available][rows].sum() if table[available][rows].sum() else np.nan,
+                table[revenue][rows].sum() / booked if booked else np.nan)
+
+    base_occupancy, base_price = rates(~peak, 'Weekday Nights', 'Weekday Revenue', 'Available Weekday Nights')
+    weekend_occupancy, weekend_price = rates(~peak, 'Weekend Nights', 'Weekend Revenue', 'Available Weekend Nights')
+    peak_occupancy, peak_price = rates(peak, 'Weekday Nights', 'Weekday Revenue', 'Available Weekday Nights')
+    derived = {
+        'price_per_night': float(base_price) if np.isfinite(base_price) else None,
+        'weekend_price_multiplier': _ratio(weekend_price, base_price),
+        'weekend_occupancy_multiplier': _ratio(weekend_occupancy, base_occupancy),
+        'peak_season_price_multiplier': _ratio(peak_price, base_price),
+        'peak_season_occupancy_multiplier': _ratio(peak_occupancy, base_occupancy),
+    }
+    inputs.update((field, value) for field, value in derived.items() if value is not None)
+    return inputs
+
+
+# טווחי ניתוח רגישות מהנתונים (ביחידות התצוגה, כמו model.SENSITIVITY_RANGES): מהחודש החלש לחזק
+def observed_ranges(table):
+    booked = table['Nights'] > 0 if table else None
+    if booked is None or not booked.any():
+        return {}
+    occupancy = np.clip(table['Occupancy'][booked] * 100, 0, 100)
+    adr = table['ADR'][booked]
+    price_step = 100
+    return {
+        'שיעור תפוסה': range(math.floor(occupancy.min()), math.ceil(occupancy.max()) + 1),
+        'מחיר ללילה': range(math.floor(adr.min() / price_step) * price_step,
+                            math.ceil(adr.max() / price_step) * price_step + 1, price_step),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m profitability.bookings',
+        description='קליטה מצטברת של קובצי הזמנות (CSV / Parquet) וחישוב תפוסה ו-ADR לפי חודש ועונה.')
+    parser.add_argument('files', nargs='+', help='קובצי הזמנות או תבניות glob')
+    parser.add_argument('--state', help='קובץ המצב של הקליטה (ברירת מחדל: ~/.cache/profitability/bookings.json)')
+    parser.add_argument('--villas', type=int, help='מספר הווילות (ברירת מחדל: מספר היחידות השונות בנתונים)')
+    parser.add_argument('--revenue-model', choices=REVENUE_MODELS, default=REVENUE_MODELS[0],
+                        help='מודל ההכנסות שעבורו נגזרים קלטי המודל')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='מספר שורות בכל מקטע קריאה')
+    for field, column in DEFAULT_COLUMNS.items():
+        parser.add_argument(f'--{field.replace("_", "-")}-column', dest=field, default=column,
+                            help=f'שם העמודה של {field} (ברירת מחדל: {column})')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    ingestor = BookingIngestor(args.state, {field: getattr(args, field) for field in DEFAULT_COLUMNS}, args.chunk_size)
+    for path, rows in ingestor.ingest(args.files).items():
+        print(f'{path}: {rows:,} שורות חדשות', file=sys.stderr)
+
+    villas = args.villas or ingestor.villa_count()
+    if not villas:
+        print('לא ידוע מספר הווילות: יש להעביר --villas', file=sys.stderr)
+        return 1
+    table = monthly_table(ingestor.months(), villas)
+    for i, month in enumerate(table.get('Month', [])):
+        print(f"{month}  {table['Season'][i]:6s} תפוסה {table['Occupancy'][i]:7.1%}  ADR {table['ADR'][i]:10,.0f}")
+    for season, summary in season_summary(table).items() if table else ():
+        print(f"{season}: תפוסה {summary['Occupancy']:.1%}, ADR {summary['ADR']:,.0f}")
+    print(json.dumps(model_inputs(table, args.revenue_model), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
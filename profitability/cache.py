@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+
+# מטמון בגודל חסום עם פינוי הפריט שנעשה בו שימוש לפני הכי הרבה זמן (LRU).
+# המפתחות חייבים להיות ניתנים לגיבוב (למשל ProjectParams או tuple של ערכים); בטוח לשימוש ממספר תהליכונים.
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    # ערך שמור (או default אם אינו במטמון), בלי לחשב
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests else 0.0,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+# מטמונים נפרדים לכל שלב בחישוב, כך שכל אחד מחושב מחדש רק כשהקלטים שלו משתנים.
+# הם מוגדרים ברמת המודול ולכן נשמרים בין הרצות של app.py ומשותפים לכל המשתמשים בתהליך.
+schedule_cache = LRUCache(maxsize=64)
+metrics_cache = LRUCache(maxsize=256)
+sensitivity_cache = LRUCache(maxsize=64)
+simulation_cache = LRUCache(maxsize=16)
+figure_cache = LRUCache(maxsize=64)
@@ -0,0 +1,366 @@
+import numpy as np
+
+from .loans import period_payments, variable_rate_schedule
+from .seasonality import CALENDAR, seasonal_nights
+from .xirr import annual_dates, xirr_batch, year_fractions
+
+# שנות רווח המשמשות כערך שארית בסוף התקופה
+TERMINAL_VALUE_YEARS = 10
+
+# עיתוי קבלת הסובסידיה: פריסה שווה לאורך תקופת ההלוואה, או מענק מלא במועד ההשקעה
+SUBSIDY_TIMINGS = ('פריסה שנתית', 'מענק מראש')
+SPREAD, UPFRONT = range(len(SUBSIDY_TIMINGS))
+
+# מפתחות המדדים הפיננסיים, בסדר שבו הם מוחזרים
+METRIC_KEYS = (
+    'Gross Annual Profit',
+    'Operating Annual Profit',
+    'Net Annual Profit (Before Subsidy)',
+    'Net Annual Profit with Min Subsidy',
+    'Net Annual Profit with Max Subsidy',
+    'NPV Min',
+    'NPV Max',
+    'ROI Min',
+    'ROI Max',
+    'IRR Min',
+    'IRR Max',
+    'Payback Period Min',
+    'Payback Period Max',
+    'Total Construction Cost',
+    'Annual Operational Cost',
+    'Annual Financing Cost',
+)
+
+
+# המרת עיתוי סובסידיה (מחרוזת, קוד או מערך שלהם) למערך קודים מספריים
+def subsidy_timing_codes(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values.astype(np.int64)
+    codes = np.full(values.shape, -1, dtype=np.int64)
+    for code, name in enumerate(SUBSIDY_TIMINGS):
+        codes[values == name] = code
+    if (codes < 0).any():
+        unknown = sorted(set(np.atleast_1d(values[codes < 0]).tolist()))
+        raise ValueError(f"עיתוי סובסידיה לא מוכר: {unknown}")
+    return codes
+
+
+# השלבים שלהלן מקבלים עמודות תרחישים מנורמלות (ראו batch.scenario_columns) ומחזירים מטריצות (תרחיש x תקופה)
+# באופק של ההלוואה הארוכה ביותר; תקופות שאחרי סוף ההלוואה של תרחיש מאופסות. כל שלב קורא רק את השדות שלו,
+# כך ש-graph.ModelGraph יכול לחשב מחדש רק את השלבים שהקלטים שלהם השתנו.
+
+# עלות הקמה כוללת לכל תרחיש (בנייה, קרקע ופיתוח)
+def construction_cost(c):
+    return (
+            c['construction_cost_per_sqm'] * c['villa_size_sqm'] * c['num_villas'] +
+            c['land_cost_per_villa'] * c['num_villas'] +
+            c['land_development_cost'] +
+            c['public_area_development_cost'] +
+            c['reception_and_logistics_cost'] +
+            c['small_event_hall_cost'] +
+            c['planning_and_consultants_cost']
+    )
+
+
+# ציר התקופות: מספר התקופה (1..אופק), מסכת התקופות הפעילות ואורך ההלוואה בתקופות לכל תרחיש
+def period_grid(c, periods_per_year=1):
+    term_periods = c['loan_term'][:, None] * periods_per_year
+    period = np.arange(1, int(c['loan_term'].max()) * periods_per_year + 1)
+    return {
+        'Period': period,
+        'Term Periods': term_periods,
+        'Active': period[None, :] <= term_periods,
+        'Periods Per Year': periods_per_year,
+    }
+
+
+def _masked(periods, values):
+    active = periods['Active']
+    return np.where(active, np.broadcast_to(values, active.shape), 0.0)
+
+
+# הכנסות ועלויות תפעול לתקופה, מוצמדות לאינפלציה (עדכון פעם בשנה).
+# במודל לוח השנה הלילות המוזמנים וההכנסה של כל תקופה נגזרים מלוח השנה (seasonality), והעלויות המשתנות
+# נקבעות לפי הלילות המוזמנים בפועל; אחרת התפוסה והמחיר אחידים לאורך השנה.
+def operating_flows(c, periods):
+    periods_per_year = periods['Periods Per Year']
+    period_index = periods['Period'][None, :] - 1
+    year_index = period_index // periods_per_year
+    inflation = (1 + c['annual_inflation_rate'][:, None]) ** year_index
+
+    villas = c['num_villas'][:, None]
+    booked_nights = c['occupancy_rate'][:, None] * 365 * villas / periods_per_year
+    revenue = c['price_per_night'][:, None] * booked_nights
+    calendar = c['revenue_model'] == CALENDAR
+    if calendar.any():
+        seasonal_booked, seasonal_revenue = seasonal_nights(c, periods_per_year)
+        season = (periods['Period'] - 1) % periods_per_year
+        booked_nights = np.where(calendar[:, None], seasonal_booked[:, season] * villas, booked_nights)
+        revenue = np.where(calendar[:, None], seasonal_revenue[:, season] * villas, revenue)
+    revenue = revenue * inflation
+    variable_cost = (c['cleaning_cost_per_night'] + c['accessories_cost_per_night'])[:, None] * booked_nights * inflation
+    fixed_cost = (c['monthly_operational_cost_per_villa'][:, None] * 12 * villas +
+                  c['annual_insurance_cost_per_villa'][:, None] * villas +
+                  c['annual_marketing_cost'][:, None]) / periods_per_year * inflation
+    return {
+        'Revenue': _masked(periods, revenue),
+        'Operating Cost': _masked(periods, variable_cost + fixed_cost),
+    }
+
+
+# ריבית הפריים החודשית של מסלול ריבית (ראו rates.rate_path) לכל תרחיש: המסלול מוזז במקביל בהפרש בין ריבית
+# הפריים של התרחיש לריבית הבסיס של המסלול, כך ששינוי של prime_interest_rate (ניתוח רגישות, חיפוש יעד, הגרלה
+# במונטה קרלו) משפיע גם על הלוואה בריבית משתנה
+def path_prime_rates(rate_path, prime_interest_rate):
+    return np.atleast_2d(rate_path['Prime']) + (np.asarray(prime_interest_rate) - rate_path['Base'])[..., None]
+
+
+# ריבית וקרן לתקופה לפי לוח הסילוקין בפועל של ההלוואה (עלות ההקמה בניכוי ההון העצמי).
+# עם rate_path הלוח מחושב בריבית משתנה לפי מסלול הפריים החודשי (path_prime_rates) במקום ריבית קבועה,
+# כולל אירועי מחזור ופירעון מוקדם, והריבית והקרן של כל תקופה הן סכום החודשים שלה.
+def financing_flows(c, total_construction_cost, periods, rate_path=None):
+    months_per_period = 12 // periods['Periods Per Year']
+    if rate_path is not None:
+        schedule = variable_rate_schedule(total_construction_cost - c['equity_amount'],
+                                          path_prime_rates(rate_path, c['prime_interest_rate']),
+                                          c['additional_interest_rate'], c['loan_term'], c['repayment_type'],
+                                          rate_path['Refinancing'], rate_path['Prepayments'])
+        rows, horizon = periods['Active'].shape
+        return {
+            'Interest': schedule['ריבית לתשלום'].reshape(rows, horizon, months_per_period).sum(axis=2),
+            'Principal': schedule['קרן לתשלום'].reshape(rows, horizon, months_per_period).sum(axis=2),
+        }
+    interest, principal = period_payments(total_construction_cost - c['equity_amount'],
+                                          c['prime_interest_rate'] + c['additional_interest_rate'], c['loan_term'],
+                                          c['repayment_type'], months_per_period, periods['Active'].shape[1])
+    return {
+        'Interest': _masked(periods, interest),
+        'Principal': _masked(periods, principal),
+    }
+
+
+# מס ורווח נקי לפני סובסידיה: המס מחושב על הרווח התפעולי בניכוי הריבית
+def profit_flows(c, operating, financing):
+    operating_profit = operating['Revenue'] - operating['Operating Cost']
+    taxable_profit = operating_profit - financing['Interest']
+    tax = taxable_profit * c['tax_rate'][:, None]
+    return {
+        'Operating Profit': operating_profit,
+        'Tax': tax,
+        'Net Profit Before Subsidy': taxable_profit - tax,
+    }
+
+
+# סובסידיה לתקופה: חלק שווה בכל תקופה בפריסה שנתית, או אפס במענק מראש (המענק נכלל בתקופה 0)
+def subsidy_flows(c, total_construction_cost, periods):
+    spread = (c['subsidy_timing'][:, None] == SPREAD) / periods['Term Periods']
+    return {
+        'Subsidy Min': _masked(periods, (total_construction_cost * c['subsidy_min'])[:, None] * spread),
+        'Subsidy Max': _masked(periods, (total_construction_cost * c['subsidy_max'])[:, None] * spread),
+    }
+
+
+# מודל תזרים מזומנים לפי תקופות, וקטורי על פני תרחישים ותקופות בבת אחת.
+# periods_per_year הוא 1 (שנתי) או 12 (חודשי); מחזיר מילון של מטריצות לפי רכיב.
+def project_cash_flows(columns, periods_per_year=1, rate_path=None):
+    total_construction_cost = construction_cost(columns)
+    periods = period_grid(columns, periods_per_year)
+    operating = operating_flows(columns, periods)
+    financing = financing_flows(columns, total_construction_cost, periods, rate_path)
+    return combine_flows(total_construction_cost, periods, operating, financing,
+                         profit_flows(columns, operating, financing),
+                         subsidy_flows(columns, total_construction_cost, periods))
+
+
+# איחוד רכיבי התזרים למילון אחד
+def combine_flows(total_construction_cost, periods, operating, financing, profit, subsidy):
+    return {
+        'Period': periods['Period'],
+        'Total Construction Cost': total_construction_cost,
+        'Revenue': operating['Revenue'],
+        'Operating Cost': operating['Operating Cost'],
+        'Operating Profit': profit['Operating Profit'],
+        'Interest': financing['Interest'],
+        'Principal': financing['Principal'],
+        'Tax': profit['Tax'],
+        'Net Profit Before Subsidy': profit['Net Profit Before Subsidy'],
+        'Subsidy Min': subsidy['Subsidy Min'],
+        'Subsidy Max': subsidy['Subsidy Max'],
+    }
+
+
+# סכום שנתי של מטריצת תקופות (תרחיש x שנה)
+def annual_totals(values, periods_per_year=1):
+    if periods_per_year == 1:
+        return values
+    return values.reshape(values.shape[0], -1, periods_per_year).sum(axis=2)
+
+
+# זרמי התזרים שמהם נגזרים המדדים. עמודות: 0 = השקעה, 1..אופק = תקופות, ועמודה אחרונה לערך השארית
+# של התרחיש הארוך ביותר (ערך השארית של כל תרחיש נמצא בתקופה שאחרי סוף ההלוואה שלו).
+# cash_flow: ההשקעה המלאה (בניכוי מענק מראש), לחישוב NPV ו-IRR; values: ההשקעה בניכוי הסובסידיה, ל-ROI ולתקופת החזר.
+def cash_flow_streams(c, flows, periods_per_year=1):
+    n = c['loan_term'].size
+    loan_term = c['loan_term'][:, None]
+    term_periods = loan_term * periods_per_year
+    horizon = flows['Revenue'].shape[1]
+    total_construction_cost = flows['Total Construction Cost']
+    upfront = c['subsidy_timing'] == UPFRONT
+
+    rows = np.arange(n)
+    terminal_column = term_periods[:, 0].astype(np.int64) + 1
+    column = np.arange(horizon + 2)[None, :]
+    terminal = column == terminal_column[:, None]
+    # בתזרים שנתי זמן ערך השארית (שנה אחרי סוף ההלוואה) שווה למספר העמודה, ולכן הזמנים משותפים לכל התרחישים
+    times = np.broadcast_to(column / periods_per_year, terminal.shape)
+    if periods_per_year > 1:
+        times = times.copy()
+        times[rows, terminal_column] = loan_term[:, 0] + 1
+
+    net_before = flows['Net Profit Before Subsidy']
+    net_min = net_before + flows['Subsidy Min']
+    net_max = net_before + flows['Subsidy Max']
+    last_year = terminal_column[:, None] - np.arange(1, periods_per_year + 1)
+    terminal_value = TERMINAL_VALUE_YEARS * np.take_along_axis(net_min, last_year - 1, axis=1).sum(axis=1)
+
+    def cash_flows(initial, per_period):
+        matrix = np.empty((n, horizon + 2), dtype=np.result_type(initial, per_period))
+        matrix[:, 0] = -initial
+        matrix[:, 1:horizon + 1] = per_period
+        matrix[:, horizon + 1] = 0
+        matrix[rows, terminal_column] = terminal_value
+        return matrix
+
+    # ROI (XIRR) לפי תאריכים קלנדריים בתזרים שנתי
+    roi_times = times
+    if periods_per_year == 1:
+        roi_times = np.broadcast_to(year_fractions(annual_dates(horizon + 2))[None, :], times.shape)
+
+    return {
+        'Times': times,
+        'ROI Times': roi_times,
+        'Terminal': terminal,
+        'Periods Per Year': periods_per_year,
+        'Net Min': net_min,
+        'Net Max': net_max,
+        'Cash Flow Min': cash_flows(total_construction_cost * (1 - np.where(upfront, c['subsidy_min'], 0)), net_min),
+        'Cash Flow Max': cash_flows(total_construction_cost * (1 - np.where(upfront, c['subsidy_max'], 0)), net_max),
+        'Values Min': cash_flows(total_construction_cost * (1 - c['subsidy_min']), net_min),
+        'Values Max': cash_flows(total_construction_cost * (1 - c['subsidy_max']), net_max),
+    }
+
+
+# NPV של התזרים המלא (כולל ערך השארית)
+def npv_metrics(c, streams):
+    discount = (1 + c['discount_rate'][:, None]) ** -streams['Times']
+    return {
+        'NPV Min': (streams['Cash Flow Min'] * discount).sum(axis=1),
+        'NPV Max': (streams['Cash Flow Max'] * discount).sum(axis=1),
+    }
+
+
+# IRR של התזרים המלא (NaN כשאין לתזרים שיעור תשואה פנימי). הפתרון של Min משמש ניחוש התחלתי ל-Max
+# (התזרימים נבדלים רק בסובסידיה), כך שהפתרון השני מתכנס בכמה איטרציות
+def irr_metrics(streams):
+    irr_min = xirr_batch(streams['Cash Flow Min'], streams['Times'], _coarse_guess(streams, 'Cash Flow Min'))
+    irr_max = xirr_batch(streams['Cash Flow Max'], streams['Times'], irr_min)
+    return {
+        'IRR Min': irr_min * 100,
+        'IRR Max': irr_max * 100,
+    }
+
+
+# ROI (XIRR) על ההשקעה בניכוי הסובסידיה
+def roi_metrics(streams):
+    roi_min = xirr_batch(streams['Values Min'], streams['ROI Times'], _coarse_guess(streams, 'Values Min'))
+    roi_max = xirr_batch(streams['Values Max'], streams['ROI Times'], roi_min)
+    return {
+        'ROI Min': roi_min * 100,
+        'ROI Max': roi_max * 100,
+    }
+
+
+# ניחוש התחלתי ל-XIRR של תזרים לפי תקופות קצרות משנה: ה-XIRR של אותו תזרים מצורף לשנים (עמודה לכל שנה
+# במקום לכל תקופה), שמחושב במטריצה קטנה פי periods_per_year וקרוב לפתרון. בתזרים שנתי - 0.
+def _coarse_guess(streams, name):
+    periods_per_year = streams['Periods Per Year']
+    if periods_per_year == 1:
+        return 0.0
+    values = streams[name]
+    n, columns = values.shape
+    years = (columns - 2) // periods_per_year
+    annual = np.empty((n, years + 2))
+    annual[:, 0] = values[:, 0]
+    annual[:, 1:years + 1] = values[:, 1:columns - 1].reshape(n, years, periods_per_year).sum(axis=2)
+    annual[:, -1] = values[:, -1]
+    times = streams['Times']
+    annual_times = np.concatenate([np.zeros((n, 1)), np.broadcast_to(np.arange(1, years + 1), (n, years)),
+                                   times[:, -1:]], axis=1)
+    return xirr_batch(annual, annual_times)
+
+
+# תקופת החזר על ההשקעה בניכוי הסובסידיה
+def payback_metrics(streams):
+    args = streams['Times'], streams['Terminal'], streams['Periods Per Year']
+    return {
+        'Payback Period Min': payback_period(streams['Values Min'], *args),
+        'Payback Period Max': payback_period(streams['Values Max'], *args),
+    }
+
+
+# מדדי השנה הראשונה ועלות ההקמה
+def annual_metrics(flows, streams):
+    periods_per_year = streams['Periods Per Year']
+
+    def first_year_total(values):
+        return values[:, :periods_per_year].sum(axis=1)
+
+    return {
+        'Gross Annual Profit': first_year_total(flows['Revenue']),
+        'Operating Annual Profit': first_year_total(flows['Operating Profit']),
+        'Net Annual Profit (Before Subsidy)': first_year_total(flows['Net Profit Before Subsidy']),
+        'Net Annual Profit with Min Subsidy': first_year_total(streams['Net Min']),
+        'Net Annual Profit with Max Subsidy': first_year_total(streams['Net Max']),
+        'Total Construction Cost': flows['Total Construction Cost'],
+        'Annual Operational Cost': first_year_total(flows['Operating Cost']),
+        'Annual Financing Cost': first_year_total(flows['Interest']),
+    }
+
+
+# איחוד תוצאות השלבים למילון מדדים לפי סדר METRIC_KEYS
+def combine_metrics(*parts):
+    merged = {}
+    for part in parts:
+        merged.update(part)
+    return {key: merged[key] for key in METRIC_KEYS}
+
+
+# מדדים פיננסיים מתוך מטריצות התזרים: NPV ו-IRR על התזרים כולו (השקעה, תקופות, ערך שארית),
+# ROI (XIRR) ותקופת החזר על התזרים בניכוי הסובסידיה מההשקעה הראשונית
+def metrics_from_cash_flows(columns, flows, periods_per_year=1):
+    streams = cash_flow_streams(columns, flows, periods_per_year)
+    return combine_metrics(annual_metrics(flows, streams), npv_metrics(columns, streams), roi_metrics(streams),
+                           irr_metrics(streams), payback_metrics(streams))
+
+
+# תקופת החזר בשנים: הזמן שבו התזרים המצטבר (ללא ערך השארית) מתאפס, באינטרפולציה לינארית בתוך התקופה.
+# אם ההשקעה לא הוחזרה עד סוף ההלוואה, היתרה מוחזרת בקצב התזרים של השנה האחרונה (אינסוף אם הוא אינו חיובי).
+def payback_period(values, times, terminal, periods_per_year=1):
+    flows = np.where(terminal, 0.0, values)
+    cumulative = np.cumsum(flows, axis=1)
+    recovered = (cumulative >= 0) & (np.arange(values.shape[1]) > 0)[None, :]
+    found = recovered.any(axis=1)
+    index = np.where(found, recovered.argmax(axis=1), 1)
+
+    rows = np.arange(values.shape[0])
+    before = cumulative[rows, index - 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        within = times[rows, index - 1] - before / flows[rows, index] / periods_per_year
+
+        last = terminal.argmax(axis=1) - 1
+        last_year = np.maximum(last[:, None] - np.arange(periods_per_year), 1)
+        last_year_flow = np.take_along_axis(flows, last_year, axis=1).sum(axis=1)
+        remaining = -cumulative[rows, last]
+        extrapolated = np.where(last_year_flow > 0, times[rows, last] + remaining / last_year_flow, np.inf)
+    return np.where(found, within, extrapolated)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch
+from .parallel import calculate_financial_metrics_parallel
+
+# פורמטים נתמכים לפי סיומת קובץ
+INPUT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.json': 'json', '.jsonl': 'jsonl'}
+OUTPUT_FORMATS = ('csv', 'jsonl')
+
+
+# קריאת קובץ תרחישים במקטעים של chunk_size שורות (כל מקטע הוא DataFrame), בלי לטעון את כל הקובץ לזיכרון
+def read_scenarios(path, input_format=None, chunk_size=10000):
+    import pandas as pd
+
+    input_format = input_format or INPUT_FORMATS.get(Path(path).suffix.lower())
+    if input_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif input_format == 'jsonl':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    elif input_format == 'json':
+        # קובץ JSON רגיל (מערך של תרחישים) נטען בשלמותו; לקבצים גדולים עדיף JSON Lines
+        frame = pd.read_json(path)
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+    elif input_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f'פורמט קלט לא נתמך: {path}')
+
+
+# שורת תוצאה לכל תרחיש: עמודות הקלט ואחריהן כל המדדים (עם store - תרחישים שכבר חושבו נקראים מהמאגר,
+# והחסרים מחושבים על פני workers תהליכים ונשמרים בו)
+def evaluate_chunk(frame, workers=1, store=None):
+    if store is not None:
+        metrics = store.metrics_batch(frame, workers)
+    elif workers == 1:
+        metrics = calculate_financial_metrics_batch(frame)
+    else:
+        metrics = calculate_financial_metrics_parallel(frame, workers)
+    result = frame.reset_index(drop=True).copy()
+    for name, values in metrics.items():
+        result[name] = values
+    return result
+
+
+# כתיבת מקטע תוצאות לזרם הפלט (כותרת CSV נכתבת רק במקטע הראשון)
+def write_chunk(result, stream, output_format, first):
+    if output_format == 'csv':
+        result.to_csv(stream, header=first, index=False)
+    else:
+        for record in result.to_dict(orient='records'):
+            stream.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+    stream.flush()
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m profitability',
+        description='חישוב מדדים פיננסיים לקובץ תרחישים (CSV / Parquet / JSON) ללא ממשק Streamlit. '
+                    'עמודה חסרה מקבלת את ערך ברירת המחדל של האפליקציה.')
+    parser.add_argument('input', help='קובץ תרחישים, שורה לכל תרחיש ועמודה לכל פרמטר ב-ProjectParams')
+    parser.add_argument('-o', '--output', help='קובץ פלט (ברירת מחדל: פלט סטנדרטי)')
+    parser.add_argument('--input-format', choices=sorted(set(INPUT_FORMATS.values())),
+                        help='פורמט הקלט (ברירת מחדל: לפי סיומת הקובץ)')
+    parser.add_argument('--format', dest='output_format', choices=OUTPUT_FORMATS,
+                        help='פורמט הפלט (ברירת מחדל: לפי סיומת קובץ הפלט, אחרת csv)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='מספר תרחישים בכל מקטע')
+    parser.add_argument('--workers', default='1', help='מספר תהליכים (auto = כל הליבות)')
+    parser.add_argument('--store', nargs='?', const='', default=None,
+                        help='לקרוא ולשמור תוצאות במאגר התרחישים (נתיב קובץ; ללא נתיב - מאגר ברירת המחדל)')
+    return parser
+
+
+def main(argv=None):
+    from .parallel import resolve_workers
+
+    args = build_parser().parse_args(argv)
+    output_format = args.output_format
+    if output_format is None:
+        output_format = 'jsonl' if args.output and Path(args.output).suffix.lower() in ('.jsonl', '.json') else 'csv'
+    workers = resolve_workers(args.workers)
+    store = None
+    if args.store is not None:
+        from .store import default_store
+
+        store = default_store(args.store or None)
+
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for index, frame in enumerate(read_scenarios(args.input, args.input_format, args.chunk_size)):
+            write_chunk(evaluate_chunk(frame, workers, store), stream, output_format, first=index == 0)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
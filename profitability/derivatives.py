@@ -0,0 +1,117 @@
+import numpy as np
+
+from .batch import CATEGORY_CODES, DEFAULT_SCENARIO, scenario_columns, single_path
+from .cashflows import cash_flow_streams, npv_metrics, payback_period, project_cash_flows
+from .grid import GRID_METRICS
+from .model import INPUT_ROWS
+from .xirr import xirr_batch
+
+# השדות שלפיהם נגזרים המדדים: כל השדות המספריים מלבד תקופת ההלוואה, שקובעת את אורך התזרים ואינה רציפה
+DIFFERENTIABLE_FIELDS = tuple(field for field in DEFAULT_SCENARIO
+                              if field not in CATEGORY_CODES and field != 'loan_term')
+
+# המדדים שנגזרותיהם מחושבות
+GRADIENT_METRICS = ('NPV Min', 'NPV Max', 'IRR Min', 'IRR Max', 'Payback Period Min', 'Payback Period Max')
+
+# גודל הצעד המדומה: בגזירה בצעד מרוכב אין חיסור של ערכים קרובים, ולכן הצעד יכול להיות זעיר והנגזרת מדויקת
+# עד דיוק המכונה (בלי שגיאת הקירוב של הפרשים סופיים)
+_STEP = 1e-20
+
+# צעד יחסי להפרשים מרכזיים (תקופת ההחזר, שאינה נגזרת בצעד מרוכב)
+_DIFFERENCE_STEP = 1e-6
+
+
+# עמודות תרחיש מרוכבות: שורה 0 היא התרחיש עצמו, ובשורה i+1 לשדה ה-i נוסף צעד מדומה. החלק המדומה של כל
+# ערך שמחושב מהעמודות הוא הנגזרת שלו לפי השדה של השורה (כפול הצעד) - גזירה קדמית של כל השדות במעבר אחד.
+def _perturbed_columns(params, fields):
+    columns = {name: np.repeat(values, len(fields) + 1) for name, values in scenario_columns(params.as_dict()).items()}
+    for i, field in enumerate(fields):
+        columns[field] = columns[field].astype(np.complex128)
+        columns[field][i + 1] += 1j * _STEP
+    return columns
+
+
+def _split(values):
+    return values[0].real, values[1:].imag / _STEP
+
+
+# תקופת ההחזר נקבעת מהשוואות (התקופה שבה התזרים המצטבר חוצה את האפס) ואינה פונקציה אנליטית של התזרים,
+# ולכן הנגזרת שלה היא בהפרשים מרכזיים על מודל ממשי: שורה 0 היא התרחיש, ולכל שדה שורה עם +h ושורה עם -h,
+# כולן בהערכה וקטורית אחת. מחזיר ({מדד: ערך}, {מדד: מערך נגזרות לפי fields}).
+def _payback_and_derivatives(params, fields, periods_per_year, rate_path):
+    base = scenario_columns(params.as_dict())
+    steps = np.array([_DIFFERENCE_STEP * max(abs(float(base[field][0])), 1.0) for field in fields])
+    columns = {name: np.repeat(values, 2 * len(fields) + 1) for name, values in base.items()}
+    for i, field in enumerate(fields):
+        columns[field][2 * i + 1] += steps[i]
+        columns[field][2 * i + 2] -= steps[i]
+    flows = project_cash_flows(columns, periods_per_year, rate_path)
+    streams = cash_flow_streams(columns, flows, periods_per_year)
+
+    values, derivatives = {}, {}
+    for suffix in ('Min', 'Max'):
+        payback = payback_period(streams[f'Values {suffix}'], streams['Times'], streams['Terminal'], periods_per_year)
+        values[f'Payback Period {suffix}'] = payback[0]
+        with np.errstate(invalid='ignore'):
+            derivatives[f'Payback Period {suffix}'] = (payback[1::2] - payback[2::2]) / (2 * steps)
+    return values, derivatives
+
+
+# נגזרת ה-IRR ממשפט הפונקציה הסתומה: NPV(IRR) = 0, ולכן dIRR = -dNPV(IRR) / (dNPV/dr).
+# ה-IRR עצמו נפתר פעם אחת בלבד, על התזרים של התרחיש, ולא לכל שדה.
+def _irr_and_derivative(cash_flows, times):
+    base, tangent = _split(cash_flows)
+    times = times[0]
+    rate = xirr_batch(base[None, :], times)[0]
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        discount = (1 + rate) ** -times
+        slope = -(times * base * discount).sum() / (1 + rate)
+        return rate * 100, -(tangent @ discount) / slope * 100
+
+
+# נגזרות של NPV, IRR ותקופת החזר (Min ו-Max) לפי כל שדה ב-fields, בהערכה וקטורית אחת של המודל.
+# NPV נגזר בצעד מרוכב דרך מודל התזרים עצמו (עלויות, הכנסות, הלוואה, מס, סובסידיה וערך שארית), נגזרת ה-IRR
+# מחושבת מנגזרות התזרים, ותקופת ההחזר בהפרשים מרכזיים (ראו _payback_and_derivatives). בנקודות שבירה (למשל
+# חיתוך תפוסה ל-100% במודל לוח השנה) הנגזרת בצעד מרוכב היא הנגזרת החד-צדדית של הצד שבו נמצא התרחיש.
+# עם rate_path הנגזרות הן בריבית המשתנה של מסלול הריבית (ראו batch.single_path).
+# מחזיר ({מדד: ערך}, {מדד: {שדה: נגזרת}}); הנגזרות ביחידות השדה (למשל לכל 1.0 של שיעור תפוסה, לא לכל 1%).
+def metric_gradients(params, fields=DIFFERENTIABLE_FIELDS, periods_per_year=1, rate_path=None):
+    fields = list(fields)
+    rate_path = single_path(rate_path)
+    columns = _perturbed_columns(params, fields)
+    flows = project_cash_flows(columns, periods_per_year, rate_path)
+    streams = cash_flow_streams(columns, flows, periods_per_year)
+
+    values, derivatives = _payback_and_derivatives(params, fields, periods_per_year, rate_path)
+    for name, npv in npv_metrics(columns, streams).items():
+        values[name], derivatives[name] = _split(npv)
+    for suffix in ('Min', 'Max'):
+        values[f'IRR {suffix}'], derivatives[f'IRR {suffix}'] = _irr_and_derivative(streams[f'Cash Flow {suffix}'],
+                                                                                    streams['Times'])
+
+    return ({name: float(values[name]) for name in GRADIENT_METRICS},
+            {name: dict(zip(fields, derivatives[name].tolist())) for name in GRADIENT_METRICS})
+
+
+# דירוג גמישויות: לכל שדה, השינוי היחסי במדד לכל שינוי יחסי של 1 בשדה (x/M * dM/dx) עבור NPV, IRR ותקופת החזר
+# (כמו בניתוח הרגישות: NPV ו-IRR מינימליים ותקופת החזר מקסימלית), ממוין לפי הגמישות של NPV מהגדולה לקטנה.
+# שדה שערכו אפס מקבל גמישות אפס; הנגזרת שלו מופיעה בשורה. כל הדירוג הוא הערכה אחת של המודל.
+def elasticity_ranking(params, fields=DIFFERENTIABLE_FIELDS, periods_per_year=1, rate_path=None):
+    labels = {field: label for label, field, _, _ in INPUT_ROWS}
+    values, derivatives = metric_gradients(params, fields, periods_per_year, rate_path)
+    inputs = params.as_dict()
+
+    rows = []
+    for field in fields:
+        row = {'משתנה': labels.get(field, field), 'שדה': field, 'ערך': inputs[field]}
+        for label in ('NPV', 'IRR', 'תקופת החזר'):
+            key = GRID_METRICS[label]
+            derivative = derivatives[key][field]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                elasticity = derivative * inputs[field] / values[key] if values[key] else np.nan
+            row[f'נגזרת {label}'] = derivative
+            row[f'גמישות {label}'] = elasticity
+        rows.append(row)
+
+    rows.sort(key=lambda row: abs(np.nan_to_num(row['גמישות NPV'], nan=0.0)), reverse=True)
+    return rows
@@ -0,0 +1,156 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .batch import path_key, scenario_columns, single_path
+from .cashflows import (
+    annual_metrics,
+    cash_flow_streams,
+    combine_flows,
+    combine_metrics,
+    construction_cost,
+    financing_flows,
+    irr_metrics,
+    npv_metrics,
+    operating_flows,
+    path_prime_rates,
+    payback_metrics,
+    period_grid,
+    profit_flows,
+    roi_metrics,
+    subsidy_flows,
+)
+from .loans import loan_schedule, variable_rate_schedule
+
+
+# צומת בגרף החישוב: function מקבלת את עמודות השדות שהצומת קורא (fields), את periods_per_year
+# ואת ערכי הצמתים שהוא תלוי בהם (inputs) לפי הסדר
+@dataclass(frozen=True)
+class Node:
+    function: object
+    fields: tuple = ()
+    inputs: tuple = ()
+
+
+COST_FIELDS = ('num_villas', 'villa_size_sqm', 'land_cost_per_villa', 'construction_cost_per_sqm',
+               'land_development_cost', 'public_area_development_cost', 'reception_and_logistics_cost',
+               'small_event_hall_cost', 'planning_and_consultants_cost')
+# 'rate_path' הוא קלט של הגרף לצד שדות הפרמטרים: מסלול הריבית המשתנה של ההלוואה, או None (ראו ModelGraph.update)
+LOAN_FIELDS = ('equity_amount', 'prime_interest_rate', 'additional_interest_rate', 'loan_term', 'repayment_type',
+               'rate_path')
+OPERATING_FIELDS = ('num_villas', 'occupancy_rate', 'price_per_night', 'revenue_model', 'weekend_price_multiplier',
+                    'weekend_occupancy_multiplier', 'holiday_price_multiplier', 'holiday_occupancy_multiplier',
+                    'peak_season_price_multiplier', 'peak_season_occupancy_multiplier', 'cleaning_cost_per_night',
+                    'accessories_cost_per_night', 'monthly_operational_cost_per_villa',
+                    'annual_insurance_cost_per_villa', 'annual_marketing_cost', 'annual_inflation_rate')
+SUBSIDY_FIELDS = ('subsidy_min', 'subsidy_max', 'subsidy_timing', 'loan_term')
+
+
+# לוח סילוקין מעוגל לתצוגה (כמו model.calculate_loan_repayment) מתוך עלות ההקמה ושדות ההלוואה
+def _rounded_schedule(c, total_construction_cost):
+    total_loan = total_construction_cost[0] - c['equity_amount'][0]
+    rate_path = c['rate_path']
+    if rate_path is None:
+        schedule = loan_schedule(total_loan, c['prime_interest_rate'][0] + c['additional_interest_rate'][0],
+                                 int(c['loan_term'][0]), int(c['repayment_type'][0]))
+    else:
+        schedule = variable_rate_schedule(total_loan, path_prime_rates(rate_path, c['prime_interest_rate'][0]),
+                                          c['additional_interest_rate'][0], int(c['loan_term'][0]),
+                                          int(c['repayment_type'][0]), rate_path['Refinancing'],
+                                          rate_path['Prepayments'])
+        schedule = {name: column[0] for name, column in schedule.items()}
+    return {name: np.round(column) for name, column in schedule.items()}
+
+
+# מדדים של תרחיש יחיד כמספרים (כמו model.calculate_financial_metrics)
+def _scalar_metrics(*parts):
+    return {name: float(values[0]) for name, values in combine_metrics(*parts).items()}
+
+
+# גרף המודל בסדר טופולוגי: עלות הקמה -> הלוואה -> ריבית -> רווח נקי -> תזרים -> NPV/IRR/ROI/תקופת החזר
+MODEL_NODES = {
+    'construction_cost': Node(lambda c, ppy: construction_cost(c), COST_FIELDS),
+    'periods': Node(lambda c, ppy: period_grid(c, ppy), ('loan_term',)),
+    'loan_schedule': Node(lambda c, ppy, cost: _rounded_schedule(c, cost), LOAN_FIELDS, ('construction_cost',)),
+    'financing': Node(lambda c, ppy, cost, periods: financing_flows(c, cost, periods, c['rate_path']), LOAN_FIELDS,
+                      ('construction_cost', 'periods')),
+    'operating': Node(lambda c, ppy, periods: operating_flows(c, periods), OPERATING_FIELDS, ('periods',)),
+    'profit': Node(lambda c, ppy, operating, financing: profit_flows(c, operating, financing), ('tax_rate',),
+                   ('operating', 'financing')),
+    'subsidy': Node(lambda c, ppy, cost, periods: subsidy_flows(c, cost, periods), SUBSIDY_FIELDS,
+                    ('construction_cost', 'periods')),
+    'cash_flows': Node(lambda c, ppy, *parts: combine_flows(*parts), (),
+                       ('construction_cost', 'periods', 'operating', 'financing', 'profit', 'subsidy')),
+    'streams': Node(lambda c, ppy, flows: cash_flow_streams(c, flows, ppy), SUBSIDY_FIELDS, ('cash_flows',)),
+    'npv': Node(lambda c, ppy, streams: npv_metrics(c, streams), ('discount_rate',), ('streams',)),
+    'irr': Node(lambda c, ppy, streams: irr_metrics(streams), (), ('streams',)),
+    'roi': Node(lambda c, ppy, streams: roi_metrics(streams), (), ('streams',)),
+    'payback': Node(lambda c, ppy, streams: payback_metrics(streams), (), ('streams',)),
+    'annual': Node(lambda c, ppy, flows, streams: annual_metrics(flows, streams), (), ('cash_flows', 'streams')),
+    'metrics': Node(lambda c, ppy, *parts: _scalar_metrics(*parts), (), ('annual', 'npv', 'roi', 'irr', 'payback')),
+}
+
+
+# חישוב מצטבר של המודל: כל צומת נשמר, ועדכון פרמטרים פוסל רק את הצמתים שתלויים (ישירות או בעקיפין)
+# בשדות שהשתנו. צמתים מחושבים בעצלות, רק כשמבקשים אותם או צומת שתלוי בהם.
+# מחזיק מצב של תרחיש אחד ולכן מיועד למופע לכל משתמש (למשל ב-st.session_state), לא לשיתוף בין תהליכונים.
+class ModelGraph:
+    def __init__(self, nodes=None, periods_per_year=1):
+        self.nodes = nodes or MODEL_NODES
+        self.periods_per_year = periods_per_year
+        self.params = None
+        self.rate_path_key = None
+        self.recomputed = []
+        self._columns = {}
+        self._values = {}
+        self._dependents = {name: [] for name in self.nodes}
+        for name, node in self.nodes.items():
+            for dependency in node.inputs:
+                self._dependents[dependency].append(name)
+
+    # עדכון הפרמטרים ומסלול הריבית (מסלול יחיד, ראו batch.single_path) ופסילת הצמתים המושפעים;
+    # מחזיר את שמות הצמתים שנפסלו
+    def update(self, params, rate_path=None):
+        values = params.as_dict()
+        rate_path_key = path_key(rate_path)
+        if self.params is None:
+            changed = set(values) | {'rate_path'}
+        else:
+            previous = self.params.as_dict()
+            changed = {field for field, value in values.items() if value != previous[field]}
+            if rate_path_key != self.rate_path_key:
+                changed.add('rate_path')
+        self.params = params
+        self.rate_path_key = rate_path_key
+        if not changed:
+            return []
+        self._columns = scenario_columns(values)
+        self._columns['rate_path'] = single_path(rate_path)
+
+        stale = [name for name, node in self.nodes.items() if changed.intersection(node.fields)]
+        invalidated = set()
+        while stale:
+            name = stale.pop()
+            if name not in invalidated:
+                invalidated.add(name)
+                stale.extend(self._dependents[name])
+        for name in invalidated:
+            self._values.pop(name, None)
+        return [name for name in self.nodes if name in invalidated]
+
+    # ערך של צומת (מחושב רק אם אינו שמור)
+    def get(self, name):
+        if name not in self._values:
+            node = self.nodes[name]
+            inputs = [self.get(dependency) for dependency in node.inputs]
+            columns = {field: self._columns[field] for field in node.fields}
+            self._values[name] = node.function(columns, self.periods_per_year, *inputs)
+            self.recomputed.append(name)
+        return self._values[name]
+
+    # עדכון לפרמטרים חדשים וחישוב הצמתים המבוקשים; מחזיר (מילון ערכים, רשימת הצמתים שחושבו מחדש לפי הסדר)
+    def evaluate(self, params, outputs=('metrics',), rate_path=None):
+        self.recomputed = []
+        self.update(params, rate_path)
+        values = {name: self.get(name) for name in outputs}
+        return values, list(self.recomputed)
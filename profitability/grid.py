@@ -0,0 +1,79 @@
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch, single_path
+from .parallel import calculate_financial_metrics_parallel
+from .model import SENSITIVITY_RANGES, SENSITIVITY_VARIABLES
+
+# שדות שערכיהם שלמים (מעוגלים בבניית הרשת)
+INTEGER_FIELDS = {'num_villas', 'loan_term'}
+
+# המדדים המוחזרים מהרשת ומהטורנדו, כמו בניתוח הרגישות החד-ממדי
+GRID_METRICS = {
+    'ROI': 'ROI Min',
+    'NPV': 'NPV Min',
+    'IRR': 'IRR Min',
+    'תקופת החזר': 'Payback Period Max',
+}
+
+
+# ערכי ציר ברירת מחדל למשתנה: resolution נקודות בין קצוות טווח הרגישות שלו (ביחידות התצוגה)
+def default_axis(variable_name, resolution=25):
+    variable_range = SENSITIVITY_RANGES[variable_name]
+    values = np.linspace(min(variable_range), max(variable_range), resolution)
+    if SENSITIVITY_VARIABLES[variable_name][0] in INTEGER_FIELDS:
+        values = np.unique(np.round(values))
+    return values
+
+
+# ניתוח רגישות רב-ממדי: כל צירוף של ערכי הצירים מחושב במעבר וקטורי אחד על מנוע האצווה.
+# axes הוא מילון {שם משתנה: ערכים ביחידות התצוגה}; מחזיר מילון {מדד: מערך בצורת הרשת},
+# כשהממד ה-i של כל מערך מתאים לציר ה-i לפי סדר המילון. רשתות גדולות מתחלקות בין workers תהליכים.
+# עם rate_path עלות המימון בכל נקודה נגזרת ממסלול הריבית (ראו batch.single_path).
+def sensitivity_grid(params, axes, workers=None, rate_path=None):
+    names = list(axes)
+    values = [np.asarray(axes[name], dtype=np.float64) for name in names]
+    mesh = np.meshgrid(*values, indexing='ij')
+
+    scenarios = params.as_dict()
+    for name, points in zip(names, mesh):
+        field, scale = SENSITIVITY_VARIABLES[name]
+        scenarios[field] = points.ravel() * scale
+
+    metrics = calculate_financial_metrics_parallel(scenarios, workers, rate_path=single_path(rate_path))
+    shape = mesh[0].shape
+    return {label: metrics[key].reshape(shape) for label, key in GRID_METRICS.items()}
+
+
+# תרשים טורנדו: השפעת שינוי של ±swing (יחסי) בכל משתנה, בנפרד, על המדדים - במעבר וקטורי אחד.
+# מחזיר רשימת שורות (משתנה, ערך נמוך/גבוה ביחידות התצוגה ומדד בכל קצה) ממוינת לפי טווח ההשפעה על NPV מהגדול לקטן.
+# עם rate_path עלות המימון נגזרת ממסלול הריבית, כמו ב-sensitivity_grid.
+def tornado(params, variables=None, swing=0.2, rate_path=None):
+    variables = list(variables or SENSITIVITY_VARIABLES)
+    fields = [SENSITIVITY_VARIABLES[name][0] for name in variables]
+    base = params.as_dict()
+
+    scenarios = {field: np.full(2 * len(fields) + 1, value, dtype=object if isinstance(value, str) else np.float64)
+                 for field, value in base.items()}
+    for i, field in enumerate(fields):
+        low, high = base[field] * (1 - swing), base[field] * (1 + swing)
+        if field in INTEGER_FIELDS:
+            low, high = np.floor(low), np.ceil(high)
+        scenarios[field][2 * i + 1] = low
+        scenarios[field][2 * i + 2] = high
+
+    metrics = calculate_financial_metrics_batch(scenarios, rate_path=single_path(rate_path))
+
+    rows = []
+    for i, (name, field) in enumerate(zip(variables, fields)):
+        scale = SENSITIVITY_VARIABLES[name][1]
+        row = {'משתנה': name,
+               'ערך נמוך': scenarios[field][2 * i + 1] / scale,
+               'ערך גבוה': scenarios[field][2 * i + 2] / scale}
+        for label, key in GRID_METRICS.items():
+            row[f'{label} בסיס'] = metrics[key][0]
+            row[f'{label} נמוך'] = metrics[key][2 * i + 1]
+            row[f'{label} גבוה'] = metrics[key][2 * i + 2]
+        rows.append(row)
+
+    rows.sort(key=lambda row: abs(row['NPV גבוה'] - row['NPV נמוך']), reverse=True)
+    return rows
@@ -0,0 +1,89 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# משתנה סביבה עם נתיב לקובץ JSON Lines שאליו נכתבת רשומת ביצועים לכל הרצה (ללא ערך - אין כתיבה)
+PERF_LOG_ENV_VAR = 'PROFITABILITY_PERF_LOG'
+
+_log_lock = threading.Lock()
+
+
+# מדידת זמנים לשלבים של הרצה אחת: lap רושם את הזמן שעבר מהנקודה הקודמת תחת שם השלב,
+# stage מודד בלוק קוד, ו-count סופר אירועים. שלב שמופיע כמה פעמים מצטבר.
+class StageTimer:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started = self._last = clock()
+        self.stages = {}
+        self.counters = {}
+
+    def lap(self, name):
+        now = self._clock()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self._last
+        self._last = now
+
+    @contextmanager
+    def stage(self, name):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._last = self._clock()
+            self.stages[name] = self.stages.get(name, 0.0) + self._last - start
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def total(self):
+        return self._clock() - self.started
+
+    # רשומת ביצועים של ההרצה (זמנים בשניות), עם שדות נוספים כמו מזהה משתמש ונתוני מטמון
+    def as_record(self, **extra):
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'total': self.total(),
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+        }
+        record.update(extra)
+        return record
+
+
+# נתוני פגיעה לכל מטמון: {שם: info() של המטמון}
+def cache_stats(caches):
+    return {name: cache.info() for name, cache in caches.items()}
+
+
+# הפעלת cProfile להרצה הנוכחית (None אם פרופיילר אחר כבר פעיל בתהליך)
+def start_profiler():
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+# עצירת הפרופיילר וסיכום הפונקציות עם הזמן המצטבר הגבוה ביותר כטקסט
+def profile_summary(profiler, limit=25):
+    profiler.disable()
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+# כתיבת רשומה כשורת JSON לקובץ (ברירת מחדל: הנתיב במשתנה הסביבה); מחזיר האם נכתבה
+def log_json_line(record, path=None):
+    path = path or os.environ.get(PERF_LOG_ENV_VAR)
+    if not path:
+        return False
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as stream:
+            stream.write(line + '\n')
+    return True
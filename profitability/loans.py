@@ -0,0 +1,223 @@
+import numpy as np
+
+# סוגי סילוקין נתמכים (הקוד המספרי של כל סוג הוא המיקום שלו ברשימה)
+REPAYMENT_TYPES = ('שפיצר', 'קרן שווה', 'בוליט')
+SPITZER, EQUAL_PRINCIPAL, BULLET = range(len(REPAYMENT_TYPES))
+
+
+# המרת סוג סילוקין (מחרוזת, קוד או מערך שלהם) למערך קודים מספריים
+def repayment_codes(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values.astype(np.int64)
+    codes = np.full(values.shape, -1, dtype=np.int64)
+    for code, name in enumerate(REPAYMENT_TYPES):
+        codes[values == name] = code
+    if (codes < 0).any():
+        unknown = sorted(set(np.atleast_1d(values[codes < 0]).tolist()))
+        raise ValueError(f"סוג סילוקין לא מוכר: {unknown}")
+    return codes
+
+
+# מערך מספרי ממשי; מערך מרוכב נשאר מרוכב (לגזירה בצעד מרוכב, ראו derivatives)
+def _numeric(values):
+    values = np.asarray(values)
+    return values.astype(np.result_type(values, np.float64), copy=False)
+
+
+# פרמטרי ההלוואה כמערכים באורך אחיד (תומך בהלוואה בודדת או באצוות של הלוואות)
+def _loan_arrays(total_loan, annual_rate, loan_term_years, repayment_type):
+    total_loan, annual_rate, loan_term_years, codes = np.broadcast_arrays(
+        _numeric(total_loan),
+        _numeric(annual_rate),
+        np.asarray(loan_term_years, dtype=np.float64),
+        repayment_codes(repayment_type))
+    return total_loan, annual_rate / 12, loan_term_years * 12, codes
+
+
+# החזר חודשי קבוע בלוח שפיצר
+def _annuity_payment(total_loan, monthly_rate, num_payments):
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + monthly_rate) ** num_payments
+        return np.where(monthly_rate == 0, total_loan / num_payments,
+                        total_loan * monthly_rate * growth / (growth - 1))
+
+
+# יתרת הלוואה אחרי month תשלומים (בתחום 0..num_payments) בסוג סילוקין אחד
+def _type_balance(code, total_loan, monthly_rate, num_payments, month):
+    if code == SPITZER:
+        payment = _annuity_payment(total_loan, monthly_rate, num_payments)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            growth = (1 + monthly_rate) ** month
+            return np.where(monthly_rate == 0, total_loan - payment * month,
+                            total_loan * growth - payment * (growth - 1) / monthly_rate)
+    if code == EQUAL_PRINCIPAL:
+        return total_loan * (1 - month / num_payments)
+    return np.where(month < num_payments, total_loan, 0.0)
+
+
+# ריבית מצטברת על התשלומים first_month+1 עד last_month (בתחום 0..num_payments) בסוג סילוקין אחד, בנוסחה סגורה;
+# paid_principal היא הקרן ששולמה באותם תשלומים
+def _type_interest(code, total_loan, monthly_rate, num_payments, first_month, last_month, paid_principal):
+    months = last_month - first_month
+    if code == SPITZER:
+        return _annuity_payment(total_loan, monthly_rate, num_payments) * months - paid_principal
+    if code == EQUAL_PRINCIPAL:
+        # סכום היתרות לפני כל תשלום: sum(m) עבור m = first_month .. last_month-1
+        month_sum = (first_month + last_month - 1) * months / 2
+        return monthly_rate * total_loan * (months - month_sum / num_payments)
+    return monthly_rate * total_loan * months
+
+
+# יתרת הלוואה אחרי month תשלומים, לפי מערכי פרמטרים מוכנים
+def _balance(total_loan, monthly_rate, num_payments, codes, month):
+    month = np.clip(month, 0, num_payments)
+    return np.choose(codes, [_type_balance(code, total_loan, monthly_rate, num_payments, month)
+                             for code in range(len(REPAYMENT_TYPES))])
+
+
+# ריבית מצטברת על התשלומים first_month+1 עד last_month (כולל), בנוסחה סגורה
+def _interest_between(total_loan, monthly_rate, num_payments, codes, first_month, last_month):
+    first_month = np.clip(first_month, 0, num_payments)
+    last_month = np.clip(last_month, first_month, num_payments)
+    paid_principal = (_balance(total_loan, monthly_rate, num_payments, codes, first_month) -
+                      _balance(total_loan, monthly_rate, num_payments, codes, last_month))
+    return np.choose(codes, [_type_interest(code, total_loan, monthly_rate, num_payments, first_month, last_month,
+                                            paid_principal)
+                             for code in range(len(REPAYMENT_TYPES))])
+
+
+# יתרת הלוואה לאחר month תשלומים, ללא בניית לוח הסילוקין
+def balance_at_month(total_loan, annual_rate, loan_term_years, repayment_type, month):
+    total_loan, monthly_rate, num_payments, codes = _loan_arrays(total_loan, annual_rate, loan_term_years,
+                                                                 repayment_type)
+    return _balance(total_loan, monthly_rate, num_payments, codes, np.asarray(month, dtype=np.float64))
+
+
+# ריבית ששולמה בתשלומים first_month+1 עד last_month (כולל), ללא בניית לוח הסילוקין
+def interest_paid_between(total_loan, annual_rate, loan_term_years, repayment_type, first_month, last_month):
+    total_loan, monthly_rate, num_payments, codes = _loan_arrays(total_loan, annual_rate, loan_term_years,
+                                                                 repayment_type)
+    return _interest_between(total_loan, monthly_rate, num_payments, codes,
+                             np.asarray(first_month, dtype=np.float64), np.asarray(last_month, dtype=np.float64))
+
+
+# ריבית ששולמה בשנת הלוואה year (1 = 12 התשלומים הראשונים), ללא בניית לוח הסילוקין
+def interest_paid_in_year(total_loan, annual_rate, loan_term_years, repayment_type, year):
+    year = np.asarray(year, dtype=np.float64)
+    return interest_paid_between(total_loan, annual_rate, loan_term_years, repayment_type, (year - 1) * 12, year * 12)
+
+
+# ריבית וקרן לכל תקופה של months_per_period חודשים (הלוואה x תקופה, num_periods תקופות), ללא בניית לוח הסילוקין.
+# היתרות בגבולות התקופות מחושבות פעם אחת לכל הלוואה, וכל סוג סילוקין מחושב רק על ההלוואות מסוגו.
+def period_payments(total_loan, annual_rate, loan_term_years, repayment_type, months_per_period, num_periods):
+    total_loan, monthly_rate, num_payments, codes = (
+        np.atleast_1d(a)[:, None] for a in _loan_arrays(total_loan, annual_rate, loan_term_years, repayment_type))
+    month = np.minimum(np.arange(num_periods + 1, dtype=np.float64) * months_per_period, num_payments)
+    first_month, last_month = month[:, :-1], month[:, 1:]
+    dtype = np.result_type(total_loan, monthly_rate)
+    interest = np.empty(first_month.shape, dtype=dtype)
+    principal = np.empty(first_month.shape, dtype=dtype)
+    for code in range(len(REPAYMENT_TYPES)):
+        rows = np.flatnonzero(codes[:, 0] == code)
+        if rows.size == 0:
+            continue
+        loan = total_loan[rows], monthly_rate[rows], num_payments[rows]
+        balance = _type_balance(code, *loan, month[rows])
+        principal[rows] = balance[:, :-1] - balance[:, 1:]
+        interest[rows] = _type_interest(code, *loan, first_month[rows], last_month[rows], principal[rows])
+    return interest, principal
+
+
+# לוח סילוקין מלא כמערכים (מפתחות זהים לעמודות הטבלה באפליקציה).
+# עבור הלוואה בודדת כל עמודה היא מערך חד-ממדי לפי חודשים; עבור אצוות הלוואות - מערך דו-ממדי
+# (הלוואה x חודש), כשהחודשים שאחרי סוף ההלוואה מאופסים.
+def loan_schedule(total_loan, annual_rate, loan_term_years, repayment_type):
+    single = np.ndim(total_loan) == np.ndim(annual_rate) == np.ndim(loan_term_years) == np.ndim(repayment_type) == 0
+    total_loan, monthly_rate, num_payments, codes = (
+        np.atleast_1d(a)[:, None] for a in _loan_arrays(total_loan, annual_rate, loan_term_years, repayment_type))
+
+    month = np.arange(int(num_payments.max()) + 1, dtype=np.float64)[None, :]
+    balance = _balance(total_loan, monthly_rate, num_payments, codes, month)
+    opening_balance, closing_balance = balance[:, :-1], balance[:, 1:]
+    month = month[:, 1:]
+    active = month <= num_payments
+
+    interest = np.where(active, opening_balance * monthly_rate, 0.0)
+    principal = np.where(active, opening_balance - closing_balance, 0.0)
+
+    schedule = {
+        'תשלום': np.where(active, month, 0).astype(np.int64),
+        'קרן לתשלום': principal,
+        'ריבית לתשלום': interest,
+        'תשלום חודשי': principal + interest,
+        'יתרת הלוואה': np.where(active, closing_balance, 0.0),
+    }
+    if single:
+        schedule = {name: column[0] for name, column in schedule.items()}
+    return schedule
+
+
+# מסלול ריבית שנתית לכל חודש (שורה x חודש) באורך months: מסלול קצר מוארך בערך האחרון שלו, וארוך נחתך
+def _monthly_path(rates, months):
+    rates = np.atleast_2d(_numeric(rates))
+    if rates.shape[1] >= months:
+        return rates[:, :months]
+    return np.concatenate([rates, np.repeat(rates[:, -1:], months - rates.shape[1], axis=1)], axis=1)
+
+
+# לוח סילוקין בריבית משתנה: ריבית פריים לכל חודש (מסלול אחד או מטריצה של מסלולים, מסלול x חודש) ועוד המרווח,
+# עם אירועי מחזור ופירעון מוקדם. refinancing הוא רצף של (חודש, מרווח חדש) - המרווח החדש חל מהתשלום שאחרי
+# החודש; prepayments הוא רצף של (חודש, סכום) - הסכום משולם יחד עם התשלום של אותו חודש (עד גובה היתרה).
+# בכל חודש ההחזר מחושב מחדש לפי היתרה, הריבית הנוכחית והתשלומים שנותרו (שפיצר: החזר קבוע על היתרה,
+# קרן שווה: היתרה חלקי התשלומים שנותרו, בוליט: ריבית בלבד וקרן מלאה בסוף), ולכן בריבית קבועה וללא אירועים
+# הלוח זהה ל-loan_schedule. החישוב עובר על החודשים פעם אחת, וקטורי על פני כל המסלולים.
+# מחזיר את עמודות loan_schedule כמטריצות (מסלול x חודש); החודשים שאחרי סוף ההלוואה מאופסים.
+def variable_rate_schedule(total_loan, prime_rates, margin, loan_term_years, repayment_type, refinancing=(),
+                           prepayments=()):
+    prime_rates = np.atleast_2d(_numeric(prime_rates))
+    total_loan, margin, num_payments, codes = (np.atleast_1d(a) for a in np.broadcast_arrays(
+        _numeric(total_loan), _numeric(margin), np.asarray(loan_term_years, dtype=np.float64) * 12,
+        repayment_codes(repayment_type)))
+    rows = np.broadcast_shapes(total_loan.shape, prime_rates.shape[:1])
+    total_loan, margin, num_payments, codes = (np.broadcast_to(a, rows) for a in (total_loan, margin, num_payments,
+                                                                                  codes))
+    months = int(num_payments.max())
+
+    margins = np.repeat(margin[:, None], months, axis=1)
+    for month, new_margin in sorted(refinancing, key=lambda event: event[0]):
+        margins[:, int(month):] = new_margin
+    monthly_rate = (_monthly_path(prime_rates, months) + margins) / 12
+    extra = np.zeros(months)
+    for month, amount in prepayments:
+        if 1 <= month <= months:
+            extra[int(month) - 1] += amount
+
+    dtype = np.result_type(total_loan, monthly_rate)
+    interest, principal, balance = (np.zeros(rows + (months,), dtype=dtype) for _ in range(3))
+    remaining_balance = total_loan.astype(dtype)
+    for m in range(months):
+        remaining = num_payments - m
+        active = remaining > 0
+        rate = monthly_rate[:, m]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            spitzer = _annuity_payment(remaining_balance, rate, remaining) - remaining_balance * rate
+            equal_principal = remaining_balance / remaining
+        bullet = np.where(remaining == 1, remaining_balance, 0.0)
+        paid = np.where(active, np.choose(codes, [spitzer, equal_principal, bullet]), 0.0)
+        paid = paid + np.where(active, np.minimum(extra[m], (remaining_balance - paid).real), 0.0)
+        interest[:, m] = np.where(active, remaining_balance * rate, 0.0)
+        principal[:, m] = paid
+        remaining_balance = remaining_balance - paid
+        balance[:, m] = remaining_balance
+
+    payment = np.arange(1, months + 1)[None, :]
+    active = payment <= num_payments[:, None]
+    schedule = {
+        'תשלום': np.where(active, payment, 0),
+        'קרן לתשלום': principal,
+        'ריבית לתשלום': interest,
+        'תשלום חודשי': principal + interest,
+        'יתרת הלוואה': np.where(active, balance, 0.0),
+    }
+    return schedule
@@ -0,0 +1,169 @@
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch, cash_flow_matrix, single_path
+from .cashflows import path_prime_rates
+from .loans import loan_schedule, variable_rate_schedule
+
+# גרסת נוסחאות המודל: יש להעלות אותה בכל שינוי שמשנה תוצאות, כדי שתוצאות שמורות (store.ScenarioStore) ייפסלו
+MODEL_VERSION = 2
+
+# משתני ניתוח הרגישות: שם התצוגה -> (שדה ב-ProjectParams, מקדם המרה מערך הטווח לערך השדה)
+SENSITIVITY_VARIABLES = {
+    'מספר וילות': ('num_villas', 1),
+    'שיעור תפוסה': ('occupancy_rate', 1 / 100),
+    'מחיר ללילה': ('price_per_night', 1),
+    'שיעור היוון': ('discount_rate', 1 / 100),
+    'שיעור מס': ('tax_rate', 1 / 100),
+    'עלות בנייה למ"ר': ('construction_cost_per_sqm', 1),
+    'ריבית פריים': ('prime_interest_rate', 1 / 100),
+    'הון עצמי': ('equity_amount', 1),
+    'תקופת הלוואה': ('loan_term', 1),
+}
+
+# טווחי ברירת המחדל לכל משתנה בניתוח הרגישות (ביחידות התצוגה)
+SENSITIVITY_RANGES = {
+    'מספר וילות': range(5, 41),
+    'שיעור תפוסה': range(20, 101),
+    'מחיר ללילה': range(2000, 8001, 100),
+    'שיעור היוון': range(1, 21),
+    'שיעור מס': range(0, 51),
+    'עלות בנייה למ"ר': range(8000, 25001, 500),
+    'ריבית פריים': range(0, 13),
+    'הון עצמי': range(0, 10000001, 500000),
+    'תקופת הלוואה': range(5, 31),
+}
+
+
+# פרמטרי הקלט בדוחות (גיליון הנתונים באקסל) ובדירוג הגמישויות: (תווית, שדה ב-ProjectParams, יחידה, מקדם תצוגה)
+INPUT_ROWS = [
+    ("מספר וילות", 'num_villas', "", 1),
+    ("גודל וילה", 'villa_size_sqm', "מ\"ר", 1),
+    ("מחיר ללילה", 'price_per_night', "₪", 1),
+    ("שיעור תפוסה", 'occupancy_rate', "%", 100),
+    ("עלות קרקע לוילה", 'land_cost_per_villa', "₪", 1),
+    ("עלות בנייה למ\"ר", 'construction_cost_per_sqm', "₪", 1),
+    ("עלות תפעול חודשית לוילה", 'monthly_operational_cost_per_villa', "₪", 1),
+    ("עלות שיווק שנתית", 'annual_marketing_cost', "₪", 1),
+    ("עלות פיתוח קרקע", 'land_development_cost', "₪", 1),
+    ("עלות פיתוח שטח ציבורי", 'public_area_development_cost', "₪", 1),
+    ("עלות מבנה קבלה", 'reception_and_logistics_cost', "₪", 1),
+    ("עלות אולם אירועים", 'small_event_hall_cost', "₪", 1),
+    ("עלות תכנון ויועצים", 'planning_and_consultants_cost', "₪", 1),
+    ("עלות ניקיון ללילה", 'cleaning_cost_per_night', "₪", 1),
+    ("עלות אביזרים ללילה", 'accessories_cost_per_night', "₪", 1),
+    ("עלות ביטוח שנתית לוילה", 'annual_insurance_cost_per_villa', "₪", 1),
+    ("שיעור אינפלציה שנתי", 'annual_inflation_rate', "%", 100),
+    ("שיעור היוון", 'discount_rate', "%", 100),
+    ("ריבית פריים", 'prime_interest_rate', "%", 100),
+    ("ריבית נוספת מעל הפריים", 'additional_interest_rate', "%", 100),
+    ("הון עצמי", 'equity_amount', "₪", 1),
+    ("תקופת הלוואה", 'loan_term', "שנים", 1),
+    ("סוג סילוקין", 'repayment_type', "", 1),
+    ("שיעור מס", 'tax_rate', "%", 100),
+    ("עיתוי סובסידיה", 'subsidy_timing', "", 1),
+    ("מודל הכנסות", 'revenue_model', "", 1),
+    ("מכפיל מחיר בסוף שבוע", 'weekend_price_multiplier', "", 1),
+    ("מכפיל תפוסה בסוף שבוע", 'weekend_occupancy_multiplier', "", 1),
+    ("מכפיל מחיר בחגים", 'holiday_price_multiplier', "", 1),
+    ("מכפיל תפוסה בחגים", 'holiday_occupancy_multiplier', "", 1),
+    ("מכפיל מחיר בעונת שיא", 'peak_season_price_multiplier', "", 1),
+    ("מכפיל תפוסה בעונת שיא", 'peak_season_occupancy_multiplier', "", 1),
+]
+
+# המדדים בדוחות (גיליון החישובים באקסל וטבלת המדדים ב-PDF): (תווית, מפתח בתוצאות calculate_financial_metrics, יחידה)
+METRIC_ROWS = [
+    ("רווח גולמי שנתי", 'Gross Annual Profit', "₪"),
+    ("רווח תפעולי שנתי", 'Operating Annual Profit', "₪"),
+    ("רווח נקי שנתי (לפני סובסידיה)", 'Net Annual Profit (Before Subsidy)', "₪"),
+    ("רווח נקי שנתי (עם סובסידיה מינימלית)", 'Net Annual Profit with Min Subsidy', "₪"),
+    ("רווח נקי שנתי (עם סובסידיה מקסימלית)", 'Net Annual Profit with Max Subsidy', "₪"),
+    ("ROI מינימלי", 'ROI Min', "%"),
+    ("ROI מקסימלי", 'ROI Max', "%"),
+    ("IRR מינימלי", 'IRR Min', "%"),
+    ("IRR מקסימלי", 'IRR Max', "%"),
+    ("NPV מינימלי", 'NPV Min', "₪"),
+    ("NPV מקסימלי", 'NPV Max', "₪"),
+    ("תקופת החזר מינימלית", 'Payback Period Min', "שנים"),
+    ("תקופת החזר מקסימלית", 'Payback Period Max', "שנים"),
+    ("עלות הקמה כוללת", 'Total Construction Cost', "₪"),
+    ("עלות תפעול שנתית", 'Annual Operational Cost', "₪"),
+    ("עלות מימון שנתית", 'Annual Financing Cost', "₪"),
+]
+
+
+# פונקציה לחישוב החזר חודשי לפי סוג סילוקין (לוח סילוקין מעוגל לתצוגה, עמודה לכל שדה).
+# עם rate_path הלוח הוא בריבית משתנה לפי מסלול הריבית (ראו batch.single_path).
+def calculate_loan_repayment(params, rate_path=None):
+    if rate_path is None:
+        schedule = loan_schedule(*params.loan_inputs())
+    else:
+        total_loan, _, loan_term, repayment_type = params.loan_inputs()
+        rate_path = single_path(rate_path)
+        prime = path_prime_rates(rate_path, params.prime_interest_rate)
+        schedule = variable_rate_schedule(total_loan, prime, params.additional_interest_rate, loan_term,
+                                          repayment_type, rate_path['Refinancing'], rate_path['Prepayments'])
+        schedule = {name: column[0] for name, column in schedule.items()}
+    return {name: np.round(column) for name, column in schedule.items()}
+
+
+# פונקציה לחישוב תוצאות פיננסיות לפרויקט (תרחיש יחיד במנוע התזרים הווקטורי).
+# עם rate_path עלות המימון נגזרת ממסלול הריבית (ראו batch.single_path).
+def calculate_financial_metrics(params, rate_path=None):
+    metrics = calculate_financial_metrics_batch(params.as_dict(), rate_path=single_path(rate_path))
+    return {name: float(values[0]) for name, values in metrics.items()}
+
+
+# תזרים מזומנים מהוון לכל שנה בתקופת ההלוואה (ללא ההשקעה הראשונית וערך השארית), עם סובסידיה מינימלית ומקסימלית
+def discounted_cash_flows(params):
+    flows = cash_flow_matrix(params.as_dict())
+    years = flows['Period']
+    discount = (1 + params.discount_rate) ** years
+    net = flows['Net Profit Before Subsidy'][0]
+    return {
+        'Year': years,
+        'Discounted Cash Flow (Min Subsidy)': (net + flows['Subsidy Min'][0]) / discount,
+        'Discounted Cash Flow (Max Subsidy)': (net + flows['Subsidy Max'][0]) / discount,
+    }
+
+
+# טבלת תזרים המזומנים השנתי של הפרויקט לתצוגה (עמודה לכל רכיב, שורה לכל שנה בתקופת ההלוואה)
+def cash_flow_table(params, rate_path=None):
+    flows = cash_flow_matrix(params.as_dict(), rate_path=single_path(rate_path))
+    net = flows['Net Profit Before Subsidy'][0]
+    return {
+        'שנה': flows['Period'],
+        'הכנסות': np.round(flows['Revenue'][0]),
+        'עלויות תפעול': np.round(flows['Operating Cost'][0]),
+        'ריבית': np.round(flows['Interest'][0]),
+        'החזר קרן': np.round(flows['Principal'][0]),
+        'מס': np.round(flows['Tax'][0]),
+        'רווח נקי (לפני סובסידיה)': np.round(net),
+        'רווח נקי (עם סובסידיה מינימלית)': np.round(net + flows['Subsidy Min'][0]),
+        'רווח נקי (עם סובסידיה מקסימלית)': np.round(net + flows['Subsidy Max'][0]),
+    }
+
+
+# פונקציה לניתוח רגישות: חישוב המדדים לכל ערך בטווח, על עותק של הפרמטרים שבו רק המשתנה הנבדק שונה.
+# הפונקציה אינה משנה מצב גלובלי ולכן בטוחה להרצה במקביל ולשמירה במטמון.
+# עם rate_path עלות המימון בכל נקודה נגזרת ממסלול הריבית (ראו batch.single_path).
+def sensitivity_analysis(params, variable_name, variable_range=None, rate_path=None):
+    field, scale = SENSITIVITY_VARIABLES[variable_name]
+    if variable_range is None:
+        variable_range = SENSITIVITY_RANGES[variable_name]
+
+    values = list(variable_range)
+    scenarios = params.as_dict()
+    scenarios[field] = np.asarray(values, dtype=np.float64) * scale
+    metrics = calculate_financial_metrics_batch(scenarios, rate_path=single_path(rate_path))
+
+    results = []
+    for i, value in enumerate(values):
+        results.append({
+            'ערך': value,
+            'ROI': metrics['ROI Min'][i],
+            'NPV': metrics['NPV Min'][i],
+            'IRR': metrics['IRR Min'][i],
+            'תקופת החזר': metrics['Payback Period Max'][i]
+        })
+
+    return results
@@ -0,0 +1,252 @@
+import numpy as np
+
+from .batch import path_columns, scenario_columns, single_path
+from .cashflows import metrics_from_cash_flows, project_cash_flows
+from .parallel import map_seeded, shard_seeds
+
+# גבולות טבעיים לשדות שמוגרלים - ערך מוגרל מחוץ לתחום נחתך לקצה
+_FIELD_BOUNDS = {
+    'occupancy_rate': (0.0, 1.0),
+}
+
+# אחוזונים המדווחים בסיכום הסימולציה
+PERCENTILES = (10, 50, 90)
+
+
+# אומדן אחוזונים בזרימה: היסטוגרמה בגודל קבוע שהטווח שלה נקבע מהמקטע הראשון (עם מרווח),
+# וערכים מחוץ לטווח נספרים בתאי הקצה. ערכים שליליים ואפסים נספרים גם במדויק, כדי שהסתברויות סביב 0
+# (NPV שלילי, חוסר כיסוי) וריכוז מסה באפס לא יושפעו מרוחב התאים. הזיכרון קבוע ואינו תלוי במספר ההגרלות.
+class StreamingHistogram:
+    def __init__(self, bins=4096, padding=0.5, edges=None):
+        self.bins = bins if edges is None else len(edges) - 1
+        self.padding = padding
+        self.edges = edges
+        self.counts = np.zeros(self.bins + 2, dtype=np.int64)
+        self.count = 0
+        self.nan_count = 0
+        self.negative = 0
+        self.zeros = 0
+        self.total = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = values[np.isfinite(values)]
+        self.nan_count += values.size - finite.size
+        if finite.size == 0:
+            return
+        nonzero = finite[finite != 0]
+        if self.edges is None and nonzero.size:
+            low, high = nonzero.min(), nonzero.max()
+            margin = (high - low) * self.padding or abs(low) * self.padding or 1.0
+            self.edges = np.linspace(low - margin, high + margin, self.bins + 1)
+        if nonzero.size:
+            index = np.searchsorted(self.edges, nonzero, side='right')
+            self.counts += np.bincount(index, minlength=self.bins + 2)
+        self.count += finite.size
+        self.negative += int((finite < 0).sum())
+        self.zeros += finite.size - nonzero.size
+        self.total += finite.sum()
+        self.minimum = min(self.minimum, finite.min())
+        self.maximum = max(self.maximum, finite.max())
+
+    def merge(self, other):
+        if self.edges is None:
+            self.edges = other.edges
+            self.bins = other.bins
+            self.counts = np.zeros_like(other.counts)
+        if other.edges is None or np.array_equal(self.edges, other.edges):
+            self.counts += other.counts
+        else:
+            # טווחים שונים: כל תא של ההיסטוגרמה השנייה משויך לתא שמכיל את מרכזו
+            centers = (other.edges[:-1] + other.edges[1:]) / 2
+            np.add.at(self.counts, np.searchsorted(self.edges, centers, side='right'), other.counts[1:-1])
+            self.counts[0] += other.counts[0]
+            self.counts[-1] += other.counts[-1]
+        self.count += other.count
+        self.nan_count += other.nan_count
+        self.negative += other.negative
+        self.zeros += other.zeros
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    # האחוזון לפי מספר ערכים מצטבר target, מתוך ההיסטוגרמה בלבד (ללא האפסים)
+    def _binned_quantile(self, target):
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target, side='left'))
+        if index == 0:
+            return self.minimum
+        if index >= self.bins + 1:
+            return self.maximum
+        before = cumulative[index - 1]
+        fraction = (target - before) / max(self.counts[index], 1)
+        low, high = self.edges[index - 1], self.edges[index]
+        return float(np.clip(low + fraction * (high - low), self.minimum, self.maximum))
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        target = q * self.count
+        if target <= self.negative:
+            return self._binned_quantile(target)
+        if target <= self.negative + self.zeros:
+            return 0.0
+        return self._binned_quantile(target - self.zeros)
+
+    def fraction_below(self, threshold):
+        if self.count == 0:
+            return np.nan
+        if threshold == 0:
+            return self.negative / self.count
+        index = np.searchsorted(self.edges, threshold, side='right')
+        return float((self.counts[:index].sum() + self.zeros * (threshold > 0)) / self.count)
+
+    def fraction_above(self, threshold):
+        if threshold == 0:
+            return (self.count - self.negative - self.zeros) / self.count if self.count else np.nan
+        return 1.0 - self.fraction_below(threshold)
+
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def summary(self):
+        result = {f'P{p}': self.quantile(p / 100) for p in PERCENTILES}
+        result['mean'] = self.mean()
+        result['min'] = self.minimum if self.count else np.nan
+        result['max'] = self.maximum if self.count else np.nan
+        result['undefined'] = self.nan_count
+        return result
+
+
+# המרת משתנים נורמליים סטנדרטיים לערכים לפי התפלגות השדה.
+# התפלגויות נתמכות: ('normal', mean, sd), ('uniform', low, high), ('triangular', low, mode, high),
+# ('lognormal', median, sigma)
+def _transform(distribution, z):
+    kind, *args = distribution
+    if kind == 'normal':
+        mean, sd = args
+        return mean + sd * z
+    if kind == 'lognormal':
+        median, sigma = args
+        return median * np.exp(sigma * z)
+    from scipy.special import ndtr
+
+    u = ndtr(z)
+    if kind == 'uniform':
+        low, high = args
+        return low + (high - low) * u
+    if kind == 'triangular':
+        low, mode, high = args
+        split = (mode - low) / (high - low)
+        return np.where(u < split,
+                        low + np.sqrt(u * (high - low) * (mode - low)),
+                        high - np.sqrt((1 - u) * (high - low) * (high - mode)))
+    raise ValueError(f'התפלגות לא מוכרת: {kind}')
+
+
+# מטריצת מתאמים מלאה מתוך מילון מתאמים בין זוגות שדות ({(שדה, שדה): מתאם})
+def correlation_matrix(fields, correlations=None):
+    matrix = np.eye(len(fields))
+    for (first, second), rho in (correlations or {}).items():
+        i, j = fields.index(first), fields.index(second)
+        matrix[i, j] = matrix[j, i] = rho
+    return matrix
+
+
+# הגרלת מקטע של תרחישים: משתנים נורמליים מתואמים (קופולה גאוסית) שמומרים להתפלגות של כל שדה
+def draw_scenarios(params, distributions, size, rng, correlations=None):
+    fields = list(distributions)
+    cholesky = np.linalg.cholesky(correlation_matrix(fields, correlations))
+    z = rng.standard_normal((size, len(fields))) @ cholesky.T
+
+    scenarios = params.as_dict()
+    for k, field in enumerate(fields):
+        low, high = _FIELD_BOUNDS.get(field, (0.0, np.inf))
+        scenarios[field] = np.clip(_transform(distributions[field], z[:, k]), low, high)
+    return scenarios
+
+
+# חוסר כיסוי לשירות החוב בשנה הראשונה: קרן וריבית שמעבר לרווח התפעולי (0 כשהרווח מכסה את ההחזר).
+# הריבית והקרן נלקחות ממטריצות התזרים (שנתיות), כך שהן לפי מסלול הריבית כשהתזרים חושב עם rate_path.
+def loan_coverage_shortfall(flows, metrics):
+    debt_service = flows['Interest'][:, 0] + flows['Principal'][:, 0]
+    return np.maximum(debt_service - metrics['Operating Annual Profit'], 0.0)
+
+
+# מצברי הסימולציה: היסטוגרמה לכל מדד. עם template, ההיסטוגרמות משתמשות באותם טווחים כמו ב-template
+# (כך שמצברים ממקטעים שונים ניתנים למיזוג מדויק)
+def new_accumulators(template=None):
+    names = ('NPV', 'IRR', 'Loan Coverage Shortfall')
+    return {name: StreamingHistogram(edges=template[name].edges if template else None) for name in names}
+
+
+# מיזוג מצברים של מקטעים שונים לתוך accumulators
+def merge_accumulators(accumulators, others):
+    for other in others:
+        for name, histogram in accumulators.items():
+            histogram.merge(other[name])
+    return accumulators
+
+
+# הרצת מקטע אחד של הסימולציה ועדכון המצברים (עם rate_path - מסלול ריבית יחיד, ראו batch.single_path)
+def simulate_chunk(params, distributions, size, rng, accumulators, correlations=None, rate_path=None):
+    columns = path_columns(scenario_columns(draw_scenarios(params, distributions, size, rng, correlations)),
+                           rate_path)
+    flows = project_cash_flows(columns, 1, rate_path)
+    metrics = metrics_from_cash_flows(columns, flows, 1)
+    accumulators['NPV'].update(metrics['NPV Min'])
+    accumulators['IRR'].update(metrics['IRR Min'])
+    accumulators['Loan Coverage Shortfall'].update(loan_coverage_shortfall(flows, metrics))
+
+
+# מקטע סימולציה עצמאי (להרצה בתהליך עבודה): מחזיר מצברים חדשים בטווחים של template
+def _simulate_shard(params, distributions, correlations, size, chunk_size, template, rate_path, rng):
+    accumulators = new_accumulators(template)
+    for start in range(0, size, chunk_size):
+        simulate_chunk(params, distributions, min(chunk_size, size - start), rng, accumulators, correlations,
+                       rate_path)
+    return accumulators
+
+
+# סיכום המצברים: P10/P50/P90 לכל מדד, הסתברות ל-NPV שלילי והסתברות לחוסר כיסוי להלוואה
+def summarize(accumulators):
+    shortfall = accumulators['Loan Coverage Shortfall']
+    return {
+        'draws': accumulators['NPV'].count + accumulators['NPV'].nan_count,
+        'NPV': accumulators['NPV'].summary(),
+        'IRR': accumulators['IRR'].summary(),
+        'Loan Coverage Shortfall': shortfall.summary(),
+        'Probability NPV < 0': accumulators['NPV'].fraction_below(0.0),
+        'Probability of Shortfall': shortfall.fraction_above(0.0),
+    }
+
+
+# סימולציית מונטה קרלו על המודל: num_draws הגרלות במקטעים של chunk_size, כך שרק מקטע אחד של
+# תרחישים ותזרימים מוחזק בזיכרון בכל תהליך. distributions הוא מילון {שדה ב-ProjectParams: התפלגות},
+# correlations מילון {(שדה, שדה): מתאם}. לכל מקטע זרע משלו שנגזר מ-seed, ולכן seed קבוע נותן תוצאות
+# זהות בכל הרצה ובכל מספר תהליכים (workers, ראו parallel.resolve_workers).
+# המקטע הראשון רץ תמיד בתהליך הנוכחי וקובע את טווחי ההיסטוגרמות; שאר המקטעים מתחלקים בין התהליכים.
+# עם rate_path עלות המימון והחזר החוב בכל הגרלה נגזרים ממסלול הריבית (ראו batch.single_path).
+# ValueError אם num_draws או chunk_size קטנים מ-1.
+def run_simulation(params, distributions, num_draws=100000, seed=None, correlations=None, chunk_size=50000,
+                   workers=None, return_accumulators=False, rate_path=None):
+    if num_draws < 1:
+        raise ValueError(f"מספר ההגרלות חייב להיות לפחות 1, התקבל {num_draws}")
+    if chunk_size < 1:
+        raise ValueError(f"גודל המקטע חייב להיות לפחות 1, התקבל {chunk_size}")
+    rate_path = single_path(rate_path)
+    sizes = [min(chunk_size, num_draws - start) for start in range(0, num_draws, chunk_size)]
+    seeds = shard_seeds(seed, len(sizes))
+
+    accumulators = _simulate_shard(params, distributions, correlations, sizes[0], chunk_size, None, rate_path,
+                                   np.random.default_rng(seeds[0]))
+    shard_args = [(params, distributions, correlations, size, chunk_size, accumulators, rate_path)
+                  for size in sizes[1:]]
+    merge_accumulators(accumulators, map_seeded(_simulate_shard, shard_args, seeds[1:], workers))
+
+    summary = summarize(accumulators)
+    if return_accumulators:
+        return summary, accumulators
+    return summary
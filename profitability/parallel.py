@@ -0,0 +1,148 @@
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch, scenario_columns, single_path
+from .loans import loan_schedule, repayment_codes
+
+# משתנה סביבה לבחירת מספר התהליכים כשלא הועבר במפורש (1 = חישוב סדרתי, 0 או auto = כל הליבות)
+WORKERS_ENV_VAR = 'PROFITABILITY_WORKERS'
+
+# גודל מקטע מינימלי לתהליך - מתחת לזה עלות התזמון גבוהה מהחיסכון
+MIN_CHUNK_SIZE = 5000
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+# מספר התהליכים בפועל: ערך מפורש, או ממשתנה הסביבה, או 1 (סדרתי) כברירת מחדל
+def resolve_workers(workers=None):
+    if workers is None:
+        workers = os.environ.get(WORKERS_ENV_VAR, '1')
+    if workers in ('auto', '0', 0):
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+# מאגר תהליכים משותף לכל קריאה עם אותו מספר תהליכים (נוצר פעם אחת ונסגר ביציאה מהתוכנית).
+# התהליכים נוצרים ב-spawn כדי שיהיה בטוח להשתמש במאגר גם מתוך שרת מרובה תהליכונים כמו Streamlit.
+def get_executor(workers):
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executors[workers] = executor
+        return executor
+
+
+@atexit.register
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+# חלוקת n שורות למקטעים רציפים [start, stop)
+def shard_bounds(n, workers, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE, math.ceil(n / (workers * 4)))
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+
+# איחוד תוצאות המקטעים לפי הסדר; עמודות דו-ממדיות באורכים שונים (למשל לוחות סילוקין) מרופדות באפסים
+def merge_results(results):
+    merged = {}
+    for key in results[0]:
+        parts = [result[key] for result in results]
+        if parts[0].ndim == 2:
+            width = max(part.shape[1] for part in parts)
+            parts = [np.pad(part, ((0, 0), (0, width - part.shape[1]))) for part in parts]
+        merged[key] = np.concatenate(parts)
+    return merged
+
+
+# הרצת מקטע בתהליך עבודה: חיבור לזיכרון המשותף, הפעלת הפונקציה על השורות [start, stop) והחזרת התוצאה
+def _run_shard(function, shm_name, shape, names, start, stop):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        columns = {name: table[start:stop, j].copy() for j, name in enumerate(names)}
+    finally:
+        shm.close()
+    return function(columns)
+
+
+# הפעלת function (פונקציה ברמת מודול שמקבלת מילון עמודות ומחזירה מילון מערכים) על טבלת עמודות מספריות,
+# בחלוקה למקטעים על פני מאגר תהליכים. הטבלה מועתקת פעם אחת לזיכרון משותף, כך שהיא לא עוברת pickle
+# בכל משימה, והתוצאות מאוחדות לפי סדר השורות. עם תהליך אחד או טבלה קטנה - חישוב סדרתי רגיל.
+def map_columns(function, columns, workers=None, chunk_size=None):
+    workers = resolve_workers(workers)
+    names = list(columns)
+    n = len(columns[names[0]])
+    bounds = shard_bounds(n, workers, chunk_size)
+    if workers == 1 or len(bounds) == 1:
+        return function(columns)
+
+    table = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in names])
+    shm = shared_memory.SharedMemory(create=True, size=table.nbytes)
+    try:
+        np.ndarray(table.shape, dtype=np.float64, buffer=shm.buf)[:] = table
+        executor = get_executor(workers)
+        futures = [executor.submit(_run_shard, function, shm.name, table.shape, names, start, stop)
+                   for start, stop in bounds]
+        return merge_results([future.result() for future in futures])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# חישוב המדדים לטבלת תרחישים על פני מאגר תהליכים (אותן תוצאות כמו calculate_financial_metrics_batch).
+# rate_path הוא מסלול ריבית יחיד שמוחל על כל התרחישים (ראו batch.single_path).
+def calculate_financial_metrics_parallel(scenarios, workers=None, chunk_size=None, rate_path=None):
+    function = calculate_financial_metrics_batch
+    if rate_path is not None:
+        function = partial(calculate_financial_metrics_batch, rate_path=single_path(rate_path))
+    return map_columns(function, scenario_columns(scenarios), workers, chunk_size)
+
+
+def _loan_schedule_columns(columns):
+    return loan_schedule(columns['total_loan'], columns['annual_rate'], columns['loan_term_years'],
+                         columns['repayment_type'])
+
+
+# לוחות סילוקין לאצוות הלוואות על פני מאגר תהליכים (אותן תוצאות כמו loan_schedule עבור אצווה)
+def loan_schedule_parallel(total_loan, annual_rate, loan_term_years, repayment_type, workers=None, chunk_size=None):
+    arrays = np.broadcast_arrays(np.atleast_1d(np.asarray(total_loan, dtype=np.float64)),
+                                 np.asarray(annual_rate, dtype=np.float64),
+                                 np.asarray(loan_term_years, dtype=np.float64),
+                                 repayment_codes(repayment_type))
+    columns = dict(zip(('total_loan', 'annual_rate', 'loan_term_years', 'repayment_type'), arrays))
+    return map_columns(_loan_schedule_columns, columns, workers, chunk_size)
+
+
+# זרע אקראי נפרד לכל מקטע, נגזר מ-seed ב-SeedSequence. הזרעים תלויים רק במספר המקטע,
+# ולכן תוצאות הרצה עם seed קבוע זהות בכל מספר תהליכים.
+def shard_seeds(seed, count):
+    return np.random.SeedSequence(seed).spawn(count)
+
+
+def _run_seeded(function, args, shard_seed):
+    return function(*args, np.random.default_rng(shard_seed))
+
+
+# הרצת function(*args, rng) לכל מקטע, עם מחולל אקראי מהזרע של המקטע; מחזיר את התוצאות לפי הסדר
+def map_seeded(function, shard_args, seeds, workers=None):
+    workers = resolve_workers(workers)
+    if workers == 1 or len(shard_args) <= 1:
+        return [_run_seeded(function, args, shard_seed) for args, shard_seed in zip(shard_args, seeds)]
+    executor = get_executor(workers)
+    futures = [executor.submit(_run_seeded, function, args, shard_seed) for args, shard_seed in zip(shard_args, seeds)]
+    return [future.result() for future in futures]
@@ -0,0 +1,67 @@
+from dataclasses import asdict, dataclass, replace
+
+
+# כל פרמטרי הקלט של פרויקט וילות אחד. המחלקה קפואה ולכן ניתנת לגיבוב (hash) ומשמשת כמפתח למטמון.
+# ערכי ברירת המחדל זהים לערכי ברירת המחדל של הקלטים ב-app.py; שיעורים נשמרים כשברים (0.4 = 40%).
+@dataclass(frozen=True, slots=True)
+class ProjectParams:
+    num_villas: int = 10
+    villa_size_sqm: float = 200
+    price_per_night: float = 3500
+    occupancy_rate: float = 0.40
+    land_cost_per_villa: float = 500000
+    construction_cost_per_sqm: float = 15000
+    monthly_operational_cost_per_villa: float = 4000
+    annual_marketing_cost: float = 600000
+    land_development_cost: float = 200000
+    public_area_development_cost: float = 1000000
+    reception_and_logistics_cost: float = 700000
+    small_event_hall_cost: float = 700000
+    planning_and_consultants_cost: float = 150000
+    cleaning_cost_per_night: float = 200
+    accessories_cost_per_night: float = 50
+    annual_insurance_cost_per_villa: float = 5000
+    annual_inflation_rate: float = 0.02
+    discount_rate: float = 0.08
+    prime_interest_rate: float = 0.035
+    additional_interest_rate: float = 0.0
+    equity_amount: float = 1000000
+    loan_term: int = 15
+    repayment_type: str = 'שפיצר'
+    tax_rate: float = 0.075
+    subsidy_min: float = 0.20
+    subsidy_max: float = 0.30
+    subsidy_timing: str = 'פריסה שנתית'
+    revenue_model: str = 'שנתי אחיד'
+    weekend_price_multiplier: float = 1.3
+    weekend_occupancy_multiplier: float = 1.6
+    holiday_price_multiplier: float = 1.6
+    holiday_occupancy_multiplier: float = 2.0
+    peak_season_price_multiplier: float = 1.4
+    peak_season_occupancy_multiplier: float = 1.5
+
+    # עלות הקמה כוללת (בנייה, קרקע ופיתוח)
+    @property
+    def total_construction_cost(self):
+        return (
+                self.construction_cost_per_sqm * self.villa_size_sqm * self.num_villas +
+                self.land_cost_per_villa * self.num_villas +
+                self.land_development_cost +
+                self.public_area_development_cost +
+                self.reception_and_logistics_cost +
+                self.small_event_hall_cost +
+                self.planning_and_consultants_cost
+        )
+
+    # הפרמטרים שקובעים את לוח הסילוקין: סכום הלוואה, ריבית שנתית, תקופה וסוג סילוקין
+    def loan_inputs(self):
+        return (self.total_construction_cost - self.equity_amount,
+                self.prime_interest_rate + self.additional_interest_rate,
+                self.loan_term,
+                self.repayment_type)
+
+    def replace(self, **changes):
+        return replace(self, **changes)
+
+    def as_dict(self):
+        return asdict(self)
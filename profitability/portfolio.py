@@ -0,0 +1,99 @@
+import numpy as np
+
+from .batch import path_columns, scenario_columns, single_path
+from .cashflows import cash_flow_streams, metrics_from_cash_flows, project_cash_flows
+from .xirr import xirr_batch
+
+
+# טבלת פרויקטים (רשימת ProjectParams, DataFrame או מילון של מערכים) כעמודות תרחישים מנורמלות
+def project_columns(projects):
+    if isinstance(projects, (list, tuple)):
+        rows = [params.as_dict() for params in projects]
+        projects = {field: [row[field] for row in rows] for field in rows[0]}
+    return scenario_columns(projects)
+
+
+# סכום ערכים (פרויקט x עמודה) לפי אינדקס תקופה משותף, בלי לולאה על פרויקטים
+def _on_timeline(values, index, length):
+    return np.bincount(index.ravel(), weights=np.broadcast_to(values, index.shape).ravel(), minlength=length)
+
+
+# חישוב תיק פרויקטים בציר זמן משותף: תזרימי כל הפרויקטים מחושבים במעבר וקטורי אחד (פרויקט x תקופה)
+# ומצטברים לפי תקופה. start_offsets הוא מספר התקופות מתחילת התיק עד ההשקעה בכל פרויקט (ברירת מחדל 0),
+# ו-periods_per_year הוא 12 לציר חודשי או 1 לשנתי. NPV מאוחד מהוון בשיעור ההיוון של כל פרויקט,
+# או בשיעור אחד לכל התיק אם הועבר discount_rate. עם rate_path המימון של כל הפרויקטים נגזר ממסלול הריבית
+# (ראו batch.single_path).
+# מחזיר (סיכום התיק, ציר הזמן המאוחד, מדדים לכל פרויקט מאותו תזרים, כמו calculate_financial_metrics_batch).
+def evaluate_portfolio(projects, start_offsets=None, periods_per_year=12, discount_rate=None, rate_path=None):
+    rate_path = single_path(rate_path)
+    columns = path_columns(project_columns(projects), rate_path)
+    n = columns['loan_term'].size
+    offsets = np.zeros(n, dtype=np.int64) if start_offsets is None else np.asarray(start_offsets, dtype=np.int64)
+    offsets = np.broadcast_to(offsets, (n,))[:, None]
+
+    flows = project_cash_flows(columns, periods_per_year, rate_path)
+    streams = cash_flow_streams(columns, flows, periods_per_year)
+
+    # אינדקס תקופה משותף: ההשקעה בתקופת ההתחלה, כל תקופה אחריה, וערך השארית שנה אחרי סוף ההלוואה
+    stream_index = offsets + np.rint(streams['Times'] * periods_per_year).astype(np.int64)
+    flow_index = offsets + flows['Period'][None, :]
+    length = int(stream_index.max()) + 1
+    period = np.arange(length)
+
+    # יתרת ההלוואה בסוף כל תקופה משותפת: ההלוואה בניכוי הקרן שנפרעה עד אותה תקופה לפי התזרים (כך שמסלול ריבית
+    # ופירעון מוקדם נכללים), מלוא ההלוואה בתקופת ההשקעה ו-0 לפניה ואחרי הפירעון
+    total_loan = flows['Total Construction Cost'] - columns['equity_amount']
+    repaid = np.concatenate([np.zeros((n, 1)), np.cumsum(flows['Principal'], axis=1)], axis=1)
+    elapsed = period[None, :] - offsets
+    balance = total_loan[:, None] - np.take_along_axis(repaid, np.clip(elapsed, 0, repaid.shape[1] - 1), axis=1)
+    outstanding_debt = np.where(elapsed >= 0, balance, 0.0).sum(axis=0)
+
+    investment = np.zeros(length)
+    np.add.at(investment, offsets[:, 0], -streams['Cash Flow Min'][:, 0])
+    timeline = {
+        'Period': period,
+        'Year': period / periods_per_year,
+        'Investment': investment,
+        'Revenue': _on_timeline(flows['Revenue'], flow_index, length),
+        'Operating Cost': _on_timeline(flows['Operating Cost'], flow_index, length),
+        'Operating Profit': _on_timeline(flows['Operating Profit'], flow_index, length),
+        'Interest': _on_timeline(flows['Interest'], flow_index, length),
+        'Principal': _on_timeline(flows['Principal'], flow_index, length),
+        'Tax': _on_timeline(flows['Tax'], flow_index, length),
+        'Subsidy': _on_timeline(flows['Subsidy Min'], flow_index, length),
+        'Net Cash Flow Min': _on_timeline(streams['Cash Flow Min'], stream_index, length),
+        'Net Cash Flow Max': _on_timeline(streams['Cash Flow Max'], stream_index, length),
+        'Outstanding Debt': outstanding_debt,
+    }
+    timeline['Debt Service'] = timeline['Interest'] + timeline['Principal']
+
+    # NPV מאוחד: כל פרויקט מהוון לתחילת התיק
+    rates = columns['discount_rate'] if discount_rate is None else np.full(n, discount_rate, dtype=np.float64)
+    discount = (1 + rates[:, None]) ** -(stream_index / periods_per_year)
+    npv_min = float((streams['Cash Flow Min'] * discount).sum())
+    npv_max = float((streams['Cash Flow Max'] * discount).sum())
+
+    times = timeline['Year'][None, :]
+    irr = xirr_batch(np.stack([timeline['Net Cash Flow Min'], timeline['Net Cash Flow Max']]), times) * 100
+
+    # כיסוי שירות החוב (DSCR) לפי שנה בציר המשותף: רווח תפעולי חלקי ריבית וקרן, בשנים שיש בהן שירות חוב
+    year = np.maximum(period - 1, 0) // periods_per_year
+    annual_operating_profit = np.bincount(year, weights=timeline['Operating Profit'])
+    annual_debt_service = np.bincount(year, weights=timeline['Debt Service'])
+    serviced = annual_debt_service > 0
+    dscr = annual_operating_profit[serviced] / annual_debt_service[serviced]
+
+    peak = int(outstanding_debt.argmax())
+    summary = {
+        'Projects': n,
+        'Total Construction Cost': float(flows['Total Construction Cost'].sum()),
+        'NPV Min': npv_min,
+        'NPV Max': npv_max,
+        'IRR Min': float(irr[0]),
+        'IRR Max': float(irr[1]),
+        'Peak Debt': float(outstanding_debt[peak]),
+        'Peak Debt Year': peak / periods_per_year,
+        'Min DSCR': float(dscr.min()) if dscr.size else np.nan,
+        'Average DSCR': float(dscr.mean()) if dscr.size else np.nan,
+    }
+    return summary, timeline, metrics_from_cash_flows(columns, flows, periods_per_year)
@@ -0,0 +1,91 @@
+import numpy as np
+
+from .batch import path_columns, scenario_columns
+from .cashflows import annual_totals, metrics_from_cash_flows, project_cash_flows
+
+# צעד השינוי של ריבית בנק ישראל (והפריים שנגזר ממנה): 0.25%
+RATE_STEP = 0.0025
+
+
+# מסלול ריבית למנוע התזרים (ראו cashflows.financing_flows): ריבית פריים שנתית לכל חודש בהלוואה - מסלול אחד
+# (חודש) או מטריצה של מסלולים (מסלול x חודש) - עם אירועי מחזור (חודש, מרווח חדש מעל הפריים) ופירעון מוקדם
+# (חודש, סכום). מסלול קצר מתקופת ההלוואה מוארך בערך האחרון שלו.
+# base_rate היא ריבית הפריים שלפיה המסלול נקבע (ברירת מחדל: החודש הראשון במסלול): תרחיש שריבית הפריים שלו
+# שונה ממנה מקבל את המסלול מוזז במקביל בהפרש.
+def rate_path(prime_rates, refinancing=(), prepayments=(), base_rate=None):
+    prime_rates = np.asarray(prime_rates, dtype=np.float64)
+    return {
+        'Prime': prime_rates,
+        'Base': float(np.atleast_2d(prime_rates)[0, 0] if base_rate is None else base_rate),
+        'Refinancing': tuple((int(month), float(margin)) for month, margin in refinancing),
+        'Prepayments': tuple((int(month), float(amount)) for month, amount in prepayments),
+    }
+
+
+# עקום ריבית צפוי (forward curve) לכל חודש: points הוא רצף של (חודש, ריבית שנתית), ובין הנקודות
+# הריבית משתנה לינארית; לפני הנקודה הראשונה ואחרי האחרונה היא קבועה
+def forward_curve(points, months):
+    points = sorted(points)
+    return np.interp(np.arange(months), [month for month, _ in points], [rate for _, rate in points])
+
+
+# מסלולים סטוכסטיים של ריבית הפריים (מסלול x חודש) במודל ואסיצ'ק: חזרה לממוצע long_term_rate בקצב
+# mean_reversion לשנה עם תנודתיות שנתית volatility. shock הוא זעזוע מקביל שמוסף לכל המסלול (למשל 0.02
+# לתרחיש קיצון של עלייה ב-2%). הריבית מעוגלת לצעדים של step ואינה יורדת מאפס.
+def simulate_prime_paths(prime, months, num_paths, volatility=0.01, mean_reversion=0.3, long_term_rate=None,
+                         shock=0.0, step=RATE_STEP, seed=None):
+    rng = np.random.default_rng(seed)
+    long_term_rate = prime if long_term_rate is None else long_term_rate
+    decay = np.exp(-mean_reversion / 12)
+    if mean_reversion > 0:
+        scale = volatility * np.sqrt((1 - decay ** 2) / (2 * mean_reversion))
+    else:
+        scale = volatility / np.sqrt(12)
+
+    noise = rng.standard_normal((num_paths, months)) * scale
+    paths = np.empty((num_paths, months))
+    rate = np.full(num_paths, float(prime))
+    for m in range(months):
+        rate = long_term_rate + (rate - long_term_rate) * decay + noise[:, m]
+        paths[:, m] = rate
+    paths += shock
+    if step:
+        paths = np.round(paths / step) * step
+    return np.maximum(paths, 0.0)
+
+
+# מבחן קיצון לריבית: המדדים הפיננסיים של הפרויקט לכל מסלול ריבית (מערך לכל מדד, איבר לכל מסלול),
+# ובנוסף סך הריבית לאורך ההלוואה, שירות החוב (ריבית וקרן) בשנה הראשונה ושירות החוב השנתי המרבי.
+# כל המסלולים מחושבים יחד כמטריצות, כך ש-10,000 מסלולים לוקחים שניות בודדות.
+def rate_stress_test(params, prime_rates, refinancing=(), prepayments=(), periods_per_year=1):
+    path = rate_path(prime_rates, refinancing, prepayments, params.prime_interest_rate)
+    columns = path_columns(scenario_columns(params.as_dict()), path)
+    flows = project_cash_flows(columns, periods_per_year, path)
+    metrics = metrics_from_cash_flows(columns, flows, periods_per_year)
+    debt_service = annual_totals(flows['Interest'] + flows['Principal'], periods_per_year)
+    return {
+        **metrics,
+        'Total Interest': flows['Interest'].sum(axis=1),
+        'First Year Debt Service': debt_service[:, 0],
+        'Peak Debt Service': debt_service.max(axis=1),
+    }
+
+
+# סיכום מבחן הקיצון: P5/P50/P95 לכל מדד והסתברות ל-NPV שלילי
+def stress_summary(results, percentiles=(5, 50, 95)):
+    summary = {'paths': len(results['NPV Min'])}
+    for name in ('NPV Min', 'IRR Min', 'Annual Financing Cost', 'Total Interest', 'First Year Debt Service',
+                 'Peak Debt Service'):
+        values = np.nanpercentile(results[name], percentiles)
+        summary[name] = {f'P{p}': float(value) for p, value in zip(percentiles, values)}
+    summary['Probability NPV < 0'] = float(np.mean(results['NPV Min'] < 0))
+    return summary
+
+
+# מבחן קיצון על num_paths מסלולים סטוכסטיים שמתחילים בריבית הפריים של params ובאורך ההלוואה
+# (פרמטרי המסלולים כמו ב-simulate_prime_paths); מחזיר את הסיכום בלבד, כך שמשימה בתהליך נפרד מחזירה מעט נתונים
+def simulated_stress_test(params, num_paths=10000, volatility=0.01, mean_reversion=0.3, long_term_rate=None,
+                          shock=0.0, seed=None, refinancing=(), prepayments=(), periods_per_year=1):
+    paths = simulate_prime_paths(params.prime_interest_rate, int(params.loan_term) * 12, num_paths, volatility,
+                                 mean_reversion, long_term_rate, shock, seed=seed)
+    return stress_summary(rate_stress_test(params, paths, refinancing, prepayments, periods_per_year))
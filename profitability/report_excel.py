@@ -0,0 +1,139 @@
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import LineChart, Reference
+from openpyxl.styles import Font
+
+from .batch import calculate_financial_metrics_batch
+from .model import INPUT_ROWS, METRIC_ROWS
+
+
+# ערך שמתאים לתא באקסל: מספרי numpy הופכים למספרי פייתון, NaN ואינסוף לתא ריק
+def _cell_value(value):
+    if hasattr(value, 'item'):
+        value = value.item()
+    if value.__class__ is float and (value != value or value - value != 0):
+        return None
+    return value
+
+
+# עמודה כרשימת ערכי פייתון (המרה אחת לכל העמודה במקום המרה לכל תא)
+def _column_values(column):
+    return column.tolist() if hasattr(column, 'tolist') else list(column)
+
+
+def _bold_row(ws, values):
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = Font(bold=True)
+        row.append(cell)
+    return row
+
+
+def _append(ws, values):
+    ws.append([_cell_value(value) for value in values])
+
+
+def _write_data_sheet(wb, params):
+    ws = wb.create_sheet(title="נתונים")
+    ws.append(_bold_row(ws, ["פרמטר", "ערך", "יחידה"] + [label for label, _, _, _ in INPUT_ROWS]))
+    values = params.as_dict()
+    for label, field, unit, scale in INPUT_ROWS:
+        value = values[field]
+        _append(ws, (label, value * scale if scale != 1 else value, unit))
+
+
+def _write_calculations_sheet(wb, metrics):
+    ws = wb.create_sheet(title="חישובים")
+    ws.append(_bold_row(ws, ["מדד", "ערך", "יחידה"]))
+    for label, key, unit in METRIC_ROWS:
+        _append(ws, (label, metrics[key], unit))
+
+
+def _write_chart_sheet(wb, params, metrics):
+    ws = wb.create_sheet(title="גרף כדאיות")
+    ws.append(["שנה", "תזרים מזומנים", "NPV מצטבר"])
+    discount = 1 / (1 + params.discount_rate)
+    for year in range(1, params.loan_term + 1):
+        _append(ws, (year,
+                     metrics['Net Annual Profit with Min Subsidy'],
+                     metrics['NPV Min'] * (1 - discount ** year) / (1 - discount) if discount != 1 else None))
+
+    chart = LineChart()
+    chart.title = "כדאיות הפרויקט לאורך זמן"
+    chart.x_axis.title = "שנה"
+    chart.y_axis.title = "ערך (₪)"
+    data = Reference(ws, min_col=2, min_row=1, max_col=3, max_row=params.loan_term + 1)
+    cats = Reference(ws, min_col=1, min_row=2, max_row=params.loan_term + 1)
+    chart.add_data(data, titles_from_data=True)
+    chart.set_categories(cats)
+    ws.add_chart(chart, "E5")
+
+
+# גיליון מטבלה עמודתית (מילון {כותרת: עמודה}) או מרשימת רשומות - השורות נכתבות ברצף ללא בניית אובייקט לכל תא
+def _write_table_sheet(wb, title, table):
+    ws = wb.create_sheet(title=title)
+    if isinstance(table, dict):
+        headers = list(table)
+        rows = zip(*(_column_values(table[name]) for name in headers))
+    else:
+        headers = list(table[0]) if table else []
+        rows = (record.values() for record in table)
+    ws.append(_bold_row(ws, headers))
+    for row in rows:
+        _append(ws, row)
+
+
+def _write_simulation_sheet(wb, simulation):
+    ws = wb.create_sheet(title="מונטה קרלו")
+    ws.append(_bold_row(ws, ["מדד", "P10", "P50", "P90", "ממוצע", "מינימום", "מקסימום"]))
+    for name in ('NPV', 'IRR', 'Loan Coverage Shortfall'):
+        summary = simulation[name]
+        _append(ws, (name, summary['P10'], summary['P50'], summary['P90'], summary['mean'], summary['min'],
+                     summary['max']))
+    _append(ws, ())
+    _append(ws, ("מספר הגרלות", simulation['draws']))
+    _append(ws, ("הסתברות ל-NPV שלילי", simulation['Probability NPV < 0']))
+    _append(ws, ("הסתברות לחוסר כיסוי להלוואה", simulation['Probability of Shortfall']))
+
+
+# דוח Excel מלא לפרויקט אחד, נבנה בזיכרון במצב כתיבה בלבד (write-only) ומוחזר כ-bytes להורדה.
+# loan_payments (לוח סילוקין), sensitivity (שורות ניתוח רגישות) ו-simulation (סיכום מונטה קרלו) אופציונליים,
+# וכל אחד מהם מתווסף כגיליון נפרד.
+def generate_advanced_excel_report(params, metrics, loan_payments=None, sensitivity=None, simulation=None):
+    wb = Workbook(write_only=True)
+    _write_data_sheet(wb, params)
+    _write_calculations_sheet(wb, metrics)
+    _write_chart_sheet(wb, params, metrics)
+    if loan_payments is not None:
+        _write_table_sheet(wb, "לוח סילוקין", loan_payments)
+    if sensitivity is not None:
+        _write_table_sheet(wb, "ניתוח רגישות", sensitivity)
+    if simulation is not None:
+        _write_simulation_sheet(wb, simulation)
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+# דוח Excel לתיק פרויקטים: שורה לכל תרחיש (כל הקלטים וכל המדדים) בגיליון אחד, כשהמדדים מחושבים
+# במעבר וקטורי אחד. scenarios היא רשימת ProjectParams; names (אופציונלי) הם שמות התרחישים.
+def generate_portfolio_excel_report(scenarios, names=None):
+    scenarios = list(scenarios)
+    names = list(names) if names is not None else [f"תרחיש {i}" for i in range(1, len(scenarios) + 1)]
+    rows = [params.as_dict() for params in scenarios]
+    fields = list(rows[0])
+    metrics = calculate_financial_metrics_batch({field: [row[field] for row in rows] for field in fields})
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="תיק פרויקטים")
+    ws.append(_bold_row(ws, ["תרחיש"] + fields + list(metrics)))
+    for i, (name, row) in enumerate(zip(names, rows)):
+        _append(ws, [name] + [row[field] for field in fields] + [metrics[key][i] for key in metrics])
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,383 @@
+import argparse
+import hashlib
+import os
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch
+from .model import METRIC_ROWS, MODEL_VERSION, calculate_financial_metrics, calculate_loan_repayment, cash_flow_table, \
+    sensitivity_analysis
+from .params import ProjectParams
+from .parallel import get_executor, resolve_workers
+
+# משתנה סביבה עם תיקיית תמונות התרשימים (ברירת מחדל: ~/.cache/profitability/charts)
+CHART_DIR_ENV_VAR = 'PROFITABILITY_CHART_DIR'
+
+# משתנה ברירת המחדל לתרשים ניתוח הרגישות בדוח
+DEFAULT_SENSITIVITY_VARIABLE = 'שיעור תפוסה'
+
+# רזולוציית תמונות התרשימים
+CHART_DPI = 130
+
+_HEBREW = re.compile('[֐-׿]')
+# רצפים לסידור חזותי: מילה בעברית, רצף משמאל לימין (אותיות לטיניות ומספרים), או תו ניטרלי בודד
+_BIDI_RUNS = re.compile(r'[֐-׿]+|[A-Za-z0-9](?:[A-Za-z0-9.,:%/+\- ]*[A-Za-z0-9%])?|.')
+_MIRRORED = str.maketrans('()[]<>', ')(][><')
+
+
+# טקסט בסדר חזותי משמאל לימין (fpdf ו-matplotlib אינם תומכים בכתיבה מימין לשמאל): שורה עם עברית
+# מתהפכת, ומספרים ומילים באנגלית שבתוכה נשארים בכיוונם
+def visual(text):
+    text = str(text)
+    if not _HEBREW.search(text):
+        return text
+    runs = []
+    for run in reversed(_BIDI_RUNS.findall(text)):
+        if _HEBREW.match(run):
+            run = run[::-1]
+        elif len(run) == 1:
+            run = run.translate(_MIRRORED)
+        runs.append(run)
+    return ''.join(runs)
+
+
+# matplotlib מגרסה 3.11 מסדר טקסט דו-כיווני בעצמו (libraqm); לגרסאות קודמות התוויות מועברות בסדר חזותי
+def _chart_text(text):
+    import matplotlib
+
+    version = tuple(int(part) for part in matplotlib.__version__.split('.')[:2])
+    return text if version >= (3, 11) else visual(text)
+
+
+def chart_dir(path=None):
+    return Path(path or os.environ.get(CHART_DIR_ENV_VAR) or Path.home() / '.cache' / 'profitability' / 'charts')
+
+
+# תמונת JPEG של תרשים, נשמרת בדיסק לפי גיבוב של סוג התרשים והנתונים שלו: אותו תרשים (באותו תהליך, בתהליך
+# עבודה אחר או בהרצה הבאה) מצויר פעם אחת בלבד. draw מקבל Figure של matplotlib ומצייר עליו.
+def chart_image(kind, data, draw, directory=None, size=(6.4, 3.6)):
+    digest = hashlib.sha256(f'{kind}\0{MODEL_VERSION}\0{data!r}'.encode()).hexdigest()
+    path = chart_dir(directory) / f'{kind}-{digest[:32]}.jpg'
+    if not path.exists():
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=size)
+        draw(figure)
+        figure.tight_layout()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f'.{os.getpid()}.tmp')
+        figure.savefig(temporary, format='jpg', dpi=CHART_DPI)
+        os.replace(temporary, path)
+    return str(path)
+
+
+# הלוגו מוקטן ונשמר כ-JPEG פעם אחת לכל תוכן קובץ (fpdf אינו תומך בשקיפות של PNG)
+def logo_image(logo, directory=None, max_width=720):
+    data = Path(logo).read_bytes()
+    path = chart_dir(directory) / f'logo-{hashlib.sha256(data).hexdigest()[:32]}.jpg'
+    if not path.exists():
+        from io import BytesIO
+
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as image:
+            image.thumbnail((max_width, max_width))
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f'.{os.getpid()}.tmp')
+        background.save(temporary, format='JPEG', quality=90)
+        os.replace(temporary, path)
+    return str(path)
+
+
+# רכיבי הרווח השנתי (כמו בתרשימי העוגה והמפל באפליקציה): (רווח נקי, עלויות מימון, מיסים)
+def _profit_breakdown(metrics, tax_rate):
+    financing_costs = metrics['Annual Financing Cost']
+    taxes = (metrics['Operating Annual Profit'] - financing_costs) * tax_rate
+    return metrics['Net Annual Profit (Before Subsidy)'], financing_costs, taxes
+
+
+def _draw_pie(values):
+    def draw(figure):
+        axes = figure.subplots()
+        labels = [_chart_text(label) for label in ('רווח נקי', 'עלויות תפעול', 'עלויות מימון', 'מיסים')]
+        axes.pie(np.maximum(values, 0), labels=labels, autopct='%1.0f%%', wedgeprops={'width': 0.7})
+        axes.set_title(_chart_text('התפלגות ההכנסות השנתיות'))
+    return draw
+
+
+def _draw_waterfall(steps):
+    def draw(figure):
+        axes = figure.subplots()
+        labels = [_chart_text(label) for label in ('הכנסות ברוטו', 'עלויות תפעול', 'עלויות מימון', 'מיסים', 'רווח נקי')]
+        starts = np.concatenate([[0.0], np.cumsum(steps[:-1])[:-1], [0.0]])
+        heights = np.asarray(steps, dtype=np.float64)
+        colors = ['#2e7d32' if step >= 0 else '#c62828' for step in steps[:-1]] + ['#1565c0']
+        axes.bar(labels, heights / 1e6, bottom=starts / 1e6, color=colors)
+        axes.tick_params(axis='x', labelsize=8)
+        axes.set_ylim(top=max((starts + np.maximum(heights, 0)).max(), 0) * 1.12 / 1e6 or None)
+        for i, (start, height) in enumerate(zip(starts, heights)):
+            axes.annotate(f'{height:,.0f}', (i, (start + max(height, 0)) / 1e6), ha='center', va='bottom', fontsize=7)
+        axes.set_ylabel(_chart_text('מיליוני ₪'))
+        axes.set_title(_chart_text('ניתוח רווח שנתי'))
+    return draw
+
+
+def _draw_sensitivity(rows, variable_name):
+    def draw(figure):
+        axes = figure.subplots()
+        values = [row['ערך'] for row in rows]
+        for key, label in (('ROI', 'ROI (%)'), ('IRR', 'IRR (%)'), ('תקופת החזר', 'תקופת החזר (שנים)')):
+            axes.plot(values, [row[key] for row in rows], label=_chart_text(label))
+        npv_axes = axes.twinx()
+        npv_axes.plot(values, [row['NPV'] / 1e6 for row in rows], color='gray', linestyle='--',
+                      label=_chart_text('NPV (מיליוני ₪)'))
+        axes.set_xlabel(_chart_text(variable_name))
+        axes.set_title(_chart_text(f'ניתוח רגישות: השפעת {variable_name} על מדדים פיננסיים'))
+        handles, labels = axes.get_legend_handles_labels()
+        npv_handles, npv_labels = npv_axes.get_legend_handles_labels()
+        axes.legend(handles + npv_handles, labels + npv_labels, fontsize=7)
+    return draw
+
+
+def _format(value, unit):
+    if value != value:
+        return 'לא מוגדר'
+    if unit == '%':
+        return f'{value:.2f}%'
+    if unit == 'שנים':
+        return f'{value:.2f}'
+    return f'{value:,.0f}'
+
+
+# סיכום לוח הסילוקין לפי שנה: תשלומים, ריבית וקרן בשנה ויתרת ההלוואה בסופה
+def loan_summary(loan_payments):
+    months = len(loan_payments['תשלום'])
+    year = np.arange(months) // 12
+    return {
+        'שנה': np.arange(1, year[-1] + 2) if months else np.array([]),
+        'תשלומים': np.bincount(year, weights=loan_payments['תשלום חודשי']) if months else np.array([]),
+        'ריבית': np.bincount(year, weights=loan_payments['ריבית לתשלום']) if months else np.array([]),
+        'קרן': np.bincount(year, weights=loan_payments['קרן לתשלום']) if months else np.array([]),
+        'יתרה בסוף השנה': loan_payments['יתרת הלוואה'][11::12] if months else np.array([]),
+    }
+
+
+# מדדי גופן TrueType לדוחות (שם, מתארים ורוחבי תווים), כמו שהם נקראים ב-FPDF.add_font: הגופן מפוענח פעם אחת
+# לכל תהליך ולא בכל דוח, בלי מטמון הקבצים של fpdf (שנשלט במשתנים גלובליים של המודול ונכתב לצד קובץ הגופן)
+@lru_cache(maxsize=None)
+def _font_metrics(path):
+    from fpdf.ttfonts import TTFontFile
+
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    return {
+        'type': 'TTF',
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'desc': {
+            'Ascent': int(round(ttf.ascent)),
+            'Descent': int(round(ttf.descent)),
+            'CapHeight': int(round(ttf.capHeight)),
+            'Flags': ttf.flags,
+            'FontBBox': '[%s %s %s %s]' % tuple(int(round(value)) for value in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV)),
+            'MissingWidth': int(round(ttf.defaultWidth)),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'cw': ttf.charWidths,
+        'ttffile': path,
+        'originalsize': os.stat(path).st_size,
+    }
+
+
+# רישום גופן Unicode על מסמך, כמו FPDF.add_font(uni=True) אבל מהמדדים שבמטמון (_font_metrics); הרישום נעשה
+# על המסמך בלבד ואינו משנה את הגדרות המטמון הגלובליות של fpdf
+def _add_font(pdf, family, path):
+    metrics = _font_metrics(path)
+    fontkey = family.lower()
+    pdf.fonts[fontkey] = {
+        'i': len(pdf.fonts) + 1, 'type': metrics['type'], 'name': metrics['name'], 'desc': metrics['desc'],
+        'up': metrics['up'], 'ut': metrics['ut'], 'cw': metrics['cw'], 'ttffile': path, 'fontkey': fontkey,
+        'subset': list(range(57 if hasattr(pdf, 'str_alias_nb_pages') else 32)), 'unifilename': None,
+    }
+    pdf.font_files[fontkey] = {'length1': metrics['originalsize'], 'type': 'TTF', 'ttffile': path}
+    pdf.font_files[path] = {'type': 'TTF'}
+
+
+# דוח PDF בפריסה מימין לשמאל (fpdf 1.7 עם גופן DejaVu Sans מ-matplotlib, שכולל אותיות עבריות)
+def _document():
+    import matplotlib
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    # גופן אחד בלבד: fpdf בונה תת-גופן וטבלת רוחבים לכל גופן בכל דוח, וזה רוב זמן ההפקה
+    _add_font(pdf, 'DejaVu', str(Path(matplotlib.get_data_path()) / 'fonts' / 'ttf' / 'DejaVuSans.ttf'))
+    pdf.set_auto_page_break(True, margin=15)
+    return pdf
+
+
+def _heading(pdf, text, size=14):
+    pdf.set_font('DejaVu', '', size)
+    pdf.cell(0, 10, visual(text), ln=1, align='R')
+
+
+# טבלה מימין לשמאל: העמודה הראשונה מימין. כותרת שארוכה מרוחב העמודה מוקטנת עד שהיא נכנסת.
+def _table(pdf, headers, rows, widths, size=8):
+    for header, width in zip(reversed(headers), reversed(widths)):
+        header_size = size
+        pdf.set_font('DejaVu', '', header_size)
+        while header_size > 4 and pdf.get_string_width(header) > width - 1:
+            header_size -= 0.5
+            pdf.set_font('DejaVu', '', header_size)
+        pdf.cell(width, 6, visual(header), border=1, align='C')
+    pdf.ln()
+    pdf.set_font('DejaVu', '', size)
+    for row in rows:
+        for value, width in zip(reversed(row), reversed(widths)):
+            pdf.cell(width, 5, visual(value), border=1, align='R')
+        pdf.ln()
+
+
+# דוח משקיעים ב-PDF לפרויקט אחד, מוחזר כ-bytes: מדדים עיקריים, תרשימי עוגה, מפל וניתוח רגישות, תזרים מזומנים
+# שנתי וסיכום שנתי של לוח הסילוקין. מה שלא הועבר (מדדים, לוח סילוקין, שורות ניתוח רגישות) מחושב כאן.
+# logo הוא נתיב לתמונת הלוגו (אופציונלי). התרשימים והלוגו נשמרים כתמונות ב-chart_directory לפי גיבוב
+# הנתונים שלהם, כך שדוח חוזר או דוחות של תרחישים עם אותם נתונים אינם מציירים אותם מחדש.
+# עם rate_path המימון בדוח הוא בריבית משתנה לפי מסלול הריבית (ראו batch.single_path).
+def generate_pdf_report(params, metrics=None, loan_payments=None, sensitivity=None,
+                        sensitivity_variable=DEFAULT_SENSITIVITY_VARIABLE, logo=None, chart_directory=None,
+                        rate_path=None):
+    if metrics is None:
+        metrics = calculate_financial_metrics(params, rate_path)
+    if loan_payments is None:
+        loan_payments = calculate_loan_repayment(params, rate_path)
+    if sensitivity is None:
+        sensitivity = sensitivity_analysis(params, sensitivity_variable, rate_path=rate_path)
+
+    net_profit, financing_costs, taxes = _profit_breakdown(metrics, params.tax_rate)
+    pie_values = (net_profit, metrics['Annual Operational Cost'], financing_costs, taxes)
+    waterfall_steps = (metrics['Gross Annual Profit'], -metrics['Annual Operational Cost'], -financing_costs, -taxes,
+                       net_profit)
+    sensitivity_rows = [{key: float(value) for key, value in row.items()} for row in sensitivity]
+    pie = chart_image('pie', pie_values, _draw_pie(pie_values), chart_directory, size=(4.2, 3.6))
+    waterfall = chart_image('waterfall', waterfall_steps, _draw_waterfall(waterfall_steps), chart_directory,
+                            size=(4.8, 3.6))
+    sensitivity_chart = chart_image('sensitivity', (sensitivity_variable, sensitivity_rows),
+                                    _draw_sensitivity(sensitivity_rows, sensitivity_variable), chart_directory)
+
+    pdf = _document()
+    pdf.add_page()
+    if logo is not None:
+        pdf.image(logo_image(logo, chart_directory), x=70, w=70)
+    _heading(pdf, 'דוח משקיעים - פרויקט וילות', 18)
+    pdf.set_font('DejaVu', '', 10)
+    pdf.cell(0, 6, visual(f'{params.num_villas} וילות, {params.repayment_type}, הלוואה ל-{params.loan_term} שנים, '
+                          f'מודל הכנסות: {params.revenue_model}'), ln=1, align='R')
+    pdf.ln(2)
+    _heading(pdf, 'מדדים עיקריים')
+    _table(pdf, ['מדד', 'ערך', 'יחידה'],
+           [(label, _format(metrics[key], unit), unit) for label, key, unit in METRIC_ROWS], [80, 50, 20], size=9)
+
+    pdf.add_page()
+    _heading(pdf, 'רווח שנתי')
+    top = pdf.get_y()
+    pdf.image(waterfall, x=10, y=top, w=100)
+    pdf.image(pie, x=115, y=top, w=85)
+    pdf.set_y(top + 78)
+    _heading(pdf, 'ניתוח רגישות')
+    pdf.image(sensitivity_chart, x=20, w=170)
+
+    pdf.add_page()
+    cash_flows = cash_flow_table(params, rate_path)
+    _heading(pdf, 'תזרים מזומנים שנתי')
+    headers = list(cash_flows)
+    _table(pdf, headers, [[f'{value:,.0f}' for value in row] for row in zip(*(cash_flows[name] for name in headers))],
+           [10] + [20] * (len(headers) - 1), size=6)
+    pdf.ln(4)
+    summary = loan_summary(loan_payments)
+    _heading(pdf, 'לוח סילוקין - סיכום שנתי')
+    headers = list(summary)
+    _table(pdf, headers, [[f'{value:,.0f}' for value in row] for row in zip(*(summary[name] for name in headers))],
+           [14, 36, 36, 36, 36])
+
+    return pdf.output(dest='S').encode('latin-1')
+
+
+# כתיבת דוח של תרחיש אחד לקובץ (בתהליך העבודה, כך שרק הנתיב חוזר לתהליך הראשי)
+def _write_report(path, params, metrics, sensitivity_variable, logo, chart_directory):
+    Path(path).write_bytes(generate_pdf_report(params, metrics, sensitivity_variable=sensitivity_variable, logo=logo,
+                                               chart_directory=chart_directory))
+    return str(path)
+
+
+# שורות טבלת תרחישים (DataFrame או רשימת מילונים) כ-ProjectParams; עמודה חסרה מקבלת את ברירת המחדל
+def scenario_params(scenarios):
+    if isinstance(scenarios, (list, tuple)) and (not scenarios or isinstance(scenarios[0], ProjectParams)):
+        return list(scenarios)
+    records = scenarios.to_dict(orient='records') if hasattr(scenarios, 'to_dict') else scenarios
+    fields = set(ProjectParams.__dataclass_fields__)
+    return [ProjectParams(**{key: value.item() if hasattr(value, 'item') else value
+                             for key, value in record.items() if key in fields}) for record in records]
+
+
+# דוחות PDF לתיק תרחישים, קובץ לכל תרחיש ב-output_dir. המדדים של כל התרחישים מחושבים במעבר וקטורי אחד,
+# והדוחות נבנים במקביל על פני מאגר התהליכים המשותף (workers כמו ב-parallel.resolve_workers).
+# names הם שמות הקבצים (ברירת מחדל: scenario-1, scenario-2, ...). מחזיר את רשימת הנתיבים לפי הסדר.
+def generate_pdf_reports(scenarios, output_dir, names=None, workers=None,
+                         sensitivity_variable=DEFAULT_SENSITIVITY_VARIABLE, logo=None, chart_directory=None):
+    scenarios = scenario_params(scenarios)
+    names = list(names) if names is not None else [f'scenario-{i}' for i in range(1, len(scenarios) + 1)]
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not scenarios:
+        return []
+
+    rows = [params.as_dict() for params in scenarios]
+    batch = calculate_financial_metrics_batch({field: [row[field] for row in rows] for field in rows[0]})
+    metrics = [{key: float(values[i]) for key, values in batch.items()} for i in range(len(scenarios))]
+    jobs = [(output_dir / f'{name}.pdf', params, metrics[i], sensitivity_variable, logo, chart_directory)
+            for i, (name, params) in enumerate(zip(names, scenarios))]
+
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return [_write_report(*job) for job in jobs]
+    executor = get_executor(workers)
+    return [future.result() for future in [executor.submit(_write_report, *job) for job in jobs]]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m profitability.report_pdf',
+        description='הפקת דוח משקיעים ב-PDF לכל תרחיש בקובץ תרחישים (CSV / Parquet / JSON).')
+    parser.add_argument('input', help='קובץ תרחישים, שורה לכל תרחיש ועמודה לכל פרמטר ב-ProjectParams')
+    parser.add_argument('-o', '--output-dir', default='reports', help='תיקיית הדוחות (ברירת מחדל: reports)')
+    parser.add_argument('--name-column', default='name', help='עמודה עם שם התרחיש לשם הקובץ (ברירת מחדל: name)')
+    parser.add_argument('--workers', default='1', help='מספר תהליכים (auto = כל הליבות)')
+    parser.add_argument('--logo', help='תמונת לוגו לראש הדוח')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='מספר תרחישים בכל מקטע')
+    return parser
+
+
+def main(argv=None):
+    from .cli import read_scenarios
+
+    args = build_parser().parse_args(argv)
+    count = 0
+    for frame in read_scenarios(args.input, chunk_size=args.chunk_size):
+        if args.name_column in frame:
+            names = frame[args.name_column].astype(str).tolist()
+        else:
+            names = [f'scenario-{count + i}' for i in range(1, len(frame) + 1)]
+        count += len(generate_pdf_reports(frame, args.output_dir, names, args.workers, logo=args.logo))
+    print(f'{count} דוחות נכתבו ל-{args.output_dir}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
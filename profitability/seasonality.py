@@ -0,0 +1,107 @@
+import numpy as np
+
+# מודל ההכנסות: תפוסה ומחיר אחידים לכל השנה, או לוח שנה עם מכפילים לסופי שבוע, חגים ועונת שיא
+REVENUE_MODELS = ('שנתי אחיד', 'לוח שנה')
+FLAT, CALENDAR = range(len(REVENUE_MODELS))
+
+# שנת ייחוס ללוח השנה (ימי השבוע ומועדי החגים); אותו לוח משמש לכל שנות הפרויקט
+CALENDAR_YEAR = 2025
+
+# לילות החגים בשנת הייחוס: (שם, הלילה הראשון, מספר לילות)
+HOLIDAYS = (
+    ('פסח', '2025-04-12', 7),
+    ('שבועות', '2025-06-01', 1),
+    ('ראש השנה', '2025-09-22', 2),
+    ('סוכות', '2025-10-06', 8),
+    ('חנוכה', '2025-12-14', 8),
+)
+
+# עונת השיא (חופשת הקיץ): מהחודש הראשון עד האחרון, כולל
+PEAK_MONTHS = (7, 8)
+
+# לילות סוף שבוע: חמישי ושישי (0 = שני ב-numpy)
+WEEKEND_NIGHTS = (3, 4)
+
+# סוגי הלילות: עונה רגילה או שיא x (לילה רגיל, סוף שבוע, חג). חג גובר על סוף שבוע.
+DAY_TYPES = ('רגיל', 'סוף שבוע', 'חג', 'שיא', 'שיא - סוף שבוע', 'שיא - חג')
+
+
+def _calendar():
+    dates = np.arange(f'{CALENDAR_YEAR}-01-01', f'{CALENDAR_YEAR + 1}-01-01', dtype='datetime64[D]')[:365]
+    month = (dates.astype('datetime64[M]') - dates[0].astype('datetime64[M]')).astype(np.int64)
+    weekday = (dates.astype(np.int64) - 4) % 7
+    holiday = np.zeros(dates.size, dtype=bool)
+    for _, first_night, nights in HOLIDAYS:
+        start = (np.datetime64(first_night) - dates[0]).astype(np.int64)
+        holiday[start:start + nights] = True
+    weekend = np.isin(weekday, WEEKEND_NIGHTS) & ~holiday
+    peak = (month + 1 >= PEAK_MONTHS[0]) & (month + 1 <= PEAK_MONTHS[1])
+    day_type = 3 * peak + np.where(holiday, 2, weekend.astype(np.int64))
+    return dates, month, day_type
+
+
+# לוח השנה מחושב פעם אחת בטעינת המודול: תאריך, חודש (0-11) וסוג הלילה לכל אחד מ-365 הלילות
+DATES, MONTHS, DAY_TYPE_INDEX = _calendar()
+
+
+# המרת מודל הכנסות (מחרוזת, קוד או מערך שלהם) למערך קודים מספריים
+def revenue_model_codes(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values.astype(np.int64)
+    codes = np.full(values.shape, -1, dtype=np.int64)
+    for code, name in enumerate(REVENUE_MODELS):
+        codes[values == name] = code
+    if (codes < 0).any():
+        unknown = sorted(set(np.atleast_1d(values[codes < 0]).tolist()))
+        raise ValueError(f"מודל הכנסות לא מוכר: {unknown}")
+    return codes
+
+
+# מספר הלילות מכל סוג בכל תקופה של שנה (סוג x תקופה); periods_per_year הוא 1 או 12
+def day_type_counts(periods_per_year=1):
+    period = MONTHS * periods_per_year // 12
+    counts = np.zeros((len(DAY_TYPES), periods_per_year))
+    np.add.at(counts, (DAY_TYPE_INDEX, period), 1)
+    return counts
+
+
+# מכפילי המחיר ושיעור התפוסה לכל סוג לילה (תרחיש x סוג). התפוסה מנורמלת כך שהממוצע השנתי לפני
+# החיתוך ל-100% שווה ל-occupancy_rate; לילות שחורגים מ-100% נחתכים ולכן התפוסה בפועל יכולה להיות נמוכה ממנו.
+def day_type_rates(c):
+    ones = np.ones_like(c['price_per_night'])
+    weekend_price, holiday_price, peak_price = (c['weekend_price_multiplier'], c['holiday_price_multiplier'],
+                                                c['peak_season_price_multiplier'])
+    weekend_occupancy, holiday_occupancy, peak_occupancy = (c['weekend_occupancy_multiplier'],
+                                                            c['holiday_occupancy_multiplier'],
+                                                            c['peak_season_occupancy_multiplier'])
+    price = np.stack([ones, weekend_price, holiday_price,
+                      peak_price, peak_price * weekend_price, peak_price * holiday_price], axis=1)
+    weight = np.stack([ones, weekend_occupancy, holiday_occupancy,
+                       peak_occupancy, peak_occupancy * weekend_occupancy, peak_occupancy * holiday_occupancy], axis=1)
+
+    nights_per_type = day_type_counts(1)[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_weight = weight @ nights_per_type / nights_per_type.sum()
+        occupancy = c['occupancy_rate'][:, None] * weight / mean_weight[:, None]
+    # חיתוך לפי החלק הממשי, כך שגם עמודות מרוכבות (גזירה בצעד מרוכב, ראו derivatives) נחתכות נכון
+    occupancy = np.where(occupancy.real > 1, 1.0, np.where(occupancy.real < 0, 0.0, occupancy))
+    return price * c['price_per_night'][:, None], np.nan_to_num(occupancy)
+
+
+# לילות מוזמנים והכנסה לווילה בכל תקופה של שנה במודל לוח השנה (תרחיש x תקופה), לפני הצמדה לאינפלציה.
+# החישוב הוא לפי סוג לילה ולא לפי יום, ולכן זהה לסכום על 365 הימים בעלות של שש עמודות בלבד.
+def seasonal_nights(c, periods_per_year=1):
+    price, occupancy = day_type_rates(c)
+    counts = day_type_counts(periods_per_year)
+    return occupancy @ counts, (price * occupancy) @ counts
+
+
+# עקומות יומיות של מחיר ושיעור תפוסה (תרחיש x יום) לשנת הייחוס, לתצוגה ולבדיקה
+def daily_curves(c):
+    price, occupancy = day_type_rates(c)
+    return {
+        'Date': DATES,
+        'Price': price[:, DAY_TYPE_INDEX],
+        'Occupancy': occupancy[:, DAY_TYPE_INDEX],
+    }
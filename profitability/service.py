@@ -0,0 +1,213 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .cache import LRUCache
+from .derivatives import elasticity_ranking
+from .grid import sensitivity_grid, tornado
+from .model import calculate_financial_metrics
+from .montecarlo import run_simulation
+from .parallel import resolve_workers
+from .portfolio import evaluate_portfolio
+from .rates import simulated_stress_test
+from .solver import goal_seek, optimize
+from .store import default_store
+
+# משתנה סביבה למספר המשימות שמשתמש אחד יכול להריץ במקביל (השאר ממתינות בתור שלו)
+SESSION_LIMIT_ENV_VAR = 'PROFITABILITY_SESSION_LIMIT'
+DEFAULT_SESSION_LIMIT = 2
+
+# מאגרי העבודה של השירות: תהליכים (ברירת מחדל) או תהליכונים בתוך התהליך (ראו ComputeService)
+BACKENDS = ('process', 'thread')
+
+# מספר התהליכונים במאגר התהליכונים
+DEFAULT_THREADS = 4
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+# עקומת רגישות דרך מאגר התרחישים שבדיסק (כל תהליך עבודה פותח את אותו קובץ)
+def _stored_sensitivity(params, variable_name, variable_range=None, rate_path=None):
+    return default_store().sensitivity(params, variable_name, variable_range, rate_path)
+
+
+# דוח ה-Excel מיובא רק כשמבקשים דוח, כדי שטעינת השירות לא תטען את openpyxl
+def _excel_report(*args, **kwargs):
+    from .report_excel import generate_advanced_excel_report
+
+    return generate_advanced_excel_report(*args, **kwargs)
+
+
+# דוח ה-PDF מיובא רק כשמבקשים דוח (fpdf ו-matplotlib)
+def _pdf_report(*args, **kwargs):
+    from .report_pdf import generate_pdf_report
+
+    return generate_pdf_report(*args, **kwargs)
+
+
+# סוגי המשימות: שם -> פונקציה ברמת מודול (נשלחת ב-pickle לתהליך העבודה)
+JOBS = {
+    'metrics': calculate_financial_metrics,
+    'sensitivity': _stored_sensitivity,
+    'grid': sensitivity_grid,
+    'tornado': tornado,
+    'elasticities': elasticity_ranking,
+    'goal_seek': goal_seek,
+    'optimize': optimize,
+    'simulation': run_simulation,
+    'rate_stress': simulated_stress_test,
+    'portfolio': evaluate_portfolio,
+    'excel_report': _excel_report,
+    'pdf_report': _pdf_report,
+}
+
+# משימות שהתוצאה שלהן אינה נשמרת במטמון: דוחות (מגה-בייטים של bytes) ומצברי מונטה קרלו. המטמון חסום במספר
+# פריטים, ותוצאות כאלה היו מחזיקות בזיכרון מאות מגה-בייטים בשרת ארוך-חיים; התרשימים שבדוחות כבר שמורים בדיסק.
+# משימה זהה שעדיין רצה עדיין מתאחדת עם הקיימת.
+UNCACHED_JOBS = frozenset({'excel_report', 'pdf_report', 'simulation'})
+
+
+# ערך ניתן לגיבוב לשימוש במפתח משימה: מילונים ורשימות הופכים ל-tuple ומערכים לבתים
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return value.dtype.str, value.shape, value.tobytes()
+    return value
+
+
+# שירות חישוב משותף לכל המשתמשים בתהליך: משימות (מדדים, ניתוחי רגישות, מונטה קרלו, דוחות) נשלחות
+# למאגר עבודה ומוחזרות כ-Future. משימה זהה למשימה שכבר רצה מצטרפת אליה במקום לרוץ שוב, תוצאות נשמרות
+# במטמון משותף, וכל משתמש (session) מריץ לכל היותר session_limit משימות במקביל - השאר ממתינות בתור שלו,
+# כך שמשתמש אחד עם הרבה משימות כבדות אינו תופס את כל המאגר.
+# ברירת המחדל היא מאגר תהליכים (spawn) עם resolve_workers(workers) תהליכים, כמו ב-parallel: המשימות אינן
+# מתחרות על ה-GIL עם הרצות Streamlit, ומשימה שקורסת או נתקעת אינה פוגעת בשרת. המחיר הוא הפעלת התהליכים
+# (פעם אחת, בשליחה הראשונה), pickle של הארגומנטים והתוצאות, ומטמונים (metrics_cache, הגופן של דוחות ה-PDF)
+# נפרדים לכל תהליך. backend='thread' מריץ במאגר של threads תהליכונים בתוך התהליך - בלי העלויות האלה
+# ועם מטמונים משותפים, אבל משימות ארוכות מחזיקות את ה-GIL בקטעי פייתון ומאטות את השרת.
+class ComputeService:
+    def __init__(self, workers=None, session_limit=None, cache=None, backend='process', threads=DEFAULT_THREADS):
+        if backend not in BACKENDS:
+            raise ValueError(f"מאגר עבודה לא מוכר: {backend}")
+        self.workers = resolve_workers(workers) if backend == 'process' else threads
+        self.backend = backend
+        if session_limit is None:
+            session_limit = int(os.environ.get(SESSION_LIMIT_ENV_VAR, DEFAULT_SESSION_LIMIT))
+        self.session_limit = max(1, session_limit)
+        self.cache = cache if cache is not None else LRUCache(maxsize=256)
+        self.submitted = 0
+        self.coalesced = 0
+        if backend == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='compute')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._running = {}
+        self._queued = {}
+
+    # שליחת משימה מסוג kind עם args/kwargs; מחזיר Future עם התוצאה.
+    # key הוא מפתח המטמון והאיחוד (ברירת מחדל: סוג המשימה והארגומנטים), למשל גיבוב של קובץ במקום תוכנו.
+    def submit(self, session, kind, args=(), kwargs=None, key=None):
+        function = JOBS[kind]
+        kwargs = kwargs or {}
+        key = (kind, _freeze(args), _freeze(kwargs)) if key is None else (kind, key)
+
+        value = self.cache.get(key) if kind not in UNCACHED_JOBS else None
+        if value is not None:
+            future = Future()
+            future.set_result(value)
+            return future
+
+        with self._lock:
+            self.submitted += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._in_flight[key] = Future()
+            job = (key, future, function, args, kwargs)
+            if self._running.get(session, 0) < self.session_limit:
+                self._running[session] = self._running.get(session, 0) + 1
+            else:
+                self._queued.setdefault(session, deque()).append(job)
+                return future
+        self._start(session, job)
+        return future
+
+    # שליחה והמתנה לתוצאה (חריגה מהמשימה נזרקת כאן)
+    def run(self, session, kind, args=(), kwargs=None, key=None, timeout=None):
+        return self.submit(session, kind, args, kwargs, key).result(timeout)
+
+    def _start(self, session, job):
+        key, future, function, args, kwargs = job
+        try:
+            inner = self._executor.submit(function, *args, **kwargs)
+        except RuntimeError as error:
+            inner = Future()
+            inner.set_exception(error)
+        inner.add_done_callback(lambda inner: self._finish(session, key, future, inner))
+
+    # סיום משימה: העברת התוצאה ל-Future של המבקשים, שמירה במטמון והפעלת המשימה הבאה בתור של המשתמש
+    def _finish(self, session, key, future, inner):
+        error = inner.exception() if not inner.cancelled() else None
+        if not inner.cancelled() and error is None and key[0] not in UNCACHED_JOBS:
+            self.cache.put(key, inner.result())
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            queue = self._queued.get(session)
+            next_job = queue.popleft() if queue else None
+            if queue is not None and not queue:
+                del self._queued[session]
+            if next_job is None:
+                self._running[session] -= 1
+                if not self._running[session]:
+                    del self._running[session]
+
+        if inner.cancelled() or future.cancelled():
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(inner.result())
+        if next_job is not None:
+            self._start(session, next_job)
+
+    def info(self):
+        cache = self.cache.info()
+        with self._lock:
+            return {'backend': self.backend, 'workers': self.workers, 'session_limit': self.session_limit,
+                    'submitted': self.submitted, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight),
+                    'queued': sum(len(queue) for queue in self._queued.values()), 'sessions': len(self._running),
+                    'hits': cache['hits'], 'misses': cache['misses'], 'hit_rate': cache['hit_rate']}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# שירות משותף לכל הקריאות בתהליך עם אותו מספר תהליכי עבודה (נוצר פעם אחת)
+def default_service(workers=None):
+    workers = resolve_workers(workers)
+    with _services_lock:
+        service = _services.get(workers)
+        if service is None:
+            service = _services[workers] = ComputeService(workers)
+        return service
+
+
+@atexit.register
+def shutdown_services():
+    with _services_lock:
+        for service in _services.values():
+            service.close()
+        _services.clear()
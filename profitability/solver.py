@@ -0,0 +1,132 @@
+import numpy as np
+
+from .batch import calculate_financial_metrics_batch, path_key, scenario_columns, single_path
+from .cache import metrics_cache
+from .cashflows import construction_cost
+from .derivatives import DIFFERENTIABLE_FIELDS, GRADIENT_METRICS, metric_gradients
+from .grid import INTEGER_FIELDS
+from .model import SENSITIVITY_RANGES, SENSITIVITY_VARIABLES, calculate_financial_metrics
+from .parallel import calculate_financial_metrics_parallel
+
+# גבולות חיפוש ברירת מחדל לכל שדה (ביחידות השדה): טווחי ניתוח הרגישות, ושדות נוספים שאינם בניתוח הרגישות
+SEARCH_BOUNDS = {field: (min(SENSITIVITY_RANGES[name]) * scale, max(SENSITIVITY_RANGES[name]) * scale)
+                 for name, (field, scale) in SENSITIVITY_VARIABLES.items()}
+SEARCH_BOUNDS['villa_size_sqm'] = (50, 500)
+
+
+# פרמטרים עם ערך חדש לשדה (שדות שלמים מעוגלים)
+def _with_value(params, field, value):
+    if field in INTEGER_FIELDS:
+        return params.replace(**{field: int(round(value))})
+    return params.replace(**{field: float(value)})
+
+
+# מדדים לתרחיש יחיד דרך המטמון המשותף, כך שהערכות חוזרות (גם מהאפליקציה) אינן מחושבות מחדש
+def _cached_metrics(params, rate_path=None):
+    key = params if rate_path is None else ('rate_path', params, path_key(rate_path))
+    return metrics_cache.get_or_compute(key, lambda: calculate_financial_metrics(params, rate_path))
+
+
+# ניוטון מוגן בקטע [low, high] שבו המדד חוצה את היעד (gap_low הוא הפער בקצה התחתון): הנגזרת מגיעה מ-metric_gradients
+# באותה הערכה של המדד, וצעד שיוצא מהקטע מוחלף בחציה
+def _newton_in_bracket(params, field, metric, target, low, high, gap_low, tol, max_iter=50, rate_path=None):
+    value = (low + high) / 2
+    for _ in range(max_iter):
+        values, derivatives = metric_gradients(_with_value(params, field, value), (field,), rate_path=rate_path)
+        gap = values[metric] - target
+        if gap == 0:
+            return value
+        if np.sign(gap) == np.sign(gap_low):
+            low = value
+        else:
+            high = value
+        slope = derivatives[metric][field]
+        newton = value - gap / slope if slope and np.isfinite(slope) else np.nan
+        new_value = newton if low < newton < high else (low + high) / 2
+        if abs(new_value - value) < tol:
+            return new_value
+        value = new_value
+    return value
+
+
+# חיפוש יעד: הערך של field שבו metric מגיע ל-target (למשל מחיר ללילה מינימלי ל-NPV אפס, או תפוסה ל-IRR של 12%).
+# סריקה וקטורית אחת של resolution נקודות בטווח [low, high] מוצאת את החצייה הראשונה של היעד, ובקטע הזה
+# הפתרון מחושב בניוטון עם הנגזרת האנליטית (NPV, IRR ותקופת החזר) או בשיטת ברנט (שאר המדדים);
+# בשדה שלם כל הערכים השלמים נסרקים והפתרון הוא הערך השלם הראשון שאחרי החצייה.
+# עם rate_path עלות המימון נגזרת ממסלול הריבית (ראו batch.single_path).
+# מחזיר (פרמטרים בפתרון, מדדים בפתרון); ValueError אם המדד אינו חוצה את היעד בטווח.
+def goal_seek(params, field, metric, target=0.0, low=None, high=None, resolution=64, tol=1e-6, rate_path=None):
+    default_low, default_high = SEARCH_BOUNDS.get(field, (None, None))
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+    if low is None or high is None:
+        raise ValueError(f"אין טווח חיפוש ברירת מחדל לשדה {field}")
+
+    if field in INTEGER_FIELDS:
+        points = np.arange(np.ceil(low), np.floor(high) + 1)
+    else:
+        points = np.linspace(low, high, resolution)
+    scenarios = params.as_dict()
+    scenarios[field] = points
+    gap = calculate_financial_metrics_batch(scenarios, rate_path=single_path(rate_path))[metric] - target
+
+    crossing = np.isfinite(gap[:-1]) & np.isfinite(gap[1:]) & (np.sign(gap[:-1]) != np.sign(gap[1:]))
+    crossing |= gap[:-1] == 0
+    if not crossing.any():
+        if gap[-1] == 0:
+            solution = _with_value(params, field, points[-1])
+            return solution, _cached_metrics(solution, rate_path)
+        raise ValueError(f"{metric} אינו מגיע ל-{target} בטווח {low}-{high} של {field}")
+    i = int(crossing.argmax())
+
+    if gap[i] == 0:
+        value = points[i]
+    elif field in INTEGER_FIELDS:
+        value = points[i + 1]
+    elif metric in GRADIENT_METRICS and field in DIFFERENTIABLE_FIELDS:
+        value = _newton_in_bracket(params, field, metric, target, points[i], points[i + 1], gap[i], tol,
+                                   rate_path=rate_path)
+    else:
+        from scipy.optimize import brentq
+
+        value = brentq(lambda x: _cached_metrics(_with_value(params, field, x), rate_path)[metric] - target,
+                       points[i], points[i + 1], xtol=tol)
+
+    solution = _with_value(params, field, value)
+    return solution, _cached_metrics(solution, rate_path)
+
+
+# אופטימיזציה בחיפוש שלם וחסום: כל צירוף של ערכי המועמדים ב-fields ({שדה: ערכים}) מחושב במעבר וקטורי אחד,
+# ונבחר הצירוף עם metric המקסימלי (או המינימלי כש-maximize=False) מבין הצירופים שעומדים באילוצים.
+# ההון העצמי בכל צירוף חסום בעלות ההקמה שלו, ועם max_equity צירוף שההון העצמי שלו גבוה ממנו אינו עומד באילוצים.
+# constraints הוא {מדד: (מינימום, מקסימום)} עם None לקצה פתוח. עם rate_path ראו batch.single_path.
+# מחזיר (פרמטרים, מדדים) של הצירוף הטוב ביותר; ValueError אם אף צירוף אינו עומד באילוצים.
+def optimize(params, fields, metric='NPV Min', maximize=True, max_equity=None, constraints=None, workers=None,
+             rate_path=None):
+    names = list(fields)
+    mesh = np.meshgrid(*(np.asarray(fields[name], dtype=np.float64) for name in names), indexing='ij')
+    scenarios = params.as_dict()
+    for name, points in zip(names, mesh):
+        scenarios[name] = points.ravel()
+    columns = scenario_columns(scenarios)
+    columns['equity_amount'] = np.minimum(columns['equity_amount'], construction_cost(columns))
+    metrics = calculate_financial_metrics_parallel(columns, workers, rate_path=single_path(rate_path))
+
+    score = metrics[metric] if maximize else -metrics[metric]
+    feasible = np.isfinite(score)
+    if max_equity is not None:
+        feasible &= columns['equity_amount'] <= max_equity
+    for key, (lower, upper) in (constraints or {}).items():
+        if lower is not None:
+            feasible &= metrics[key] >= lower
+        if upper is not None:
+            feasible &= metrics[key] <= upper
+    if not feasible.any():
+        raise ValueError("אף צירוף בטווח החיפוש אינו עומד באילוצים")
+    best = int(np.argmax(np.where(feasible, score, -np.inf)))
+
+    solution = params
+    for name in names:
+        solution = _with_value(solution, name, columns[name][best])
+    solution = solution.replace(equity_amount=float(columns['equity_amount'][best]))
+    return solution, {key: float(values[best]) for key, values in metrics.items()}
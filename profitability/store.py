@@ -0,0 +1,214 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .batch import DEFAULT_SCENARIO, path_key, scenario_columns
+from .cashflows import METRIC_KEYS
+from .model import MODEL_VERSION, SENSITIVITY_VARIABLES, calculate_loan_repayment, sensitivity_analysis
+from .parallel import calculate_financial_metrics_parallel
+from .params import ProjectParams
+
+# משתנה סביבה עם נתיב קובץ המאגר (ברירת מחדל: ~/.cache/profitability/scenarios.sqlite)
+STORE_ENV_VAR = 'PROFITABILITY_STORE'
+
+# גודל מרבי ברירת מחדל של התוצאות במאגר (בבתים); מעבר לו נמחקות התוצאות שנקראו לפני הכי הרבה זמן
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# מספר מפתחות בשאילתה אחת בקריאה של טבלת תרחישים (מגבלת המשתנים של SQLite)
+_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+# נתיב קובץ המאגר: ערך מפורש, או ממשתנה הסביבה, או ברירת המחדל בתיקיית המטמון של המשתמש
+def store_path(path=None):
+    return Path(path or os.environ.get(STORE_ENV_VAR) or Path.home() / '.cache' / 'profitability' / 'scenarios.sqlite')
+
+
+# שורת פרמטרים מנורמלת כבתים: אותו תרחיש מקבל אותו מפתח בין אם הגיע כ-ProjectParams או כשורה בטבלה
+def _scenario_rows(columns):
+    return np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in DEFAULT_SCENARIO])
+
+
+def _digest(kind, model_version, *parts):
+    digest = hashlib.sha256(f'{kind}\0{model_version}'.encode())
+    for part in parts:
+        digest.update(b'\0')
+        if isinstance(part, ProjectParams):
+            part = _scenario_rows(scenario_columns(part.as_dict()))[0]
+        digest.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+    return digest.hexdigest()
+
+
+# מאגר תוצאות מקומי ב-SQLite עם מפתח לפי תוכן: כל תוצאה נשמרת תחת גיבוב של סוג החישוב, גרסת המודל
+# והפרמטרים, כך שחישוב חוזר (מהאפליקציה, מה-CLI או מעבודת אצווה) הוא קריאה מהדיסק.
+# רשומות מגרסת מודל אחרת נמחקות בפתיחה, והגודל חסום ב-max_bytes בפינוי LRU לפי זמן הקריאה האחרון.
+# בטוח לשימוש ממספר תהליכונים, ומספר תהליכים יכולים לחלוק קובץ אחד (SQLite במצב WAL).
+class ScenarioStore:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, model_version=MODEL_VERSION):
+        self.path = store_path(path)
+        self.max_bytes = max_bytes
+        self.model_version = str(model_version)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute('DELETE FROM results WHERE model_version != ?', (self.model_version,))
+
+    def key(self, kind, *parts):
+        return _digest(kind, self.model_version, *parts)
+
+    # ערכים שמורים לרשימת מפתחות: {מפתח: ערך} רק למפתחות שנמצאו (ומעדכן את זמן הקריאה שלהם)
+    def get_many(self, keys):
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start:start + _QUERY_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                rows = self._connection.execute(f'SELECT key, value FROM results WHERE key IN ({marks})', chunk)
+                found.update((key, pickle.loads(value)) for key, value in rows)
+                self._connection.execute(f'UPDATE results SET accessed = ? WHERE key IN ({marks})', (now, *chunk))
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, kind, items):
+        now = time.time()
+        rows = []
+        for key, value in items:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, kind, self.model_version, blob, len(blob), now))
+        with self._lock:
+            self._connection.execute('BEGIN')
+            self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self._connection.execute('COMMIT')
+            self._evict()
+
+    # קריאה מהמאגר, או חישוב ושמירה אם התוצאה חסרה (כמו LRUCache.get_or_compute)
+    def get_or_compute(self, kind, parts, compute):
+        key = self.key(kind, *parts)
+        found = self.get_many([key])
+        if key in found:
+            return found[key]
+        value = compute()
+        self.put_many(kind, [(key, value)])
+        return value
+
+    # מחיקת התוצאות שנקראו לפני הכי הרבה זמן עד שהגודל הכולל יורד ל-90% מ-max_bytes
+    def _evict(self):
+        total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        stale = []
+        for key, size in self._connection.execute('SELECT key, size FROM results ORDER BY accessed'):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._connection.executemany('DELETE FROM results WHERE key = ?', stale)
+
+    # מדדים פיננסיים לתרחיש יחיד (אותה רשומה כמו שורה זהה ב-metrics_batch). עם rate_path המסלול (ראו
+    # batch.single_path) הוא חלק מהמפתח; בלעדיו המפתח הוא התרחיש בלבד.
+    def metrics(self, params, rate_path=None):
+        row = self.get_or_compute('metrics', (params,) + _path_parts(rate_path),
+                                  lambda: _metric_row(params.as_dict(), rate_path)[0])
+        return dict(zip(METRIC_KEYS, row.tolist()))
+
+    # לוח סילוקין מעוגל; המפתח הוא פרמטרי ההלוואה בלבד (ועם rate_path - גם המסלול והמרווח מעל הפריים)
+    def loan_schedule(self, params, rate_path=None):
+        parts = params.loan_inputs()
+        if rate_path is not None:
+            parts += (params.additional_interest_rate,) + _path_parts(rate_path)
+        return self.get_or_compute('loan_schedule', parts, lambda: calculate_loan_repayment(params, rate_path))
+
+    # עקומת ניתוח רגישות של משתנה אחד (רשימת שורות כמו sensitivity_analysis). הערך הנוכחי של המשתנה הנבדק
+    # אינו משפיע על העקומה ולכן אינו חלק מהמפתח; מסלול הריבית (אם יש) הוא חלק ממנו.
+    def sensitivity(self, params, variable_name, variable_range=None, rate_path=None):
+        field = SENSITIVITY_VARIABLES[variable_name][0]
+        params = params.replace(**{field: DEFAULT_SCENARIO[field]})
+        parts = (params, variable_name, None if variable_range is None else tuple(variable_range))
+        return self.get_or_compute('sensitivity', parts + _path_parts(rate_path),
+                                   lambda: sensitivity_analysis(params, variable_name, variable_range, rate_path))
+
+    # מדדים לטבלת תרחישים (כמו calculate_financial_metrics_batch): שורות שכבר במאגר נקראות, והחסרות
+    # מחושבות יחד ונשמרות - במעבר וקטורי אחד, או על פני workers תהליכים (ראו parallel.resolve_workers)
+    def metrics_batch(self, scenarios, workers=1):
+        columns = scenario_columns(scenarios)
+        rows = _scenario_rows(columns)
+        keys = [self.key('metrics', row) for row in rows]
+        found = self.get_many(keys)
+
+        result = np.empty((len(keys), len(METRIC_KEYS)))
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        for i, key in enumerate(keys):
+            if key in found:
+                result[i] = found[key]
+        if missing:
+            computed = _metric_row({name: values[missing] for name, values in columns.items()}, workers=workers)
+            result[missing] = computed
+            self.put_many('metrics', {keys[i]: row for i, row in zip(missing, computed)}.items())
+        return {name: result[:, j] for j, name in enumerate(METRIC_KEYS)}
+
+    def info(self):
+        with self._lock:
+            entries, size = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+            requests = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests else 0.0,
+                    'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM results')
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# חלקי המפתח של מסלול ריבית: ריק בלי מסלול, כך שמפתחות הריבית הקבועה אינם משתנים
+def _path_parts(rate_path):
+    return () if rate_path is None else ('rate_path', path_key(rate_path))
+
+
+# מדדים כמטריצה (תרחיש x מדד לפי סדר METRIC_KEYS)
+def _metric_row(scenarios, rate_path=None, workers=1):
+    metrics = calculate_financial_metrics_parallel(scenarios, workers, rate_path=rate_path)
+    return np.column_stack([metrics[name] for name in METRIC_KEYS])
+
+
+# מאגר משותף לכל הקריאות בתהליך עם אותו נתיב (נפתח פעם אחת)
+def default_store(path=None):
+    path = str(store_path(path))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ScenarioStore(path)
+        return store
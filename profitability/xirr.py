@@ -0,0 +1,201 @@
+import numpy as np
+from datetime import datetime
+
+# שיעורים לחיפוש תחום המכיל שורש, כשניוטון לא מתכנס (מסודרים מהקרוב לאפס לרחוק)
+_BRACKET_RATES = np.array([-0.999, -0.99, -0.9, -0.75, -0.5, -0.25, -0.1, 0.0,
+                           0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 100.0])
+# רשתות זמן (תקופות בשנה) שבהן התזרים מחושב כפולינום - ראו _grid_polynomial
+_TIME_GRIDS = (1, 2, 4, 12)
+# גודל בלוק השורות בהעתקת מקדמי הפולינום
+_BLOCK_ROWS = 4096
+# מתחת למספר שורות פעילות זה ניוטון עובר מהפולינום לחישוב הישיר (ראו xirr_batch)
+_POLYNOMIAL_MIN_ROWS = 500
+
+
+# תאריכים שנתיים מתאריך ההתחלה (ברירת מחדל: היום), כפי שהאפליקציה בונה אותם לתזרים
+def annual_dates(num_periods, start=None):
+    from dateutil.relativedelta import relativedelta
+
+    start = start or datetime.now()
+    return [start + relativedelta(years=i) for i in range(num_periods)]
+
+
+# מקדמי זמן בשנים לכל תאריך ביחס לתאריך הראשון - מחושבים פעם אחת ומשמשים בכל האיטרציות
+def year_fractions(dates):
+    d0 = dates[0]
+    return np.array([(di - d0).days / 365.0 for di in dates])
+
+
+# ערך נוכחי ונגזרתו לפי השיעור, עבור כל שורה במטריצת התזרים (times משותף - שורה אחת - או שורה לכל תזרים)
+def _xnpv_and_derivative(rate, values, times):
+    discounted = np.exp(times * -np.log1p(rate)[:, None])
+    discounted *= values
+    value = discounted.sum(axis=1)
+    if times.shape[0] == 1:
+        weighted = discounted @ times[0]
+    else:
+        weighted = np.einsum('ij,ij->i', times, discounted)
+    return value, -weighted / (1.0 + rate)
+
+
+# כשכל מקדמי הזמן הם כפולות שלמות של 1/grid (שנים או חודשים), התזרים הוא פולינום ב-q = (1+r)^(-1/grid).
+# מחזיר את המקדמים כמטריצה (חזקה x שורה) - ערכים באותה חזקה בשורה מסוכמים - או None כשאין רשת כזו.
+# עמודות שזמנן משותף לכל השורות מועתקות יחד, ורק עמודות עם זמן שונה בכל שורה (כמו ערך הסיום) מפוזרות לחוד.
+def _grid_polynomial(values, times):
+    n = values.shape[0]
+    shared = (times == times[:1]).all(axis=0)
+    shared_times = times[0, shared]
+    row_times = np.broadcast_to(times, values.shape)[:, ~shared]
+    for grid in _TIME_GRIDS:
+        steps = np.concatenate([shared_times, row_times.ravel()]) * grid
+        powers = np.rint(steps)
+        if np.all(np.abs(steps - powers) < 1e-9) and powers.min() >= 0:
+            break
+    else:
+        return None, None
+
+    powers = powers.astype(np.int64)
+    coefficients = np.zeros((powers.max() + 1, n))
+    shared_powers = powers[:shared_times.size]
+    if np.unique(shared_powers).size == shared_powers.size:
+        # העתקה בבלוקים של שורות, כך שההיפוך (שורה x חזקה לחזקה x שורה) נשאר בזיכרון המטמון
+        shared_columns = np.flatnonzero(shared)
+        for start in range(0, n, _BLOCK_ROWS):
+            coefficients[shared_powers, start:start + _BLOCK_ROWS] = values[start:start + _BLOCK_ROWS].T[shared_columns]
+    else:
+        for column, power in zip(np.flatnonzero(shared), shared_powers):
+            coefficients[power] += values[:, column]
+    rows = np.arange(n)
+    row_powers = powers[shared_times.size:].reshape(row_times.shape)
+    for k, column in enumerate(np.flatnonzero(~shared)):
+        coefficients[row_powers[:, k], rows] += values[:, column]
+    return coefficients, grid
+
+
+# ערך נוכחי ונגזרתו לפי השיעור משיטת הורנר על מקדמי הפולינום - פעולות על וקטורים בלבד, ללא חזקות
+def _polynomial_and_derivative(rate, coefficients, grid):
+    q = (1.0 + rate) ** (-1.0 / grid)
+    value = coefficients[-1].copy()
+    slope = np.zeros_like(value)
+    for coefficient in coefficients[-2::-1]:
+        slope *= q
+        slope += value
+        value *= q
+        value += coefficient
+    return value, -slope * q / (grid * (1.0 + rate))
+
+
+def xnpv(rate, values, dates):
+    if rate <= -1.0:
+        return float('inf')
+    times = year_fractions(dates)
+    return float(np.sum(np.asarray(values, dtype=np.float64) * (1.0 + rate) ** -times))
+
+
+# שלב 1: ניוטון עם נגזרת אנליטית על השורות שטרם התכנסו (שורה עם שיעור NaN אינה משתתפת). evaluate מחשב ערך
+# ונגזרת על data, ו-take מצמצם את data לשורות נבחרות. החישוב רץ על מקטע של שורות (rows) שמצומצם לשורות הפעילות
+# רק כשפחות מ-80% ממנו עדיין פעילות, כך שבאיטרציות הראשונות המטריצות אינן מועתקות בכל איטרציה.
+# האיטרציות נעצרות כשנותרו min_rows שורות פעילות או פחות; מחזיר את מסכת השורות שהתכנסו ואת מספר האיטרציות.
+def _newton(evaluate, take, data, rate, tol, max_iter, min_rows=0):
+    rows = np.arange(rate.size)
+    active = np.flatnonzero(np.isfinite(rate))
+    iterations = 0
+    while iterations < max_iter and active.size > min_rows:
+        if active.size < 0.8 * rows.size:
+            rows = rows[active]
+            data = take(data, active)
+            active = np.arange(rows.size)
+        value, derivative = evaluate(rate[rows], data)
+        step = value[active] / derivative[active]
+        index = rows[active]
+        rate[index] = np.maximum(rate[index] - step, -0.999999)
+        done = np.abs(step) < tol * (1.0 + np.abs(rate[index]))
+        # שיעור שהפך ל-NaN (גלישה) לא ישתנה עוד, ולכן השורה יוצאת מהאיטרציות ועוברת לחיפוש התחום
+        active = active[~done & np.isfinite(rate[index])]
+        iterations += 1
+    converged = np.isfinite(rate)
+    converged[rows[active]] = False
+    return converged, iterations
+
+
+# שלב 2: חיפוש תחום עם החלפת סימן (הקרוב ביותר לאפס) וניוטון מוגן בחציה בתוך התחום
+def _bracketed(values, times, tol, max_iter):
+    n = values.shape[0]
+    signs = np.empty((n, _BRACKET_RATES.size))
+    for k, candidate in enumerate(_BRACKET_RATES):
+        value, _ = _xnpv_and_derivative(np.full(n, candidate), values, times)
+        signs[:, k] = np.sign(value)
+
+    changes = signs[:, :-1] * signs[:, 1:] <= 0
+    distance = np.minimum(np.abs(_BRACKET_RATES[:-1]), np.abs(_BRACKET_RATES[1:]))
+    distance = np.where(changes, distance, np.inf)
+    found = np.isfinite(distance).any(axis=1)
+    index = np.argmin(distance, axis=1)
+    lo = _BRACKET_RATES[index]
+    hi = _BRACKET_RATES[index + 1]
+    sign_lo = signs[np.arange(n), index]
+
+    rate = (lo + hi) / 2
+    active = np.flatnonzero(found)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        value, derivative = _xnpv_and_derivative(rate[active], values[active], times[active])
+        same_side = np.sign(value) == sign_lo[active]
+        lo[active] = np.where(same_side, rate[active], lo[active])
+        hi[active] = np.where(same_side, hi[active], rate[active])
+
+        newton = rate[active] - value / derivative
+        inside = (newton > lo[active]) & (newton < hi[active])
+        new_rate = np.where(inside, newton, (lo[active] + hi[active]) / 2)
+        done = ((np.abs(new_rate - rate[active]) < tol * (1.0 + np.abs(new_rate))) |
+                (value == 0) | (hi[active] - lo[active] < tol))
+        rate[active] = new_rate
+        active = active[~done]
+
+    rate[~found] = np.nan
+    return rate
+
+
+# XIRR וקטורי: פתרון במקביל של כל שורות מטריצת התזרים values (שורה לכל תרחיש).
+# times הם מקדמי הזמן בשנים (וקטור משותף לכל השורות, או מטריצה בצורת values).
+# guess הוא ניחוש התחלתי - סקלר, או מערך לכל שורה (למשל הפתרון של תזרים דומה; NaN מוחלף ב-0).
+# מחזיר NaN רק בשורות שאין להן שיעור תשואה פנימי (אין החלפת סימן בתזרים).
+def xirr_batch(values, times, guess=0.0, tol=1e-10, max_iter=100):
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    times = np.asarray(times, dtype=np.float64)
+    if times.ndim == 2 and times.strides[0] == 0:
+        times = times[:1]
+    shared_times = times.ndim == 1 or times.shape[0] == 1
+    times = np.atleast_2d(times) if shared_times else np.broadcast_to(times, values.shape)
+    guess = np.broadcast_to(np.asarray(guess, dtype=np.float64), values.shape[:1])
+    rate = np.where(np.isfinite(guess), guess, 0.0)
+    # בתזרים ללא החלפת סימן אין שורש, ולכן הוא אינו נכנס לאיטרציות כלל
+    rootless = ~((values > 0).any(axis=1) & (values < 0).any(axis=1))
+    rate[rootless] = np.nan
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        # בפולינום (רשת זמנים אחידה) כל עוד יש הרבה שורות פעילות; את השורות האיטיות שנותרו ממשיכים בחישוב הישיר,
+        # שבמעט שורות זול יותר מלולאת הורנר על כל המקדמים
+        converged, iterations = np.zeros(rate.size, dtype=bool), 0
+        coefficients, grid = _grid_polynomial(values, times)
+        if coefficients is not None:
+            converged, iterations = _newton(lambda r, c: _polynomial_and_derivative(r, c, grid), lambda c, i: c[:, i],
+                                            coefficients, rate, tol, max_iter, _POLYNOMIAL_MIN_ROWS)
+        remaining = np.isfinite(rate) & ~converged
+        if remaining.any():
+            remaining_rate = rate[remaining]
+            remaining_times = times if shared_times else times[remaining]
+            converged[remaining], _ = _newton(lambda r, d: _xnpv_and_derivative(r, *d),
+                                              lambda d, i: (d[0][i], d[1] if shared_times else d[1][i]),
+                                              (values[remaining], remaining_times), remaining_rate, tol,
+                                              max_iter - iterations)
+            rate[remaining] = remaining_rate
+        pending = ~converged & ~rootless
+        if pending.any():
+            rate[pending] = _bracketed(values[pending], np.broadcast_to(times, values.shape)[pending], tol, max_iter)
+    return rate
+
+
+def xirr(values, dates):
+    return float(xirr_batch(values, year_fractions(dates))[0])
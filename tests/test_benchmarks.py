@@ -0,0 +1,45 @@
+import pytest
+
+from profitability.benchmarks import compare, run_benchmarks
+
+# תקציב זמן (חציון לקריאה, בשניות) למדידות הליבה: בערך פי 10 מהזמן הנמדד על מחשב פיתוח, כך שרק רגרסיה
+# אמיתית (למשל חזרה ללולאה בפייתון במקום מטריצות) מכשילה את הבדיקה
+BUDGETS = {
+    'xnpv_scalar': 0.0005,
+    'xirr_scalar': 0.005,
+    'xirr_adversarial_10k': 0.25,
+    'loan_schedule': 0.005,
+    'financial_metrics_single': 0.04,
+    'graph_discount_rate_update': 0.005,
+    'sensitivity_analysis_all_variables': 0.4,
+    'batch_10k': 2.0,
+    'rate_stress_10k': 3.0,
+}
+
+
+@pytest.fixture(scope='module')
+def results():
+    return run_benchmarks(list(BUDGETS), rounds=3, quick=True)['results']
+
+
+# כל מדידה בתקציב הזמן שלה
+@pytest.mark.parametrize('pattern', list(BUDGETS))
+def test_benchmark_within_budget(results, pattern):
+    medians = {name: result['median'] for name, result in results.items() if pattern in name}
+    assert medians
+    slow = {name: median for name, median in medians.items() if median > BUDGETS[pattern]}
+    assert not slow, f'חריגה מהתקציב ({BUDGETS[pattern]} שניות): {slow}'
+
+
+# ה-XIRR על התזרימים הקשים פותר את התזרימים שיש להם שורש, בשארית NPV יחסית זניחה
+def test_xirr_adversarial_convergence(results):
+    result = results['xirr_adversarial_10k']
+    assert result['solved_fraction'] >= 0.7
+    assert result['max_relative_residual'] < 1e-6
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {'a': {'median': 1.0}, 'b': {'median': 1.0}}}
+    current = {'results': {'a': {'median': 1.1}, 'b': {'median': 1.5}, 'c': {'median': 9.0}}}
+    assert [(name, regressed) for name, _, _, _, regressed in compare(baseline, current)] == \
+        [('a', False), ('b', True)]
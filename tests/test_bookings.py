@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profitability.bookings import BookingIngestor, aggregate_chunk, model_inputs, monthly_table, read_parquet_bookings
+
+
+def _bookings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    check_in = np.datetime64('2024-01-01') + rng.integers(0, 700, n)
+    nights = rng.integers(1, 8, n)
+    return pd.DataFrame({
+        'check_in': np.datetime_as_string(check_in),
+        'check_out': np.datetime_as_string(check_in + nights),
+        'revenue': rng.uniform(500, 5000, n).round(2),
+        'status': rng.choice(['confirmed', 'cancelled'], n, p=[0.9, 0.1]),
+        'villa_id': rng.integers(1, 6, n),
+    })
+
+
+def _assert_months_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for month, values in expected.items():
+        np.testing.assert_allclose(actual[month], values, rtol=1e-9, err_msg=month)
+
+
+# פירוק ללילות: ההכנסה מתחלקת בין הלילות, לילות חמישי ושישי הם סוף שבוע, ושורות מבוטלות או שגויות מדולגות
+def test_aggregate_chunk_splits_nights():
+    frame = pd.DataFrame({
+        'check_in': ['2025-01-01', '2025-01-30', '2025-01-10', '2025-01-10', 'garbage'],
+        'check_out': ['2025-01-04', '2025-02-02', '2025-01-12', '2025-01-09', '2025-01-02'],
+        'revenue': [300, 900, 100, 100, 100],
+        'status': ['confirmed', 'confirmed', 'Cancelled', 'confirmed', 'confirmed'],
+    })
+    months = aggregate_chunk(frame)
+    # 1-3 בינואר: רביעי, חמישי, שישי; 30 בינואר - 1 בפברואר: חמישי, שישי, שבת
+    assert months == {'2025-01': [1.0, 4.0, 100.0, 800.0], '2025-02': [1.0, 0.0, 300.0, 0.0]}
+
+
+# קליטה מצטברת: שורות שנוספו נקראות לבד, שורה אחרונה שלא הושלמה ממתינה, והצבירה שווה לקליטה של הקובץ המלא
+def test_csv_ingest_resumes_from_stored_offset(tmp_path):
+    bookings = _bookings(3000)
+    path = tmp_path / 'bookings.csv'
+    bookings[:1000].to_csv(path, index=False)
+    ingestor = BookingIngestor(tmp_path / 'state.json', chunk_size=256)
+    assert ingestor.ingest(path) == {str(path): 1000}
+    assert ingestor.ingest(path) == {str(path): 0}
+
+    text = bookings[1000:].to_csv(index=False, header=False)
+    partial = text.rindex('\n', 0, len(text) - 1) + 1
+    with open(path, 'a') as stream:
+        stream.write(text[:partial + 10])
+    assert ingestor.ingest(path) == {str(path): 1999}
+    with open(path, 'a') as stream:
+        stream.write(text[partial + 10:])
+    resumed = BookingIngestor(tmp_path / 'state.json')
+    assert resumed.ingest(path) == {str(path): 1}
+
+    fresh = BookingIngestor(tmp_path / 'fresh.json')
+    fresh.ingest(path)
+    _assert_months_equal(resumed.months(), fresh.months())
+    assert resumed.villa_count() == 5
+
+
+# קובץ שהוחלף נקלט מחדש, והצבירה הקודמת שלו נמחקת
+def test_replaced_file_is_reingested(tmp_path):
+    path = tmp_path / 'bookings.csv'
+    _bookings(500, seed=1).to_csv(path, index=False)
+    ingestor = BookingIngestor(tmp_path / 'state.json')
+    ingestor.ingest(path)
+    replacement = _bookings(800, seed=2)
+    replacement.to_csv(path, index=False)
+    assert ingestor.ingest(path) == {str(path): 800}
+    _assert_months_equal(ingestor.months(), aggregate_chunk(replacement))
+
+
+# ב-Parquet קבוצות השורות שלפני skip_rows אינן נקראות, וקובץ שנכתב מחדש עם שורות נוספות נצבר פעם אחת
+def test_parquet_ingest(tmp_path):
+    bookings = _bookings(2000, seed=3)
+    path = tmp_path / 'bookings.parquet'
+    bookings.to_parquet(path, row_group_size=300)
+    frames = list(read_parquet_bookings(path, ['check_in', 'revenue'], skip_rows=700, chunk_size=128))
+    assert sum(len(frame) for frame in frames) == 1300
+    assert frames[0]['check_in'].iloc[0] == bookings['check_in'].iloc[700]
+
+    bookings[:700].to_parquet(path, row_group_size=300)
+    ingestor = BookingIngestor(tmp_path / 'state.json', chunk_size=128)
+    assert ingestor.ingest(path) == {str(path): 700}
+    bookings.to_parquet(path, row_group_size=300)
+    ingestor.ingest(path)
+    _assert_months_equal(ingestor.months(), aggregate_chunk(bookings))
+
+
+# קלטי המודל: תפוסה ממוצעת ו-ADR מהטבלה החודשית
+def test_model_inputs_from_monthly_table():
+    bookings = _bookings(500, seed=4)
+    table = monthly_table(aggregate_chunk(bookings), num_villas=5)
+    booked = bookings[bookings['status'] == 'confirmed']
+    nights = (pd.to_datetime(booked['check_out']) - pd.to_datetime(booked['check_in'])).dt.days
+    assert table['Nights'].sum() == nights.sum()
+    inputs = model_inputs(table)
+    assert inputs['price_per_night'] == pytest.approx(booked['revenue'].sum() / nights.sum())
+    assert inputs['occupancy_rate'] == pytest.approx(nights.sum() / table['Available Nights'].sum())
+
+    calendar = model_inputs(table, 'לוח שנה')
+    assert {'weekend_price_multiplier', 'peak_season_occupancy_multiplier'} <= set(calendar)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch, cash_flow_matrix
+from profitability.cashflows import METRIC_KEYS, annual_totals, payback_period
+from profitability.model import calculate_financial_metrics
+from profitability.params import ProjectParams
+
+# תרחישים מגוונים: כל סוגי הסילוקין, תקופות הלוואה שונות, אינפלציה ועיתוי הסובסידיה
+SCENARIOS = [
+    ProjectParams(),
+    ProjectParams(loan_term=5, repayment_type='קרן שווה', annual_inflation_rate=0.0),
+    ProjectParams(loan_term=30, repayment_type='בוליט', annual_inflation_rate=0.05),
+    ProjectParams(num_villas=25, occupancy_rate=0.7, equity_amount=0, subsidy_timing='מענק מראש'),
+    ProjectParams(occupancy_rate=0.05, price_per_night=500),
+]
+
+
+def _scenario_table(scenarios):
+    rows = [params.as_dict() for params in scenarios]
+    return {field: [row[field] for row in rows] for field in rows[0]}
+
+
+# כל שורה באצווה זהה למדדים של calculate_financial_metrics לאותו תרחיש
+@pytest.mark.parametrize('periods_per_year', [1, 12])
+def test_batch_rows_match_scalar_metrics(periods_per_year):
+    batch = calculate_financial_metrics_batch(_scenario_table(SCENARIOS), periods_per_year)
+    for i, params in enumerate(SCENARIOS):
+        expected = calculate_financial_metrics_batch(params.as_dict(), periods_per_year)
+        for key in METRIC_KEYS:
+            np.testing.assert_allclose(batch[key][i], expected[key][0], rtol=1e-9, err_msg=key)
+    annual = calculate_financial_metrics_batch(_scenario_table(SCENARIOS))
+    for i, params in enumerate(SCENARIOS):
+        scalar = calculate_financial_metrics(params)
+        for key in METRIC_KEYS:
+            np.testing.assert_allclose(annual[key][i], scalar[key], rtol=1e-9, err_msg=key)
+
+
+# התזרים החודשי מסתכם בכל שנה לתזרים השנתי
+def test_monthly_flows_sum_to_annual_flows():
+    scenarios = _scenario_table(SCENARIOS)
+    annual = cash_flow_matrix(scenarios)
+    monthly = cash_flow_matrix(scenarios, 12)
+    for key in ('Revenue', 'Operating Cost', 'Operating Profit', 'Interest', 'Principal', 'Tax',
+                'Net Profit Before Subsidy', 'Subsidy Min', 'Subsidy Max'):
+        np.testing.assert_allclose(annual_totals(monthly[key], 12), annual[key], rtol=1e-9, atol=1e-6, err_msg=key)
+
+
+# הקרן נפרעת במלואה בתקופת ההלוואה, והתקופות שאחריה מאופסות
+def test_loan_is_repaid_within_its_term():
+    flows = cash_flow_matrix(_scenario_table(SCENARIOS))
+    for i, params in enumerate(SCENARIOS):
+        np.testing.assert_allclose(flows['Principal'][i].sum(), params.total_construction_cost - params.equity_amount,
+                                   rtol=1e-9)
+        assert not flows['Revenue'][i, params.loan_term:].any()
+        assert not flows['Interest'][i, params.loan_term:].any()
+
+
+# ההכנסות והעלויות גדלות כל שנה בשיעור האינפלציה
+def test_revenue_grows_with_inflation():
+    flows = cash_flow_matrix(ProjectParams(annual_inflation_rate=0.03).as_dict())
+    np.testing.assert_allclose(flows['Revenue'][0, 1:] / flows['Revenue'][0, :-1], 1.03)
+    np.testing.assert_allclose(flows['Operating Cost'][0, 1:] / flows['Operating Cost'][0, :-1], 1.03)
+
+
+# תקופת החזר באינטרפולציה בתוך השנה, ובהמשך התזרים של השנה האחרונה כשההשקעה לא הוחזרה עד סוף ההלוואה
+def test_payback_period_interpolates_and_extrapolates():
+    values = np.array([[-100, 30, 30, 30, 30, 0.0],
+                       [-100, 10, 10, 10, 10, 0.0],
+                       [-100, 10, 10, 10, -10, 0.0]])
+    times = np.broadcast_to(np.arange(6.0), values.shape)
+    terminal = np.zeros(values.shape, dtype=bool)
+    terminal[:, 5] = True
+    np.testing.assert_allclose(payback_period(values, times, terminal), [10 / 3, 10.0, np.inf])
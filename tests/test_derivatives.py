@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch, scenario_columns
+from profitability.derivatives import DIFFERENTIABLE_FIELDS, GRADIENT_METRICS, elasticity_ranking, metric_gradients
+from profitability.params import ProjectParams
+
+
+# נגזרות בהפרשים מרכזיים דרך calculate_financial_metrics_batch: לכל שדה שורה עם +h ושורה עם -h
+def _central_differences(params, fields, periods_per_year, step=1e-5):
+    base = scenario_columns(params.as_dict())
+    steps = np.array([step * max(abs(float(base[field][0])), 1.0) for field in fields])
+    columns = {name: np.repeat(values, 2 * len(fields)) for name, values in base.items()}
+    for i, field in enumerate(fields):
+        columns[field][2 * i] += steps[i]
+        columns[field][2 * i + 1] -= steps[i]
+    metrics = calculate_financial_metrics_batch(columns, periods_per_year)
+    return {name: (metrics[name][0::2] - metrics[name][1::2]) / (2 * steps) for name in GRADIENT_METRICS}
+
+
+# כל הנגזרות (בצעד מרוכב, ב-IRR מהפונקציה הסתומה ובתקופת ההחזר בהפרשים) שוות להפרשים מרכזיים של המודל,
+# והערכים שווים למדדים של האצווה
+@pytest.mark.parametrize('params, periods_per_year', [
+    (ProjectParams(), 1),
+    (ProjectParams(occupancy_rate=0.35, loan_term=15, repayment_type='קרן שווה'), 12),
+    (ProjectParams(revenue_model='לוח שנה', occupancy_rate=0.3), 1),
+])
+def test_gradients_match_central_differences(params, periods_per_year):
+    fields = DIFFERENTIABLE_FIELDS
+    values, gradients = metric_gradients(params, fields, periods_per_year)
+    expected = _central_differences(params, fields, periods_per_year)
+    metrics = calculate_financial_metrics_batch(params.as_dict(), periods_per_year)
+    for name in GRADIENT_METRICS:
+        np.testing.assert_allclose(values[name], metrics[name][0], rtol=1e-9, err_msg=name)
+        actual = np.array([gradients[name][field] for field in fields])
+        scale = np.abs(expected[name]).max()
+        np.testing.assert_allclose(actual, expected[name], rtol=1e-4, atol=1e-6 * scale, err_msg=name)
+
+
+# הדירוג ממוין לפי גודל הגמישות של NPV, והגמישות היא x/M * dM/dx
+def test_elasticity_ranking():
+    params = ProjectParams()
+    rows = elasticity_ranking(params)
+    values, gradients = metric_gradients(params)
+    assert len(rows) == len(DIFFERENTIABLE_FIELDS)
+    spans = [abs(np.nan_to_num(row['גמישות NPV'])) for row in rows]
+    assert spans == sorted(spans, reverse=True)
+    for row in rows:
+        derivative = gradients['NPV Min'][row['שדה']]
+        assert row['נגזרת NPV'] == derivative
+        np.testing.assert_allclose(row['גמישות NPV'], derivative * row['ערך'] / values['NPV Min'])
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from profitability.graph import MODEL_NODES, ModelGraph
+from profitability.model import calculate_financial_metrics, calculate_loan_repayment
+from profitability.params import ProjectParams
+
+
+def _assert_schedules_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name, column in expected.items():
+        np.testing.assert_array_equal(actual[name], column, err_msg=name)
+
+
+# המדדים מהגרף שווים למדדים של calculate_financial_metrics אחרי כל עדכון
+def test_graph_metrics_match_scalar_metrics():
+    graph = ModelGraph()
+    for params in (ProjectParams(), ProjectParams(discount_rate=0.1), ProjectParams(loan_term=12, num_villas=20),
+                   ProjectParams(repayment_type='בוליט', occupancy_rate=0.6)):
+        values, _ = graph.evaluate(params)
+        assert values['metrics'] == pytest.approx(calculate_financial_metrics(params), rel=1e-12)
+
+
+# הצומת של לוח הסילוקין שווה ל-calculate_loan_repayment
+def test_graph_loan_schedule_matches_scalar_schedule():
+    graph = ModelGraph()
+    for params in (ProjectParams(), ProjectParams(repayment_type='קרן שווה', equity_amount=0)):
+        values, _ = graph.evaluate(params, ('loan_schedule',))
+        _assert_schedules_equal(values['loan_schedule'], calculate_loan_repayment(params))
+
+
+# עדכון שדה מחשב מחדש רק את הצמתים שתלויים בו
+def test_update_recomputes_only_dependent_nodes():
+    graph = ModelGraph()
+    params = ProjectParams()
+    _, recomputed = graph.evaluate(params)
+    assert set(recomputed) == set(MODEL_NODES) - {'loan_schedule'}
+
+    _, recomputed = graph.evaluate(params.replace(discount_rate=0.1))
+    assert recomputed == ['npv', 'metrics']
+    _, recomputed = graph.evaluate(params.replace(discount_rate=0.1))
+    assert recomputed == []
+
+    _, recomputed = graph.evaluate(params.replace(discount_rate=0.1, tax_rate=0.3))
+    assert 'financing' not in recomputed and 'construction_cost' not in recomputed
+    assert {'profit', 'cash_flows', 'npv', 'irr', 'metrics'} <= set(recomputed)
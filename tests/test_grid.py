@@ -0,0 +1,56 @@
+import numpy as np
+
+from profitability.grid import GRID_METRICS, default_axis, sensitivity_grid, tornado
+from profitability.model import SENSITIVITY_VARIABLES, calculate_financial_metrics
+from profitability.params import ProjectParams
+
+
+def _with_display_value(params, name, value):
+    field, scale = SENSITIVITY_VARIABLES[name]
+    value = value * scale
+    return params.replace(**{field: int(value) if field in ('num_villas', 'loan_term') else value})
+
+
+# כל תא ברשת שווה למדדים של calculate_financial_metrics בצירוף הערכים שלו
+def test_grid_cells_match_scalar_metrics():
+    params = ProjectParams()
+    axes = {'שיעור תפוסה': [20, 45, 90], 'מספר וילות': [5, 12], 'ריבית פריים': [1, 6]}
+    grid = sensitivity_grid(params, axes)
+    for label in GRID_METRICS:
+        assert grid[label].shape == (3, 2, 2)
+
+    for i, occupancy in enumerate(axes['שיעור תפוסה']):
+        for j, villas in enumerate(axes['מספר וילות']):
+            for k, prime in enumerate(axes['ריבית פריים']):
+                point = _with_display_value(params, 'שיעור תפוסה', occupancy)
+                point = _with_display_value(point, 'מספר וילות', villas)
+                point = _with_display_value(point, 'ריבית פריים', prime)
+                expected = calculate_financial_metrics(point)
+                for label, key in GRID_METRICS.items():
+                    np.testing.assert_allclose(grid[label][i, j, k], expected[key], rtol=1e-9, err_msg=label)
+
+
+# שורת טורנדו: הבסיס והקצוות (±swing) של כל משתנה שווים למדדים של התרחיש המתאים, והשורות ממוינות לפי טווח ה-NPV
+def test_tornado_rows_match_scalar_metrics():
+    params = ProjectParams()
+    rows = tornado(params, swing=0.1)
+    assert {row['משתנה'] for row in rows} == set(SENSITIVITY_VARIABLES)
+
+    base = calculate_financial_metrics(params)
+    for row in rows:
+        for edge in ('נמוך', 'גבוה'):
+            expected = calculate_financial_metrics(_with_display_value(params, row['משתנה'], row[f'ערך {edge}']))
+            for label, key in GRID_METRICS.items():
+                np.testing.assert_allclose(row[f'{label} {edge}'], expected[key], rtol=1e-9, err_msg=label)
+                np.testing.assert_allclose(row[f'{label} בסיס'], base[key], rtol=1e-9, err_msg=label)
+
+    spans = [abs(row['NPV גבוה'] - row['NPV נמוך']) for row in rows]
+    assert spans == sorted(spans, reverse=True)
+
+
+# ציר של משתנה שלם מעוגל לערכים שלמים ייחודיים בתוך טווח הרגישות
+def test_default_axis_rounds_integer_fields():
+    axis = default_axis('מספר וילות', resolution=50)
+    np.testing.assert_array_equal(axis, np.unique(np.round(axis)))
+    assert axis.min() == 5 and axis.max() == 40
+    assert len(default_axis('שיעור תפוסה', resolution=7)) == 7
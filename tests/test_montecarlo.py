@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from profitability.model import calculate_financial_metrics, calculate_loan_repayment
+from profitability.montecarlo import StreamingHistogram, draw_scenarios, new_accumulators, run_simulation, \
+    simulate_chunk
+from profitability.params import ProjectParams
+
+DISTRIBUTIONS = {
+    'occupancy_rate': ('normal', 0.4, 0.1),
+    'price_per_night': ('triangular', 2500, 3500, 4500),
+    'construction_cost_per_sqm': ('uniform', 12000, 20000),
+    'prime_interest_rate': ('lognormal', 0.035, 0.3),
+}
+CORRELATIONS = {('occupancy_rate', 'price_per_night'): -0.3}
+
+
+# אחוזוני ההיסטוגרמה קרובים לאחוזונים המדויקים (עד רוחב תא), וההסתברות סביב 0 מדויקת
+def test_streaming_histogram_matches_exact_percentiles():
+    values = np.random.default_rng(0).normal(1.0, 2.0, 200000)
+    values[:5000] = 0.0
+    histogram = StreamingHistogram()
+    for chunk in np.array_split(values, 7):
+        histogram.update(chunk)
+
+    width = histogram.edges[1] - histogram.edges[0]
+    for p in (10, 50, 90):
+        assert abs(histogram.quantile(p / 100) - np.percentile(values, p)) <= 2 * width
+    assert histogram.fraction_below(0.0) == (values < 0).mean()
+    assert histogram.fraction_above(0.0) == (values > 0).mean()
+    assert histogram.count == values.size
+    np.testing.assert_allclose(histogram.mean(), values.mean())
+
+
+# מיזוג היסטוגרמות עם אותם טווחים שקול לעדכון אחד בכל הערכים
+def test_streaming_histogram_merge_is_exact_with_shared_edges():
+    values = np.random.default_rng(1).lognormal(0.0, 1.0, 50000)
+    whole = StreamingHistogram()
+    whole.update(values[:10000])
+    first = StreamingHistogram(edges=whole.edges)
+    first.update(values[:10000])
+    second = StreamingHistogram(edges=whole.edges)
+    second.update(values[10000:])
+    whole.update(values[10000:])
+    first.merge(second)
+    np.testing.assert_array_equal(first.counts, whole.counts)
+    assert first.summary() == whole.summary()
+
+
+# מקטע סימולציה: המצברים מסכמים בדיוק את המדדים של calculate_financial_metrics לכל תרחיש שהוגרל,
+# וחוסר הכיסוי הוא שירות החוב בשנה הראשונה (מלוח הסילוקין) שמעבר לרווח התפעולי
+def test_simulation_chunk_matches_scalar_metrics():
+    params = ProjectParams(occupancy_rate=0.25, equity_amount=0)
+    size = 60
+    accumulators = new_accumulators()
+    simulate_chunk(params, DISTRIBUTIONS, size, np.random.default_rng(5), accumulators, CORRELATIONS)
+
+    scenarios = draw_scenarios(params, DISTRIBUTIONS, size, np.random.default_rng(5), CORRELATIONS)
+    npv, shortfall = [], []
+    for i in range(size):
+        point = params.replace(**{field: float(scenarios[field][i]) for field in DISTRIBUTIONS})
+        metrics = calculate_financial_metrics(point)
+        schedule = calculate_loan_repayment(point)
+        debt_service = schedule['קרן לתשלום'][:12].sum() + schedule['ריבית לתשלום'][:12].sum()
+        npv.append(metrics['NPV Min'])
+        shortfall.append(max(debt_service - metrics['Operating Annual Profit'], 0.0))
+
+    np.testing.assert_allclose(accumulators['NPV'].mean(), np.mean(npv), rtol=1e-9)
+    np.testing.assert_allclose([accumulators['NPV'].minimum, accumulators['NPV'].maximum], [min(npv), max(npv)],
+                               rtol=1e-9)
+    # לוח הסילוקין מעוגל לשקלים, ולכן ההשוואה עד כמה שקלים לכל הלוואה
+    np.testing.assert_allclose(accumulators['Loan Coverage Shortfall'].mean(), np.mean(shortfall), atol=10)
+    assert accumulators['Loan Coverage Shortfall'].fraction_above(0.0) == np.mean(np.array(shortfall) > 10)
+
+
+# הגרלות בתחום הטבעי של כל שדה, והמתאם בין השדות קרוב למתאם שהתבקש
+def test_draws_respect_bounds_and_correlation():
+    scenarios = draw_scenarios(ProjectParams(), DISTRIBUTIONS, 100000, np.random.default_rng(2), CORRELATIONS)
+    assert scenarios['occupancy_rate'].min() >= 0 and scenarios['occupancy_rate'].max() <= 1
+    assert scenarios['price_per_night'].min() >= 2500 and scenarios['price_per_night'].max() <= 4500
+    rho = np.corrcoef(scenarios['occupancy_rate'], scenarios['price_per_night'])[0, 1]
+    assert abs(rho - -0.3) < 0.02
+
+
+# זרע קבוע נותן סיכום זהה, ומספר ההגרלות בסיכום הוא num_draws גם כשהמקטע האחרון חלקי
+def test_run_simulation_is_reproducible():
+    first = run_simulation(ProjectParams(), DISTRIBUTIONS, 25000, seed=7, correlations=CORRELATIONS, chunk_size=10000)
+    second = run_simulation(ProjectParams(), DISTRIBUTIONS, 25000, seed=7, correlations=CORRELATIONS, chunk_size=10000)
+    assert first == second
+    assert first['draws'] == 25000
+
+
+@pytest.mark.parametrize('num_draws, chunk_size', [(0, 1000), (-5, 1000), (1000, 0)])
+def test_run_simulation_rejects_empty_runs(num_draws, chunk_size):
+    with pytest.raises(ValueError):
+        run_simulation(ProjectParams(), DISTRIBUTIONS, num_draws, seed=1, chunk_size=chunk_size)
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from profitability.benchmarks import adversarial_cash_flows
+from profitability.loans import REPAYMENT_TYPES, loan_schedule
+from profitability.xirr import xirr_batch
+
+
+# לוח הסילוקין בלולאה חודשית, כמו המימוש המקורי באפליקציה (ללא עיגול): ריבית על היתרה, והקרן לפי סוג הסילוקין
+def _reference_schedule(total_loan, annual_rate, loan_term_years, repayment_type):
+    monthly_rate = annual_rate / 12
+    num_payments = loan_term_years * 12
+    if monthly_rate == 0:
+        annuity = total_loan / num_payments
+    else:
+        annuity = total_loan * monthly_rate / (1 - (1 + monthly_rate) ** -num_payments)
+
+    balance = total_loan
+    rows = []
+    for n in range(1, num_payments + 1):
+        interest = balance * monthly_rate
+        if repayment_type == 'שפיצר':
+            principal = annuity - interest
+        elif repayment_type == 'קרן שווה':
+            principal = total_loan / num_payments
+        else:
+            principal = balance if n == num_payments else 0.0
+        balance -= principal
+        rows.append((n, principal, interest, principal + interest, balance))
+    return np.array(rows).T
+
+
+@pytest.mark.parametrize('repayment_type', REPAYMENT_TYPES)
+@pytest.mark.parametrize('loan_term_years', [5, 17, 30])
+@pytest.mark.parametrize('annual_rate', [0.0, 0.035, 0.12])
+def test_loan_schedule_matches_monthly_loop(repayment_type, loan_term_years, annual_rate):
+    total_loan = 12_345_678.0
+    schedule = loan_schedule(total_loan, annual_rate, loan_term_years, repayment_type)
+    expected = _reference_schedule(total_loan, annual_rate, loan_term_years, repayment_type)
+
+    columns = ('תשלום', 'קרן לתשלום', 'ריבית לתשלום', 'תשלום חודשי', 'יתרת הלוואה')
+    for column, values in zip(columns, expected):
+        np.testing.assert_allclose(schedule[column], values, rtol=1e-9, atol=1e-5, err_msg=column)
+
+
+# אצווה של הלוואות באורכים שונים: כל שורה זהה ללוח הבודד שלה, והחודשים שאחרי סוף ההלוואה מאופסים
+def test_loan_schedule_batch_rows_match_single_loans():
+    loans, rates, terms = np.array([1e6, 2e7, 5e6]), np.array([0.05, 0.08, 0.0]), np.array([5, 30, 12])
+    types = np.array(REPAYMENT_TYPES)
+    schedule = loan_schedule(loans, rates, terms, types)
+    for i in range(3):
+        single = loan_schedule(loans[i], rates[i], terms[i], types[i])
+        months = terms[i] * 12
+        for column, values in single.items():
+            np.testing.assert_allclose(schedule[column][i, :months], values, rtol=1e-12, atol=1e-6)
+        assert not schedule['ריבית לתשלום'][i, months:].any()
+
+
+@pytest.fixture(scope='module')
+def adversarial():
+    values = adversarial_cash_flows(10000)
+    times = np.arange(values.shape[1], dtype=np.float64)
+    return values, times, xirr_batch(values, times)
+
+
+def _npv(values, times, rate):
+    return (values * (1 + rate[:, None]) ** -times).sum(axis=1)
+
+
+def test_xirr_batch_solved_rows_are_roots(adversarial):
+    values, times, rates = adversarial
+    solved = np.isfinite(rates)
+    residual = np.abs(_npv(values[solved], times, rates[solved])) / np.abs(values[solved]).sum(axis=1)
+    assert solved.mean() > 0.8
+    assert residual.max() < 1e-6
+
+
+# שורה ללא פתרון (NaN) חייבת להיות תזרים שאין לו שורש: ה-NPV אינו מחליף סימן על רשת צפופה של שיעורים
+def test_xirr_batch_rootless_rows_have_no_sign_change(adversarial):
+    values, times, rates = adversarial
+    rootless = values[np.isnan(rates)]
+    assert len(rootless)
+    grid = np.concatenate([-1 + np.logspace(-4, 0, 400, endpoint=False), np.logspace(-4, 3, 400), [0.0]])
+    signs = np.sign(np.stack([_npv(rootless, times, np.full(len(rootless), rate)) for rate in grid]))
+    assert ((signs >= 0).all(axis=0) | (signs <= 0).all(axis=0)).all()
+
+
+# השורות הבסיסיות של התזרימים הקשים: שורשים ידועים, שורש קרוב לאפס ותזרים ללא החלפת סימן
+def test_xirr_batch_known_rates():
+    values = np.array([
+        [-100, 230, -132, 0, 0],
+        [-100, 0.5, 0, 0, 0],
+        [-1, 100, 0, 0, 0],
+        [-100, 100 + 1e-9, 0, 0, 0],
+        [100, 100, 100, 100, 100],
+        [-100, -100, -100, -100, -100],
+    ], dtype=np.float64)
+    rates = xirr_batch(values, np.arange(5.0))
+    np.testing.assert_allclose(rates[:3], [0.1, -0.995, 99.0], rtol=1e-9)
+    assert abs(rates[3]) < 1e-10
+    assert np.isnan(rates[4:]).all()
+
+
+# הפתרון של כל שורה אינו תלוי בשורות האחרות (ובסדר שלהן), גם כשהמקטע הפעיל מצטמצם באמצע האיטרציות,
+# ובזמנים שאינם על רשת שלמה (חישוב ישיר במקום פולינום)
+@pytest.mark.parametrize('offset', [0.0, 0.01])
+def test_xirr_batch_rows_are_independent(adversarial, offset):
+    values, times, _ = adversarial
+    times = times + offset * np.arange(times.size) ** 2
+    rates = xirr_batch(values, times)
+    order = np.random.default_rng(1).permutation(len(values))
+    np.testing.assert_allclose(xirr_batch(values[order], times), rates[order], rtol=1e-9, atol=1e-12)
+    for i in order[:20]:
+        np.testing.assert_allclose(xirr_batch(values[i:i + 1], times), rates[i:i + 1], rtol=1e-9, atol=1e-12)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch
+from profitability.benchmarks import random_scenarios
+from profitability.loans import loan_schedule
+from profitability.montecarlo import run_simulation
+from profitability.parallel import WORKERS_ENV_VAR, calculate_financial_metrics_parallel, loan_schedule_parallel, \
+    merge_results, resolve_workers, shard_bounds
+from profitability.params import ProjectParams
+
+
+def test_resolve_workers(monkeypatch):
+    monkeypatch.delenv(WORKERS_ENV_VAR, raising=False)
+    assert resolve_workers() == 1
+    assert resolve_workers(3) == 3
+    assert resolve_workers('auto') >= 1
+    monkeypatch.setenv(WORKERS_ENV_VAR, '2')
+    assert resolve_workers() == 2
+
+
+# המקטעים מכסים את כל השורות ברצף, בלי חפיפה
+@pytest.mark.parametrize('n, workers, chunk_size', [(1, 4, None), (12345, 4, 1000), (100000, 3, None)])
+def test_shard_bounds_cover_rows(n, workers, chunk_size):
+    bounds = shard_bounds(n, workers, chunk_size)
+    assert bounds[0][0] == 0 and bounds[-1][1] == n
+    assert all(stop == start for (_, stop), (start, _) in zip(bounds, bounds[1:]))
+
+
+def test_merge_results_pads_ragged_columns():
+    merged = merge_results([{'a': np.ones((1, 2)), 'b': np.arange(1.0)}, {'a': np.ones((2, 3)), 'b': np.arange(2.0)}])
+    assert merged['a'].shape == (3, 3)
+    assert not merged['a'][0, 2]
+    np.testing.assert_array_equal(merged['b'], [0, 0, 1])
+
+
+# חישוב על פני תהליכים זהה לחישוב הסדרתי במנוע האצווה
+def test_parallel_metrics_match_batch():
+    scenarios = random_scenarios(3000, seed=4)
+    expected = calculate_financial_metrics_batch(scenarios)
+    result = calculate_financial_metrics_parallel(scenarios, workers=2, chunk_size=700)
+    for key, values in expected.items():
+        np.testing.assert_allclose(result[key], values, rtol=1e-12, err_msg=key)
+
+
+def test_parallel_loan_schedules_match_batch():
+    loans, rates, terms = np.array([1e6, 2e7, 5e6]), np.array([0.05, 0.08, 0.0]), np.array([5, 30, 12])
+    types = np.array(['שפיצר', 'קרן שווה', 'בוליט'])
+    expected = loan_schedule(loans, rates, terms, types)
+    result = loan_schedule_parallel(loans, rates, terms, types, workers=2, chunk_size=1)
+    for key, values in expected.items():
+        np.testing.assert_allclose(result[key], values, rtol=1e-12, err_msg=key)
+
+
+# סימולציה עם זרע קבוע נותנת תוצאות זהות בכל מספר תהליכים
+def test_simulation_is_independent_of_workers():
+    distributions = {'occupancy_rate': ('normal', 0.4, 0.1), 'price_per_night': ('uniform', 3000, 4000)}
+    serial = run_simulation(ProjectParams(), distributions, 30000, seed=3, chunk_size=8000, workers=1)
+    parallel = run_simulation(ProjectParams(), distributions, 30000, seed=3, chunk_size=8000, workers=2)
+    assert serial == parallel
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch, cash_flow_matrix
+from profitability.cashflows import METRIC_KEYS
+from profitability.params import ProjectParams
+from profitability.portfolio import evaluate_portfolio, project_columns
+
+PROJECTS = [
+    ProjectParams(),
+    ProjectParams(num_villas=20, loan_term=10, repayment_type='קרן שווה', discount_rate=0.1),
+    ProjectParams(occupancy_rate=0.6, loan_term=20, repayment_type='בוליט', equity_amount=0),
+]
+
+
+# המדדים לכל פרויקט שווים לשורות של calculate_financial_metrics_batch באותה תדירות
+@pytest.mark.parametrize('periods_per_year', [1, 12])
+def test_project_metrics_match_batch(periods_per_year):
+    _, _, metrics = evaluate_portfolio(PROJECTS, [0, 6, 30], periods_per_year)
+    expected = calculate_financial_metrics_batch(project_columns(PROJECTS), periods_per_year)
+    for key in METRIC_KEYS:
+        np.testing.assert_allclose(metrics[key], expected[key], rtol=1e-9, err_msg=key)
+
+
+# ציר הזמן המאוחד מסכם את תזרימי הפרויקטים, וה-NPV המאוחד הוא סכום ה-NPV של הפרויקטים מהוונים לתחילת התיק
+def test_timeline_aggregates_project_flows():
+    offsets = [0, 12, 24]
+    summary, timeline, metrics = evaluate_portfolio(PROJECTS, offsets)
+    flows = cash_flow_matrix(project_columns(PROJECTS), 12)
+    for key in ('Revenue', 'Interest', 'Principal', 'Tax'):
+        np.testing.assert_allclose(timeline[key].sum(), flows[key].sum(), rtol=1e-9, err_msg=key)
+    assert not timeline['Revenue'][:1].any()
+
+    rates = np.array([params.discount_rate for params in PROJECTS])
+    expected_npv = (metrics['NPV Min'] * (1 + rates) ** -(np.array(offsets) / 12)).sum()
+    np.testing.assert_allclose(summary['NPV Min'], expected_npv, rtol=1e-9)
+    assert summary['Total Construction Cost'] == pytest.approx(sum(p.total_construction_cost for p in PROJECTS))
+
+
+# יתרת החוב: מלוא ההלוואות כשכל הפרויקטים מתחילים יחד, ואפס אחרי סוף ההלוואה הארוכה
+def test_outstanding_debt():
+    summary, timeline, _ = evaluate_portfolio(PROJECTS)
+    loans = sum(p.total_construction_cost - p.equity_amount for p in PROJECTS)
+    np.testing.assert_allclose(timeline['Outstanding Debt'][0], loans, rtol=1e-9)
+    np.testing.assert_allclose(timeline['Outstanding Debt'][20 * 12:], 0.0, atol=1e-3)
+    assert summary['Peak Debt'] == pytest.approx(loans)
+    assert np.all(np.diff(timeline['Outstanding Debt']) <= 1e-6)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch, single_path
+from profitability.cashflows import METRIC_KEYS
+from profitability.graph import ModelGraph
+from profitability.grid import GRID_METRICS, sensitivity_grid
+from profitability.model import calculate_financial_metrics, calculate_loan_repayment
+from profitability.montecarlo import draw_scenarios, new_accumulators, simulate_chunk
+from profitability.params import ProjectParams
+from profitability.portfolio import evaluate_portfolio, project_columns
+from profitability.rates import forward_curve, rate_path, rate_stress_test, simulate_prime_paths
+
+PARAMS = ProjectParams(loan_term=15)
+# מסלול עולה שמתחיל בריבית הפריים של PARAMS, עם מחזור ופירעון מוקדם
+PATH = rate_path(forward_curve([(0, PARAMS.prime_interest_rate), (60, 0.07), (120, 0.05)], 180),
+                 refinancing=[(36, 0.01)], prepayments=[(48, 2e6)])
+
+
+# לוחות הסילוקין מעוגלים לשקלים, ולכן חישוב בסדר פעולות אחר יכול להיות שונה בשקל אחד
+def _assert_schedules_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name, column in expected.items():
+        np.testing.assert_allclose(actual[name], column, atol=1, err_msg=name)
+
+
+# מסלול קבוע בריבית הפריים של התרחיש זהה לריבית הקבועה: לוח הסילוקין והמדדים
+@pytest.mark.parametrize('repayment_type', ['שפיצר', 'קרן שווה', 'בוליט'])
+def test_constant_path_matches_fixed_rate(repayment_type):
+    params = PARAMS.replace(repayment_type=repayment_type)
+    constant = rate_path(np.full(180, params.prime_interest_rate))
+    _assert_schedules_equal(calculate_loan_repayment(params, constant), calculate_loan_repayment(params))
+    assert calculate_financial_metrics(params, constant) == pytest.approx(calculate_financial_metrics(params),
+                                                                          rel=1e-9)
+
+
+# תרחיש שריבית הפריים שלו שונה מבסיס המסלול מקבל את המסלול מוזז בהפרש
+def test_path_is_shifted_by_prime_delta():
+    params = PARAMS.replace(prime_interest_rate=PARAMS.prime_interest_rate + 0.01)
+    shifted = rate_path(PATH['Prime'] + 0.01, PATH['Refinancing'], PATH['Prepayments'])
+    assert calculate_financial_metrics(params, PATH) == pytest.approx(calculate_financial_metrics(params, shifted),
+                                                                      rel=1e-12)
+    _assert_schedules_equal(calculate_loan_repayment(params, PATH), calculate_loan_repayment(params, shifted))
+    assert calculate_financial_metrics(params, PATH) != calculate_financial_metrics(PARAMS, PATH)
+
+
+# ניתוח רגישות של ריבית הפריים עם מסלול ריבית משנה את המדדים (המסלול מוזז בכל נקודה)
+def test_prime_sweep_with_rate_path():
+    grid = sensitivity_grid(PARAMS, {'ריבית פריים': [2, 4, 6]}, rate_path=PATH)
+    for i, prime in enumerate([0.02, 0.04, 0.06]):
+        expected = calculate_financial_metrics(PARAMS.replace(prime_interest_rate=prime), PATH)
+        for label, key in GRID_METRICS.items():
+            np.testing.assert_allclose(grid[label][i], expected[key], rtol=1e-9, err_msg=label)
+    assert len(set(grid['NPV'].tolist())) == 3
+
+
+def test_single_path_rejects_multiple_paths():
+    paths = rate_path(simulate_prime_paths(0.06, 180, 3, seed=0))
+    with pytest.raises(ValueError):
+        single_path(paths)
+    with pytest.raises(ValueError):
+        calculate_financial_metrics(PARAMS, paths)
+    assert single_path(rate_path(paths['Prime'][0]))['Prime'].shape == (1, 180)
+
+
+# מבחן הקיצון: כל מסלול שווה לחישוב של התרחיש על אותו מסלול, ופירעון מוקדם מקטין את סך הריבית
+def test_rate_stress_rows_match_single_paths():
+    paths = simulate_prime_paths(PARAMS.prime_interest_rate, 180, 20, seed=1)
+    results = rate_stress_test(PARAMS, paths, PATH['Refinancing'], PATH['Prepayments'])
+    for i in range(len(paths)):
+        path = rate_path(paths[i], PATH['Refinancing'], PATH['Prepayments'], PARAMS.prime_interest_rate)
+        expected = calculate_financial_metrics(PARAMS, path)
+        for key in METRIC_KEYS:
+            np.testing.assert_allclose(results[key][i], expected[key], rtol=1e-9, err_msg=key)
+        schedule = calculate_loan_repayment(PARAMS, path)
+        np.testing.assert_allclose(results['Total Interest'][i], schedule['ריבית לתשלום'].sum(), atol=200)
+    without_prepayment = rate_stress_test(PARAMS, paths, PATH['Refinancing'])
+    assert (results['Total Interest'] < without_prepayment['Total Interest']).all()
+
+
+# גרף המודל: מסלול הריבית הוא קלט, ושינוי שלו פוסל רק את צמתי המימון
+def test_graph_with_rate_path():
+    graph = ModelGraph()
+    graph.evaluate(PARAMS)
+    values, recomputed = graph.evaluate(PARAMS, ('metrics', 'loan_schedule'), PATH)
+    assert values['metrics'] == pytest.approx(calculate_financial_metrics(PARAMS, PATH), rel=1e-12)
+    _assert_schedules_equal(values['loan_schedule'], calculate_loan_repayment(PARAMS, PATH))
+    assert 'operating' not in recomputed and {'financing', 'loan_schedule'} <= set(recomputed)
+    _, recomputed = graph.evaluate(PARAMS, ('metrics',), rate_path(PATH['Prime'], PATH['Refinancing'],
+                                                                   PATH['Prepayments']))
+    assert recomputed == []
+    values, _ = graph.evaluate(PARAMS, ('metrics',))
+    assert values['metrics'] == pytest.approx(calculate_financial_metrics(PARAMS), rel=1e-12)
+
+
+# מונטה קרלו ותיק פרויקטים על מסלול ריבית שווים למנוע האצווה על אותו מסלול
+def test_simulation_and_portfolio_with_rate_path():
+    distributions = {'occupancy_rate': ('uniform', 0.3, 0.6), 'prime_interest_rate': ('uniform', 0.03, 0.08)}
+    accumulators = new_accumulators()
+    simulate_chunk(PARAMS, distributions, 50, np.random.default_rng(0), accumulators, rate_path=PATH)
+    scenarios = draw_scenarios(PARAMS, distributions, 50, np.random.default_rng(0))
+    scenarios = {**PARAMS.as_dict(), **scenarios}
+    expected = calculate_financial_metrics_batch(scenarios, rate_path=single_path(PATH))
+    np.testing.assert_allclose(accumulators['NPV'].mean(), expected['NPV Min'].mean(), rtol=1e-9)
+
+    projects = [PARAMS, PARAMS.replace(num_villas=20, prime_interest_rate=0.05)]
+    _, _, metrics = evaluate_portfolio(projects, rate_path=PATH)
+    expected = calculate_financial_metrics_batch(project_columns(projects), 12, single_path(PATH))
+    for key in METRIC_KEYS:
+        np.testing.assert_allclose(metrics[key], expected[key], rtol=1e-9, err_msg=key)
@@ -0,0 +1,31 @@
+import re
+from pathlib import Path
+
+import fpdf.fpdf
+
+from profitability.params import ProjectParams
+from profitability.report_pdf import generate_pdf_report, generate_pdf_reports
+
+_FPDF_GLOBALS = ('FPDF_CACHE_MODE', 'FPDF_CACHE_DIR', 'FPDF_FONT_DIR', 'SYSTEM_TTFONTS')
+
+
+def _without_dates(document):
+    return re.sub(rb'/CreationDate \(D:\d+\)', b'', document)
+
+
+# הדוח אינו משנה את ההגדרות הגלובליות של fpdf, ודוח חוזר של אותו תרחיש זהה (מלבד תאריך היצירה)
+def test_report_leaves_fpdf_globals_untouched(tmp_path):
+    before = {name: getattr(fpdf.fpdf, name) for name in _FPDF_GLOBALS}
+    first = generate_pdf_report(ProjectParams(), chart_directory=tmp_path)
+    second = generate_pdf_report(ProjectParams(), chart_directory=tmp_path)
+    assert first.startswith(b'%PDF')
+    assert _without_dates(first) == _without_dates(second)
+    assert {name: getattr(fpdf.fpdf, name) for name in _FPDF_GLOBALS} == before
+
+
+def test_reports_for_scenarios(tmp_path):
+    scenarios = [ProjectParams(), ProjectParams(num_villas=20)]
+    paths = generate_pdf_reports(scenarios, tmp_path / 'reports', names=['a', 'b'], workers=1,
+                                 chart_directory=tmp_path / 'charts')
+    assert [Path(path).name for path in paths] == ['a.pdf', 'b.pdf']
+    assert all(Path(path).read_bytes().startswith(b'%PDF') for path in paths)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch, scenario_columns
+from profitability.cashflows import METRIC_KEYS
+from profitability.model import calculate_financial_metrics
+from profitability.params import ProjectParams
+from profitability.seasonality import CALENDAR, daily_curves, day_type_counts, revenue_model_codes, seasonal_nights
+
+NEUTRAL = dict(weekend_price_multiplier=1.0, weekend_occupancy_multiplier=1.0, holiday_price_multiplier=1.0,
+               holiday_occupancy_multiplier=1.0, peak_season_price_multiplier=1.0,
+               peak_season_occupancy_multiplier=1.0)
+
+
+def test_day_type_counts_cover_the_year():
+    annual = day_type_counts(1)
+    monthly = day_type_counts(12)
+    assert annual.sum() == 365
+    np.testing.assert_array_equal(monthly.sum(axis=1), annual[:, 0])
+    assert monthly.sum(axis=0).tolist() == [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+# החישוב לפי סוג לילה שווה לסכום על העקומות היומיות, והתפוסה הממוצעת (בלי חיתוך) היא occupancy_rate
+def test_seasonal_nights_match_daily_curves():
+    c = scenario_columns({'occupancy_rate': [0.3, 0.5], 'price_per_night': [3000, 4500], 'revenue_model': CALENDAR})
+    nights, revenue = seasonal_nights(c)
+    curves = daily_curves(c)
+    np.testing.assert_allclose(nights[:, 0], curves['Occupancy'].sum(axis=1), rtol=1e-12)
+    np.testing.assert_allclose(revenue[:, 0], (curves['Price'] * curves['Occupancy']).sum(axis=1), rtol=1e-12)
+    np.testing.assert_allclose(curves['Occupancy'].mean(axis=1), [0.3, 0.5], rtol=1e-12)
+    assert curves['Occupancy'].max() <= 1
+
+
+# לוח שנה עם מכפילים ניטרליים שקול למודל השנתי האחיד
+def test_neutral_calendar_matches_flat_model():
+    flat = calculate_financial_metrics(ProjectParams(**NEUTRAL))
+    calendar = calculate_financial_metrics(ProjectParams(revenue_model='לוח שנה', **NEUTRAL))
+    assert calendar == pytest.approx(flat, rel=1e-9)
+
+
+# שורות של תרחישי לוח שנה באצווה שוות למדדים של calculate_financial_metrics
+@pytest.mark.parametrize('periods_per_year', [1, 12])
+def test_calendar_batch_rows_match_scalar_metrics(periods_per_year):
+    scenarios = [ProjectParams(revenue_model='לוח שנה'),
+                 ProjectParams(revenue_model='לוח שנה', occupancy_rate=0.8, holiday_occupancy_multiplier=3.0),
+                 ProjectParams()]
+    rows = [params.as_dict() for params in scenarios]
+    batch = calculate_financial_metrics_batch({field: [row[field] for row in rows] for field in rows[0]},
+                                              periods_per_year)
+    for i, params in enumerate(scenarios):
+        expected = calculate_financial_metrics_batch(params.as_dict(), periods_per_year)
+        for key in METRIC_KEYS:
+            np.testing.assert_allclose(batch[key][i], expected[key][0], rtol=1e-9, err_msg=key)
+        if periods_per_year == 1:
+            assert calculate_financial_metrics(params) == pytest.approx({key: batch[key][i] for key in METRIC_KEYS},
+                                                                        rel=1e-12)
+    assert batch['Gross Annual Profit'][0] != batch['Gross Annual Profit'][2]
+
+
+def test_unknown_revenue_model_raises():
+    np.testing.assert_array_equal(revenue_model_codes(['לוח שנה', 'שנתי אחיד']), [CALENDAR, 0])
+    with pytest.raises(ValueError):
+        revenue_model_codes(['חודשי'])
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from profitability import service as service_module
+from profitability.grid import tornado
+from profitability.model import calculate_financial_metrics
+from profitability.params import ProjectParams
+from profitability.service import ComputeService
+
+
+@pytest.fixture
+def blocking_job(monkeypatch):
+    release = threading.Event()
+
+    def job(value):
+        release.wait(10)
+        if value < 0:
+            raise ValueError(value)
+        return value * 2
+    monkeypatch.setitem(service_module.JOBS, 'block', job)
+    yield release
+    release.set()
+
+
+@pytest.fixture
+def thread_service():
+    service = ComputeService(session_limit=1, backend='thread')
+    yield service
+    service.close()
+
+
+# מאגר התהליכים (ברירת המחדל) מחזיר את אותן תוצאות כמו קריאה ישירה, והקריאה החוזרת נקראת מהמטמון
+def test_process_backend_matches_direct_calls():
+    service = ComputeService(workers=1)
+    try:
+        params = ProjectParams(occupancy_rate=0.5)
+        assert service.info()['backend'] == 'process'
+        assert service.run('user', 'metrics', (params,), timeout=120) == calculate_financial_metrics(params)
+        assert service.run('user', 'metrics', (params,)) == calculate_financial_metrics(params)
+        assert service.info()['hits'] == 1
+        assert service.run('user', 'tornado', (params,), timeout=120) == tornado(params)
+    finally:
+        service.close()
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        ComputeService(backend='cluster')
+
+
+# משימה זהה למשימה שרצה מצטרפת אליה, וכל משתמש מריץ לכל היותר session_limit משימות - השאר בתור שלו
+def test_coalescing_and_session_limit(thread_service, blocking_job):
+    first = thread_service.submit('a', 'block', (1,))
+    assert thread_service.submit('a', 'block', (1,)) is first
+    queued = thread_service.submit('a', 'block', (2,))
+    other = thread_service.submit('b', 'block', (3,))
+    info = thread_service.info()
+    assert (info['coalesced'], info['queued'], info['sessions']) == (1, 1, 2)
+
+    blocking_job.set()
+    assert [future.result(10) for future in (first, queued, other)] == [2, 4, 6]
+    assert thread_service.info()['in_flight'] == 0
+    assert thread_service.run('a', 'block', (1,)) == 2
+    assert thread_service.info()['hits'] == 1
+
+
+# חריגה במשימה מגיעה למבקש ואינה נשמרת במטמון
+def test_errors_propagate_and_are_not_cached(thread_service, blocking_job):
+    blocking_job.set()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            thread_service.run('a', 'block', (-1,), timeout=10)
+    assert thread_service.info()['submitted'] == 2
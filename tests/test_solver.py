@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from profitability.model import calculate_financial_metrics
+from profitability.params import ProjectParams
+from profitability.solver import goal_seek, optimize
+
+
+# הפתרון של חיפוש היעד מביא את המדד (לפי calculate_financial_metrics) ליעד
+@pytest.mark.parametrize('field, metric, target', [
+    ('price_per_night', 'NPV Min', 0.0),
+    ('occupancy_rate', 'IRR Min', 12.0),
+    ('construction_cost_per_sqm', 'Payback Period Max', 9.0),
+    ('discount_rate', 'NPV Max', 1e6),
+])
+def test_goal_seek_reaches_target(field, metric, target):
+    params = ProjectParams()
+    solution, metrics = goal_seek(params, field, metric, target)
+    expected = calculate_financial_metrics(solution)
+    np.testing.assert_allclose(expected[metric], target, atol=1e-3 * max(1.0, abs(target)))
+    assert metrics == expected
+    assert solution.replace(**{field: getattr(params, field)}) == params
+
+
+# בשדה שלם הפתרון הוא הערך השלם הראשון שבו המדד עבר את היעד
+def test_goal_seek_integer_field():
+    params = ProjectParams()
+    solution, metrics = goal_seek(params, 'num_villas', 'NPV Min', 2e7)
+    assert isinstance(solution.num_villas, int)
+    assert metrics['NPV Min'] >= 2e7
+    assert calculate_financial_metrics(params.replace(num_villas=solution.num_villas - 1))['NPV Min'] < 2e7
+
+
+def test_goal_seek_without_crossing_raises():
+    with pytest.raises(ValueError):
+        goal_seek(ProjectParams(), 'occupancy_rate', 'NPV Min', 1e12)
+
+
+# האופטימיזציה בוחרת את הצירוף הטוב ביותר מבין כל הצירופים שעומדים באילוצים, לפי calculate_financial_metrics
+def test_optimize_matches_exhaustive_search():
+    params = ProjectParams(equity_amount=3e6)
+    villas, sizes = range(5, 16, 5), range(100, 301, 100)
+    max_cost = 4e7
+    solution, metrics = optimize(params, {'num_villas': villas, 'villa_size_sqm': sizes},
+                                 constraints={'Total Construction Cost': (None, max_cost)})
+
+    candidates = [params.replace(num_villas=n, villa_size_sqm=float(s)) for n, s in itertools.product(villas, sizes)]
+    feasible = [(calculate_financial_metrics(p)['NPV Min'], p) for p in candidates
+                if calculate_financial_metrics(p)['Total Construction Cost'] <= max_cost]
+    best_npv, best = max(feasible, key=lambda item: item[0])
+    assert (solution.num_villas, solution.villa_size_sqm) == (best.num_villas, best.villa_size_sqm)
+    np.testing.assert_allclose(metrics['NPV Min'], best_npv, rtol=1e-9)
+    assert metrics == calculate_financial_metrics(solution)
+
+
+# ההון העצמי של המשתמש נשמר (חסום בעלות ההקמה), ותקרת ההון העצמי פוסלת צירופים שההון העצמי שלהם גבוה ממנה
+def test_optimize_keeps_equity_and_enforces_cap():
+    params = ProjectParams(equity_amount=2e7)
+    fields = {'num_villas': [2, 5, 10, 20]}
+    solution, metrics = optimize(params, fields)
+    assert solution.equity_amount == min(2e7, metrics['Total Construction Cost'])
+
+    solution, metrics = optimize(params, fields, max_equity=2e7)
+    assert solution.equity_amount == 2e7
+    assert metrics['Total Construction Cost'] >= 2e7
+
+    with pytest.raises(ValueError):
+        optimize(params, fields, max_equity=1e6)
+    solution, _ = optimize(params.replace(equity_amount=1e6), fields, max_equity=2e6)
+    assert solution.equity_amount == 1e6
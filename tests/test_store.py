@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profitability.batch import calculate_financial_metrics_batch
+from profitability.benchmarks import random_scenarios
+from profitability.cashflows import METRIC_KEYS
+from profitability.cli import main
+from profitability.model import calculate_financial_metrics, calculate_loan_repayment, sensitivity_analysis
+from profitability.params import ProjectParams
+from profitability.store import ScenarioStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ScenarioStore(tmp_path / 'scenarios.sqlite')
+    yield store
+    store.close()
+
+
+# תוצאה מהמאגר שווה לחישוב הישיר, והקריאה השנייה היא פגיעה במאגר
+def test_store_results_match_direct_computation(store):
+    params = ProjectParams(occupancy_rate=0.5)
+    assert store.metrics(params) == pytest.approx(calculate_financial_metrics(params), rel=1e-12)
+    assert store.metrics(params) == pytest.approx(calculate_financial_metrics(params), rel=1e-12)
+    assert (store.hits, store.misses) == (1, 1)
+
+    schedule = store.loan_schedule(params)
+    for name, column in calculate_loan_repayment(params).items():
+        np.testing.assert_array_equal(schedule[name], column)
+    assert store.sensitivity(params, 'מחיר ללילה') == sensitivity_analysis(params, 'מחיר ללילה')
+
+    # שורה בטבלה (עמודות חסרות מקבלות ברירת מחדל) שזהה לתרחיש היחיד חולקת איתו רשומה
+    store.metrics_batch({'occupancy_rate': [0.5]})
+    assert store.hits == 2
+
+
+# טבלת תרחישים: שורות שמורות נקראות והחסרות מחושבות (גם על פני כמה תהליכים), והתוצאה שווה לאצווה
+@pytest.mark.parametrize('workers', [1, 2])
+def test_metrics_batch_matches_batch(store, workers):
+    scenarios = random_scenarios(400, seed=1)
+    expected = calculate_financial_metrics_batch(scenarios)
+    half = {name: values[:200] for name, values in scenarios.items()}
+    store.metrics_batch(half, workers)
+    result = store.metrics_batch(scenarios, workers)
+    assert (store.hits, store.misses) == (200, 400)
+    for key in METRIC_KEYS:
+        np.testing.assert_allclose(result[key], expected[key], rtol=1e-12, err_msg=key)
+
+
+# רשומות מגרסת מודל אחרת נמחקות בפתיחה, והגודל נשמר בתוך התקציב
+def test_store_drops_other_versions_and_evicts(tmp_path):
+    path = tmp_path / 'scenarios.sqlite'
+    store = ScenarioStore(path, model_version='1')
+    store.metrics_batch(random_scenarios(50))
+    store.close()
+    store = ScenarioStore(path, model_version='2', max_bytes=5000)
+    assert store.info()['entries'] == 0
+    store.metrics_batch(random_scenarios(200))
+    assert store.info()['bytes'] <= 5000
+    store.close()
+
+
+# ה-CLI: שורת פלט לכל תרחיש עם המדדים של האצווה, גם עם מאגר וכמה תהליכים
+@pytest.mark.parametrize('extra', [[], ['--workers', '2'], ['--workers', '2', '--store']])
+def test_cli_matches_batch(tmp_path, extra):
+    scenarios = pd.DataFrame(random_scenarios(250, seed=3))
+    source, output = tmp_path / 'scenarios.csv', tmp_path / 'metrics.csv'
+    scenarios.to_csv(source, index=False)
+    if '--store' in extra:
+        extra = extra + [str(tmp_path / 'store.sqlite')]
+    assert main([str(source), '-o', str(output), '--chunk-size', '100', *extra]) == 0
+
+    result = pd.read_csv(output)
+    expected = calculate_financial_metrics_batch(scenarios)
+    assert len(result) == len(scenarios)
+    for key in METRIC_KEYS:
+        np.testing.assert_allclose(result[key], expected[key], rtol=1e-9, err_msg=key)